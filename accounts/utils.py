@@ -479,3 +479,59 @@ def get_combined_role(user, team=None):
 
     return ", ".join(sorted(set(team_roles)))
 
+
+
+# ===============================
+# 👥 BULK ROLE LOOKUPS
+# ===============================
+DEPARTMENTAL_PASTOR_ROLES = ["youth", "welfare", "media", "protocol", "music", "choir"]
+
+
+def _combined_role(user, groups, memberships, team_id=None):
+    """get_combined_role() over preloaded group names and (team_id, team_name, team_role) rows."""
+    if user.is_superuser:
+        return "Superuser"
+    if "Pastor" in groups:
+        return "Pastor"
+    if "Admin" in groups:
+        return "Admin"
+
+    team_roles = [
+        f"{team_role or 'Member'} ({team_name})"
+        for m_team_id, team_name, team_role in memberships
+        if team_id is None or m_team_id == team_id
+    ]
+    if not team_roles:
+        if "Minister" in groups:
+            return "Minister"
+        if "GForce Member" in groups:
+            return "GForce Member"
+        return "Member"
+    return ", ".join(sorted(set(team_roles)))
+
+
+def get_role_summaries(users, team=None):
+    """
+    {user_id: (combined role for `team`, is_project_level_role)} for many users
+    in two queries, instead of get_combined_role()/is_project_level_role() per user.
+    """
+    ids = [u.id for u in users]
+    groups, memberships = {}, {}
+    for user_id, name in Group.objects.filter(user__in=ids).values_list("user", "name"):
+        groups.setdefault(user_id, set()).add(name)
+    for row in TeamMembership.objects.filter(user__in=ids).values_list("user", "team_id", "team__name", "team_role"):
+        memberships.setdefault(row[0], []).append(row[1:])
+
+    team_id = team.id if team else None
+    summaries = {}
+    for user in users:
+        user_groups, user_memberships = groups.get(user.id, set()), memberships.get(user.id, [])
+        role = _combined_role(user, user_groups, user_memberships, team_id)
+
+        project_level = False
+        title = (user.title or "").lower()
+        if not user.is_superuser and (user_groups & {"Pastor", "Admin"} or title in ["pastor", "admin"]):
+            role_str = _combined_role(user, user_groups, user_memberships).lower()
+            project_level = not any(x in role_str for x in DEPARTMENTAL_PASTOR_ROLES)
+        summaries[user.id] = (role, project_level)
+    return summaries
@@ -9,6 +9,8 @@ from django.utils.timezone import localtime, now
 import pytz, requests, re, calendar, json, mimetypes, os
 from django.contrib.auth import get_user_model
 from guests.models import GuestEntry
+from guests import stats as guest_stats
+from gforceapp.pagination import KeysetPaginator, count_cache_key
 from .models import CustomUser, TeamMembership
 from django.contrib.auth.forms import SetPasswordForm
 from django.core.paginator import Paginator
@@ -142,23 +144,19 @@ def admin_dashboard(request):
     current_year = today.year
     last_30_days = today - timedelta(days=30)
 
-    # ---------------------- Base queryset ----------------------
+    # ---------------------- Base rollup ----------------------
     if user.is_superuser:
-        queryset = GuestEntry.objects.all()
+        rollups = guest_stats.rollups_for(everyone=True)
         users = CustomUser.objects.all().order_by("full_name")
     elif is_project_admin(user) or is_magnet_admin(user):
-        queryset = GuestEntry.objects.all()
+        rollups = guest_stats.rollups_for(everyone=True)
         users = CustomUser.objects.filter(is_superuser=False).order_by("full_name")
-    elif is_team_admin(user):
-        queryset = GuestEntry.objects.none()
-        users = None
     else:
-        queryset = GuestEntry.objects.none()
+        rollups = guest_stats.rollups_for(None)
         users = None
 
     # ---------------------- Available years ----------------------
-    available_years = queryset.dates('date_of_visit', 'year')
-    available_years = [d.year for d in available_years]
+    available_years = guest_stats.available_years(rollups)
 
     # ---------------------- Yearly guest summary ----------------------
     year = request.GET.get('year', current_year)
@@ -167,118 +165,10 @@ def admin_dashboard(request):
     except (TypeError, ValueError):
         year = current_year
 
-    guests_this_year = queryset.filter(date_of_visit__year=year)
-
-    month_counts_qs = guests_this_year.annotate(
-        month=ExtractMonth('date_of_visit')
-    ).values('month').annotate(count=Count('id')).order_by('month')
-
-    month_counts = {m: 0 for m in range(1, 13)}
-    for entry in month_counts_qs:
-        month_counts[entry['month']] = entry['count']
-
-    max_count = max(month_counts.values(), default=0)
-    min_count = min(month_counts.values(), default=0)
-    avg_count = sum(month_counts.values()) // 12 if month_counts else 0
-    max_month = next((calendar.month_name[m] for m, c in month_counts.items() if c == max_count), "N/A")
-    min_month = next((calendar.month_name[m] for m, c in month_counts.items() if c == min_count), "N/A")
-
-    percent = lambda c: round((c / max_count) * 100, 1) if max_count else 0
-
-    summary_data = {
-        'max_month': max_month,
-        'max_count': max_count,
-        'max_percent': percent(max_count),
-        'min_month': min_month,
-        'min_count': min_count,
-        'min_percent': percent(min_count),
-        'avg_count': avg_count,
-        'avg_percent': percent(avg_count),
-        'total_count': guests_this_year.count(),
-    }
-
-    # ---------------------- Aggregated counts ----------------------
-    service_data = queryset.values('service_attended').annotate(count=Count('id')).order_by('-count')
-    service_labels = [s['service_attended'] or "Not Specified" for s in service_data]
-    service_counts = [s['count'] for s in service_data]
-
-    channel_data = queryset.values('channel_of_visit').annotate(count=Count('id')).order_by('-count')
-    total_channels = sum(c['count'] for c in channel_data)
-    channel_progress = [
-        {'label': c['channel_of_visit'] or "Unknown",
-         'count': c['count'],
-         'percent': round((c['count'] / total_channels) * 100, 2) if total_channels else 0}
-        for c in channel_data
-    ]
-
-    # Purpose breakdown
-    purposes = ["Home Church", "Occasional Visit", "One-Time Visit", "Special Programme"]
-    total_purposes = queryset.count()
-    purpose_stats = {}
-    # Individual counts for backward compatibility
-    for p in purposes:
-        count = queryset.filter(purpose_of_visit__iexact=p).count()
-        percentage = round((count / total_purposes) * 100, 1) if total_purposes else 0
-        purpose_stats[p] = {'count': count, 'percentage': percentage}
-    home_church_count = purpose_stats["Home Church"]["count"]
-    home_church_percentage = purpose_stats["Home Church"]["percentage"]
-    occasional_visit_count = purpose_stats["Occasional Visit"]["count"]
-    occasional_visit_percentage = purpose_stats["Occasional Visit"]["percentage"]
-    one_time_visit_count = purpose_stats["One-Time Visit"]["count"]
-    one_time_visit_percentage = purpose_stats["One-Time Visit"]["percentage"]
-    special_programme_count = purpose_stats["Special Programme"]["count"]
-    special_programme_percentage = purpose_stats["Special Programme"]["percentage"]
-
-    # Most attended service
-    if service_data:
-        most_attended_service = service_data[0]['service_attended'] or "Not Specified"
-        most_attended_count = service_data[0]['count']
-        total_services = sum(s['count'] for s in service_data)
-        attendance_rate = round((most_attended_count / total_services) * 100, 1) if total_services else 0
-    else:
-        most_attended_service, most_attended_count, attendance_rate = "No Data", 0, 0
-
-    # Status counts
-    status_data = queryset.values('status').annotate(count=Count('id'))
-    status_labels = [s['status'] or "Unknown" for s in status_data]
-    status_counts = [s['count'] for s in status_data]
-
-    planted_count = queryset.filter(status="Planted").count()
-    planted_elsewhere_count = queryset.filter(status="Planted Elsewhere").count()
-    relocated_count = queryset.filter(status="Relocated").count()
-    work_in_progress_count = queryset.filter(status="Work in Progress").count()
+    summary_data = guest_stats.year_summary(rollups, year)
 
-    # ---------------------- Monthly increase ----------------------
-    first_day_this_month = today.replace(day=1)
-    last_month_end = first_day_this_month - timedelta(days=1)
-    first_day_last_month = last_month_end.replace(day=1)
-
-    current_month_count = queryset.filter(date_of_visit__gte=first_day_this_month, date_of_visit__lte=today).count()
-    last_month_count = queryset.filter(date_of_visit__gte=first_day_last_month, date_of_visit__lte=last_month_end).count()
-
-    increase_rate = round(((current_month_count - last_month_count) / last_month_count) * 100, 1) if last_month_count else (100 if current_month_count else 0)
-    percent_change = increase_rate
-
-    # ---------------------- User-specific metrics ----------------------
-    user_total_guest_entries = queryset.filter(assigned_to=user).count()
-    user_current_month_count = queryset.filter(assigned_to=user, date_of_visit__gte=first_day_this_month, date_of_visit__lte=today).count()
-    user_last_month_count = queryset.filter(assigned_to=user, date_of_visit__gte=first_day_last_month, date_of_visit__lte=last_month_end).count()
-
-    if user_last_month_count == 0:
-        user_diff_percent = 100 if user_current_month_count else 0
-        user_diff_positive = True
-    else:
-        diff = ((user_current_month_count - user_last_month_count) / user_last_month_count) * 100
-        user_diff_percent = round(abs(diff), 1)
-        user_diff_positive = diff >= 0
-
-    # Planted guests growth
-    user_planted_total = queryset.filter(assigned_to=user, status="Planted").count()
-    planted_growth_rate = round((user_planted_total / user_total_guest_entries) * 100, 1) if user_total_guest_entries else 0
-
-    user_planted_current_month = queryset.filter(assigned_to=user, status="Planted", date_of_visit__gte=first_day_this_month, date_of_visit__lte=today).count()
-    user_planted_last_month = queryset.filter(assigned_to=user, status="Planted", date_of_visit__gte=first_day_last_month, date_of_visit__lte=last_month_end).count()
-    planted_growth_change = round(((user_planted_current_month - user_planted_last_month) / user_planted_last_month) * 100, 1) if user_planted_last_month else (100 if user_planted_current_month else 0)
+    # ---------------------- Services, purposes, status, channels & growth ----------------------
+    dashboard_stats = guest_stats.dashboard_stats(rollups, user, today)
 
     # ---------------------- Teams & Users ----------------------
     user_teams = Team.objects.filter(memberships__user=user).prefetch_related('memberships__user').distinct()
@@ -350,36 +240,6 @@ def admin_dashboard(request):
         'available_years': available_years,
         'current_year': current_year,
         'summary_data': summary_data,
-        'service_labels': service_labels,
-        'service_counts': service_counts,
-        'status_labels': status_labels,
-        'status_counts': status_counts,
-        'channel_progress': channel_progress,
-        'planted_count': planted_count,
-        'planted_elsewhere_count': planted_elsewhere_count,
-        'relocated_count': relocated_count,
-        'work_in_progress_count': work_in_progress_count,
-        'total_guests': queryset.count(),
-        'increase_rate': increase_rate,
-        'percent_change': percent_change,
-        'user_total_guest_entries': user_total_guest_entries,
-        'user_guest_entry_diff_percent': user_diff_percent,
-        'user_guest_entry_diff_positive': user_diff_positive,
-        'user_planted_total': user_planted_total,
-        'planted_growth_rate': planted_growth_rate,
-        'planted_growth_change': planted_growth_change,
-        'most_attended_service': most_attended_service,
-        'most_attended_count': most_attended_count,
-        'attendance_rate': attendance_rate,
-        'home_church_count': home_church_count,
-        'home_church_percentage': home_church_percentage,
-        'occasional_visit_count': occasional_visit_count,
-        'occasional_visit_percentage': occasional_visit_percentage,
-        'one_time_visit_count': one_time_visit_count,
-        'one_time_visit_percentage': one_time_visit_percentage,
-        'special_programme_count': special_programme_count,
-        'special_programme_percentage': special_programme_percentage,
-        'purpose_stats': purpose_stats,
         'users': users,
         'other_users': other_users,
         'user_teams': user_teams,
@@ -396,6 +256,7 @@ def admin_dashboard(request):
         'next_events_for_week': next_events,
         'context_user_permissions': context_user_permissions,
         'page_title': "Admin Dashboard",
+        **dashboard_stats,
     }
 
     return render(request, "accounts/admin_dashboard.html", context)
@@ -476,17 +337,23 @@ def user_list(request):
             Q(team_memberships__team__name__icontains=search_query)
         ).distinct()
 
-    # Pagination
+    # Pagination (keyset, ?after= / ?before=)
     view_type = request.GET.get('view', 'cards')
     per_page = 50 if view_type == 'list' else 45
-    paginator = Paginator(users, per_page)  # <-- paginate filtered users
-    page_obj = paginator.get_page(request.GET.get('page', 1))
+    count_key = count_cache_key("user_list_count", request.user.pk, search_query)
+    paginator = KeysetPaginator(users, per_page, ('id',), count_key=count_key)  # <-- paginate filtered users
+    page_obj = paginator.page_from_request(request)
+
+    params = request.GET.copy()
+    for key in ('page', 'after', 'before'):
+        params.pop(key, None)
 
     return render(request, 'accounts/user_list.html', {
         'users': page_obj.object_list,
         'page_obj': page_obj,
         'view_type': view_type,
         'search_query': search_query,
+        'query_string': params.urlencode(),
         'page_title': 'Team'
     })
 
@@ -0,0 +1,194 @@
+"""
+Keyset (cursor) pagination shared by the guest and user lists.
+
+Pages are fetched with `WHERE (key) < (cursor) ORDER BY key LIMIT n+1`
+instead of OFFSET, so following ?after= / ?before= links costs the same on
+page 40 as on page 1. The total is counted once per filter set and cached.
+
+KeysetPage mimics django.core.paginator.Page (start_index, end_index,
+paginator.count, page_range, ...) so existing templates keep working; it
+also exposes next_cursor / previous_cursor for the Prev/Next links.
+"""
+import base64
+import hashlib
+import json
+import math
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+COUNT_TIMEOUT = 120
+CURSOR_TYPES = (str, int, float)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return the list of key values in a cursor token, or None if it is malformed or holds non-scalar values."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list):
+        return None
+    if not all(isinstance(v, CURSOR_TYPES) and not isinstance(v, bool) for v in values):
+        return None
+    return values
+
+
+def count_cache_key(prefix, *parts):
+    """Stable cache key for the total of one filter combination."""
+    digest = hashlib.md5(json.dumps(parts, default=str, sort_keys=True).encode()).hexdigest()
+    return f"{prefix}:{digest}"
+
+
+def _positive_int(value, default=1):
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return default
+
+
+class KeysetPaginator:
+    """
+    ordering: unique key such as ('-date_of_visit', '-id'). Key columns must be
+    non-null (NULL never compares < or >); annotate a Coalesce() of nullable ones.
+    count_key: cache key for the total; pass the same value for the same filters.
+    """
+
+    def __init__(self, queryset, per_page, ordering, count_key=None, count_queryset=None):
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.fields = [o.lstrip('-') for o in ordering]
+        self.count_key = count_key
+        self.count_queryset = count_queryset if count_queryset is not None else queryset
+
+    # ---------------------- Counting ----------------------
+    @property
+    def count(self):
+        if not hasattr(self, '_count'):
+            counter = lambda: self.count_queryset.order_by().count()
+            self._count = cache.get_or_set(self.count_key, counter, COUNT_TIMEOUT) if self.count_key else counter()
+        return self._count
+
+    @property
+    def num_pages(self):
+        return max(math.ceil(self.count / self.per_page), 1)
+
+    @property
+    def page_range(self):
+        return range(1, self.num_pages + 1)
+
+    # ---------------------- Keyset filters ----------------------
+    def _seek(self, values, forward):
+        """Rows strictly after (forward) or before the key values, in list order."""
+        condition = Q()
+        for i, ordering in enumerate(self.ordering):
+            descending = ordering.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            step = Q(**{f'{self.fields[i]}__{lookup}': values[i]})
+            for j in range(i):
+                step &= Q(**{self.fields[j]: values[j]})
+            condition |= step
+        # The bound on the first column limits the index scan; the OR only settles ties
+        first = 'lte' if self.ordering[0].startswith('-') == forward else 'gte'
+        return Q(**{f'{self.fields[0]}__{first}': values[0]}) & condition
+
+    def _seek_rows(self, values, forward):
+        """Queryset filtered past a cursor, or None when its values do not fit the key columns."""
+        if not values or len(values) != len(self.fields):
+            return None
+        try:
+            return self.queryset.filter(self._seek(values, forward))
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+    def _cursor_for(self, obj):
+        return encode_cursor([getattr(obj, f) for f in self.fields])
+
+    def page_from_request(self, request):
+        return self.page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+            number=request.GET.get('page', 1),
+        )
+
+    def page(self, after=None, before=None, number=1):
+        number = _positive_int(number)
+        # A tampered or stale cursor falls through to the numbered page
+        after_rows = self._seek_rows(decode_cursor(after), True)
+        before_rows = self._seek_rows(decode_cursor(before), False) if after_rows is None else None
+        size = self.per_page
+
+        if after_rows is not None:
+            rows = list(after_rows[:size + 1])
+            has_next, has_previous = len(rows) > size, True
+            rows = rows[:size]
+        elif before_rows is not None:
+            reverse = [o[1:] if o.startswith('-') else f'-{o}' for o in self.ordering]
+            rows = list(before_rows.order_by(*reverse)[:size + 1])
+            has_previous, has_next = len(rows) > size, True
+            rows = list(reversed(rows[:size]))
+            if not has_previous:
+                number = 1
+        else:
+            # Plain ?page=N (numbered links) falls back to OFFSET
+            number = min(number, self.num_pages)
+            offset = (number - 1) * size
+            rows = list(self.queryset[offset:offset + size + 1])
+            has_next, has_previous = len(rows) > size, number > 1
+            rows = rows[:size]
+
+        return KeysetPage(rows, number, self, has_next, has_previous)
+
+
+class KeysetPage:
+    def __init__(self, object_list, number, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = paginator._cursor_for(object_list[-1]) if object_list and has_next else None
+        self.previous_cursor = paginator._cursor_for(object_list[0]) if object_list and has_previous else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return max(self.number - 1, 1)
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
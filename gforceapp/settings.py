@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.humanize",
+    "django.contrib.postgres",
 
     # Third-party
     "cloudinary",
@@ -58,6 +59,7 @@ INSTALLED_APPS = [
     "accounts.apps.AccountsConfig",
     "notifications.apps.NotificationsConfig",
     "messaging.apps.MessagingConfig",
+    "jobs.apps.JobsConfig",
 ]
 
 if DEBUG:
@@ -139,6 +141,8 @@ else:
             "default": {
                 "ENGINE": "django.db.backends.sqlite3",
                 "NAME": BASE_DIR / "db.sqlite3",
+                # On disk rather than in memory, so threaded tests (guests.tests) get real connections
+                "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
             }
         }
 
@@ -158,6 +162,23 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Background jobs (jobs app): wake-up queue shared with the run_jobs worker.
+# jobs.queues.InMemoryQueue keeps it in-process (tests, no Redis).
+JOBS_QUEUE_BACKEND = env("JOBS_QUEUE_BACKEND", default="jobs.queues.RedisQueue")
+# STORAGES alias for job uploads and results; the web and worker processes must both reach it.
+JOBS_STORAGE = env("JOBS_STORAGE", default="default")
+
+# Chat presence (workforce.presence): connection heartbeats shared by the web nodes.
+# workforce.presence.InMemoryPresence keeps it in-process (tests, no Redis).
+CHAT_PRESENCE_BACKEND = env("CHAT_PRESENCE_BACKEND", default="workforce.presence.RedisPresence")
+
+# Chat flood control (workforce.flood_control): per-user token buckets shared by the web nodes.
+# workforce.flood_control.InMemoryRateLimits keeps them in-process (tests, no Redis).
+CHAT_RATE_LIMIT_BACKEND = env("CHAT_RATE_LIMIT_BACKEND", default="workforce.flood_control.RedisRateLimits")
+
+# Chat archival (workforce.chat_archive): messages older than this move to ArchivedChatMessage.
+CHAT_ARCHIVE_AFTER_DAYS = env.int("CHAT_ARCHIVE_AFTER_DAYS", default=180)
+
 # =========================
 # CACHING (Django ORM + Views)
 # =========================
@@ -0,0 +1,44 @@
+"""
+Streamed downloads that stay streamed under ASGI.
+
+Django's ASGI handler drains a sync iterator into a list before sending it,
+which would hold a whole export in memory. streaming_response() instead
+pulls one block at a time on the thread that owns the DB cursor, so the
+first bytes go out while the rest is still being read or built.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+
+BLOCK_SIZE = 64 * 1024
+
+
+async def async_blocks(iterable):
+    iterator = iter(iterable)
+    done = object()
+    pull = sync_to_async(next, thread_sensitive=True)
+    while True:
+        block = await pull(iterator, done)
+        if block is done:
+            break
+        yield block
+
+
+def file_blocks(fileobj, block_size=BLOCK_SIZE):
+    """Read an open file in blocks, closing it at the end (or when the client goes away)."""
+    try:
+        for block in iter(lambda: fileobj.read(block_size), b''):
+            yield block
+    finally:
+        fileobj.close()
+
+
+def streaming_response(request, chunks, content_type, filename, size=None):
+    if isinstance(request, ASGIRequest):
+        chunks = async_blocks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if size is not None:
+        response['Content-Length'] = str(size)
+    return response
@@ -39,6 +39,7 @@ urlpatterns = [
     path("notifications/", include("notifications.urls", namespace="notifications")),
     path('messaging/', include('messaging.urls')),
     path('magnet/', include('magnet.urls')),
+    path('jobs/', include('jobs.urls', namespace='jobs')),
     
     # Post-login redirection
     path('post-login/', post_login_redirect, name='post_login_redirect'),
@@ -0,0 +1,37 @@
+"""
+Version counters for cached payloads.
+
+Cached data is keyed by its namespace's current version, and writers call
+bump_version() instead of deleting keys: every cached variant of a namespace
+(per team, per viewer class, ...) goes stale at once, and clients can put the
+version in the URL so browser caching is safe. Counters start from the clock,
+so a counter lost from the cache never restarts below an older version.
+"""
+import time
+
+from django.core.cache import cache
+
+
+# Namespaces bumped from more than one app
+PEOPLE = 'people'  # users, groups, teams, memberships
+GUEST_ASSIGNMENTS = 'guest_assignments'  # guest names, pictures and assignees
+
+
+def _key(namespace):
+    return f"version:{namespace}"
+
+
+def get_version(namespace):
+    version = cache.get(_key(namespace))
+    if version is None:
+        cache.add(_key(namespace), int(time.time()), None)
+        version = cache.get(_key(namespace), int(time.time()))
+    return version
+
+
+def bump_version(namespace):
+    try:
+        return cache.incr(_key(namespace))
+    except ValueError:  # counter not set (or evicted)
+        cache.set(_key(namespace), int(time.time()), None)
+        return get_version(namespace)
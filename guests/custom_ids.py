@@ -0,0 +1,82 @@
+"""
+Guest custom_id allocation (GNG000001, GNG000002, ...).
+
+Numbers come from a Postgres sequence, so concurrent registrations never get
+the same ID and a long import transaction does not block them. Other
+databases use a CustomIdCounter row bumped with a single UPDATE, which holds
+the row (SQLite: the database) write lock until the transaction ends.
+Like any sequence, numbers taken by a rolled-back transaction are not reused.
+"""
+import re
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .models import CustomIdCounter, GuestEntry
+
+
+PREFIX = 'GNG'
+SEQUENCE_NAME = 'guests_custom_id_seq'
+
+
+def format_custom_id(number, prefix=PREFIX):
+    return f'{prefix}{number:06d}'
+
+
+def uses_sequence():
+    return connection.vendor == 'postgresql'
+
+
+def highest_in_use(prefix=PREFIX):
+    """Largest number among existing custom_ids with this prefix (0 if none)."""
+    pattern = re.compile(rf'{re.escape(prefix)}(\d+)')
+    values = GuestEntry.objects.filter(custom_id__startswith=prefix).values_list('custom_id', flat=True)
+    return max((int(m.group(1)) for value in values.iterator() if (m := pattern.fullmatch(value))), default=0)
+
+
+def _allocate_from_sequence(count):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [SEQUENCE_NAME, count])
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+def _allocate_from_counter(count, prefix):
+    with transaction.atomic():
+        if not CustomIdCounter.objects.filter(prefix=prefix).update(last_value=F('last_value') + count):
+            try:
+                with transaction.atomic():
+                    CustomIdCounter.objects.create(prefix=prefix, last_value=highest_in_use(prefix) + count)
+            except IntegrityError:
+                # Another process created the counter first
+                CustomIdCounter.objects.filter(prefix=prefix).update(last_value=F('last_value') + count)
+        last = CustomIdCounter.objects.values_list('last_value', flat=True).get(prefix=prefix)
+    return list(range(last - count + 1, last + 1))
+
+
+def allocate(count=1, prefix=PREFIX):
+    """`count` unused numbers, ascending (consecutive except on Postgres under contention)."""
+    if count < 1:
+        return []
+    if uses_sequence() and prefix == PREFIX:
+        return _allocate_from_sequence(count)
+    return _allocate_from_counter(count, prefix)
+
+
+def next_custom_id():
+    return format_custom_id(allocate(1)[0])
+
+
+def custom_id_block(count):
+    """custom_ids for a bulk_create of `count` guests."""
+    return [format_custom_id(number) for number in allocate(count)]
+
+
+def sync(prefix=PREFIX):
+    """Point the sequence / counter at the highest custom_id in use (after renumbering or a restore)."""
+    highest = highest_in_use(prefix)
+    if uses_sequence() and prefix == PREFIX:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT setval(%s, %s, %s)', [SEQUENCE_NAME, max(highest, 1), highest > 0])
+    else:
+        CustomIdCounter.objects.update_or_create(prefix=prefix, defaults={'last_value': highest})
+    return highest
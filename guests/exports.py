@@ -0,0 +1,301 @@
+"""
+Streaming guest exports.
+
+Rows come straight from a values_list() iterator with the assignee name
+joined in SQL, so an export holds one chunk in memory at a time and starts
+sending bytes as soon as the first chunk is fetched. The views stream them
+to the browser (gforceapp.streaming); the jobs worker (guests.tasks) writes
+the same streams to a file.
+"""
+import csv
+import io
+import os
+import tempfile
+import zlib
+from datetime import date, datetime
+from functools import lru_cache
+
+from django.db.models import Value
+from django.db.models.functions import Concat, Trim
+from openpyxl import Workbook
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from accounts.utils import is_magnet_admin
+from gforceapp.streaming import BLOCK_SIZE, file_blocks, streaming_response
+from .models import FollowUpReport, GuestEntry
+from .search import search_guests
+
+
+CHUNK_SIZE = 2000
+SPOOL_LIMIT = 8 * 1024 * 1024  # finished files above this go to a temp file
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# key -> (header, values_list expression)
+COLUMNS = {
+    'full_name': ('Full Name', 'full_name'),
+    'phone_number': ('Phone Number', 'phone_number'),
+    'email': ('Email', 'email'),
+    'gender': ('Gender', 'gender'),
+    'date_of_birth': ('Date of Birth', 'date_of_birth'),
+    'marital_status': ('Marital Status', 'marital_status'),
+    'home_address': ('Home Address', 'home_address'),
+    'occupation': ('Occupation', 'occupation'),
+    'date_of_visit': ('Date of Visit', 'date_of_visit'),
+    'purpose_of_visit': ('Purpose of Visit', 'purpose_of_visit'),
+    'channel_of_visit': ('Channel of Visit', 'channel_of_visit'),
+    'service_attended': ('Service Attended', 'service_attended'),
+    'referrer_name': ('Referrer Name', 'referrer_name'),
+    'referrer_phone_number': ('Referrer Phone Number', 'referrer_phone_number'),
+    'status': ('Status', 'status'),
+    'assigned_to': ('Assigned To', 'assigned_to_name'),
+}
+
+
+def assignee_name():
+    """SQL equivalent of assigned_to.get_full_name() ('' when unassigned)."""
+    return Trim(Concat('assigned_to__first_name', Value(' '), 'assigned_to__last_name'))
+
+
+def guests_for_export(user, params):
+    """
+    Guests `user` may export, filtered by a dict of query params.
+    - Admins can export all or filter by user=.
+    - Regular users can only export their own entries.
+    - Respects service= and q= (guests.search).
+    """
+    filter_user_id = str(params.get('user') or '')
+    filter_service = params.get('service')
+
+    if is_magnet_admin(user):
+        guests = GuestEntry.objects.all()
+        if filter_user_id.isdigit():
+            guests = guests.filter(assigned_to__id=filter_user_id)
+    else:
+        guests = GuestEntry.objects.filter(assigned_to=user)
+
+    if filter_service:
+        guests = guests.filter(service_attended__iexact=filter_service)
+
+    return search_guests(guests, params.get('q'))
+
+
+def export_queryset(request):
+    """Guests visible to an export request (see guests_for_export)."""
+    return guests_for_export(request.user, request.GET)
+
+
+def selected_columns(fields_param):
+    """Column keys from ?fields=a,b,c (unknown names ignored); every column when empty."""
+    if not fields_param:
+        return list(COLUMNS)
+    keys = [f.strip() for f in fields_param.split(',')]
+    return [k for k in keys if k in COLUMNS] or list(COLUMNS)
+
+
+def iter_rows(queryset, columns, chunk_size=CHUNK_SIZE):
+    """Tuples of column values, fetched chunk_size rows at a time."""
+    expressions = [COLUMNS[key][1] for key in columns]
+    return (
+        queryset.annotate(assigned_to_name=assignee_name())
+        .order_by('id')
+        .values_list(*expressions)
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(queryset, columns, progress=None):
+    """CSV lines, header first; progress(rows_written) is called every CHUNK_SIZE rows."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([COLUMNS[key][0] for key in columns])
+    for count, row in enumerate(iter_rows(queryset, columns), start=1):
+        yield writer.writerow(['' if value is None else value for value in row])
+        if progress and count % CHUNK_SIZE == 0:
+            progress(count)
+
+
+def blocks(lines, block_size=BLOCK_SIZE):
+    """Join small str chunks into ~block_size bytes blocks."""
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= block_size:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip a stream of byte blocks, flushing after each so the client receives data steadily."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def csv_blocks(queryset, columns, gzip=False, progress=None):
+    """The CSV export as byte blocks (gzipped when asked), shared by the download view and the job."""
+    data = blocks(csv_lines(queryset, columns, progress))
+    return gzip_stream(data) if gzip else data
+
+
+def spool(chunks, spool_limit=SPOOL_LIMIT):
+    """Write byte blocks to a file that stays in memory up to spool_limit; returns it rewound."""
+    output = tempfile.SpooledTemporaryFile(max_size=spool_limit)
+    for chunk in chunks:
+        output.write(chunk)
+    output.seek(0)
+    return output
+
+
+def streaming_csv_response(request, queryset, columns, filename, gzip=False):
+    data = csv_blocks(queryset, columns, gzip=gzip)
+    if gzip:
+        return streaming_response(request, data, 'application/gzip', f'{filename}.gz')
+    return streaming_response(request, data, 'text/csv', filename)
+
+
+# ---------------------- Excel ----------------------
+XLSX_HEADERS = [COLUMNS[key][0] for key in COLUMNS]
+DATE_COLUMNS = {key: i for i, key in enumerate(COLUMNS) if key in ('date_of_birth', 'date_of_visit')}
+TEXT_DATE_FORMATS = ("%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y")
+
+
+@lru_cache(maxsize=4096)
+def _text_date(value):
+    """Normalise a free-text date to YYYY-MM-DD (ISO, then day-first formats), cached per distinct value."""
+    try:
+        return datetime.fromisoformat(value).strftime("%Y-%m-%d")
+    except ValueError:
+        pass
+    for fmt in TEXT_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    return value
+
+
+def format_date(value):
+    if not value:
+        return ""
+    if isinstance(value, str):
+        return _text_date(value)
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%Y-%m-%d")
+    return value
+
+
+def xlsx_rows(queryset, chunk_size=CHUNK_SIZE):
+    """Workbook rows: 'Title Full Name' in the first column, normalised dates, assignee from SQL."""
+    rows = (
+        queryset.annotate(
+            assigned_to_name=assignee_name(),
+            display_name=Concat('title', Value(' '), 'full_name'),
+        )
+        .order_by('id')
+        .values_list('display_name', *[COLUMNS[key][1] for key in list(COLUMNS)[1:]])
+        .iterator(chunk_size=chunk_size)
+    )
+    date_positions = tuple(DATE_COLUMNS.values())
+    for row in rows:
+        row = list(row)
+        for i in date_positions:
+            row[i] = format_date(row[i])
+        yield row
+
+
+def build_xlsx(queryset, spool_limit=SPOOL_LIMIT, progress=None):
+    """
+    Write the guest sheet with a write-only workbook (rows are flushed to disk
+    as they are appended) into a file that stays in memory up to spool_limit.
+    progress(rows_written) is called every CHUNK_SIZE rows. Returns the file, rewound.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Guest Entries")
+    ws.append(XLSX_HEADERS)
+    for count, row in enumerate(xlsx_rows(queryset), start=1):
+        ws.append(row)
+        if progress and count % CHUNK_SIZE == 0:
+            progress(count)
+
+    output = tempfile.SpooledTemporaryFile(max_size=spool_limit)
+    wb.save(output)
+    output.seek(0)
+    return output
+
+
+def xlsx_response(request, queryset, filename):
+    output = build_xlsx(queryset)
+    output.seek(0, 2)
+    size = output.tell()
+    output.seek(0)
+    return streaming_response(request, file_blocks(output), XLSX_CONTENT_TYPE, filename, size=size)
+
+
+# ---------------------- Follow-up report PDF ----------------------
+def followup_reports_pdf(guest):
+    """PDF bytes listing a guest's follow-up reports, newest first."""
+    reports = FollowUpReport.objects.filter(guest=guest).order_by('-report_date')
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, title="Guest Reports")
+    elements = []
+
+    # Custom title style
+    title_style = ParagraphStyle(
+        name='Title',
+        fontSize=16,
+        leading=24,
+        alignment=1,  # Center
+        spaceAfter=20,
+    )
+
+    # Optional Logo
+    logo_path = os.path.join('static', 'your_logo.png')  # Adjust path
+    if os.path.exists(logo_path):
+        logo = Image(logo_path, width=100, height=40)
+        logo.hAlign = 'LEFT'
+        elements.append(logo)
+
+    # Title
+    elements.append(Paragraph(f"Follow-Up Report for {guest.full_name}", title_style))
+    elements.append(Spacer(1, 10))
+
+    # Table header and data
+    data = [['Date', 'Sunday', 'Midweek', 'Message', 'Assigned To']]
+    for report in reports:
+        data.append([
+            report.report_date.strftime("%Y-%m-%d"),
+            '✔️' if report.service_sunday else '',
+            '✔️' if report.service_midweek else '',
+            report.note or ''
+        ])
+
+    table = Table(data, colWidths=[80, 60, 60, 280, 80])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f0f0f0")),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor("#000000")),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('PADDING', (0, 0), (-1, -1), 6),
+    ]))
+
+    elements.append(table)
+    doc.build(elements)
+    return buffer.getvalue()
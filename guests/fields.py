@@ -0,0 +1,111 @@
+"""
+Guest detail field registry.
+
+The fields shown on guest cards are resolved once at import from
+GuestEntry._meta (name, label, choice labels, icon id, formatter) instead of
+walking _meta and calling get_FOO_display() for every guest on every request.
+Icons live in one static sprite (static/images/icons/guest-fields.svg) that
+templates and JS reference with <use href="sprite#icon">.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from django.templatetags.static import static
+from django.utils.timesince import timesince
+from django.utils.timezone import is_naive, make_aware, now
+
+from .models import GuestEntry
+
+
+HIDDEN_FIELDS = {
+    "id", "custom_id", "title", "full_name", "gender",
+    "message", "picture", "phone_number", "assigned_to",
+} | GuestEntry.INTERNAL_FIELDS
+
+ICON_SPRITE = 'images/icons/guest-fields.svg'
+
+FieldDescriptor = namedtuple('FieldDescriptor', 'name verbose_name icon choices formatter')
+
+
+def _format_date(value):
+    return value.strftime("%b. %-d, %Y")
+
+
+def _format_datetime(value):
+    return value.strftime("%b. %-d, %Y %I:%M %p")
+
+
+FORMATTERS = {
+    'date_of_visit': _format_date,
+    'assigned_at': _format_datetime,
+}
+
+
+def _build_registry():
+    return tuple(
+        FieldDescriptor(
+            name=field.name,
+            verbose_name=str(field.verbose_name).title(),
+            icon=f"guest-{field.name.replace('_', '-')}",
+            choices=dict(field.flatchoices) if field.choices else None,
+            formatter=FORMATTERS.get(field.name),
+        )
+        for field in GuestEntry._meta.fields
+        if field.name not in HIDDEN_FIELDS
+    )
+
+
+GUEST_FIELDS = _build_registry()
+FIELD_NAMES = tuple(d.name for d in GUEST_FIELDS)
+
+
+def icon_sprite_url():
+    return static(ICON_SPRITE)
+
+
+def _getter(guest):
+    """Read fields from a model instance or a values() row."""
+    if isinstance(guest, dict):
+        return guest.get
+    return lambda name: getattr(guest, name, None)
+
+
+def card_fields(guest):
+    """Field list for the guest_list_view cards (values stay Python objects for the template)."""
+    get = _getter(guest)
+    rows = []
+    for d in GUEST_FIELDS:
+        value = get(d.name)
+        if d.choices is not None:
+            value = d.choices.get(value, value)
+        rows.append({"name": d.name, "verbose_name": d.verbose_name, "value": value, "icon": d.icon})
+    return rows
+
+
+def _time_since(value, current_time):
+    dt_value = datetime.combine(value, datetime.min.time())
+    if is_naive(dt_value):
+        dt_value = make_aware(dt_value)
+    return timesince(dt_value, current_time).split(",")[0]
+
+
+def detail_fields(guest, current_time=None):
+    """JSON-ready field list for guest_detail_api."""
+    get = _getter(guest)
+    current_time = current_time or now()
+    rows = []
+    for d in GUEST_FIELDS:
+        value = get(d.name)
+        time_since = None
+        if value and d.formatter:
+            if d.name == "date_of_visit":
+                time_since = _time_since(value, current_time)
+            value = d.formatter(value)
+        rows.append({
+            "name": d.name,
+            "verbose_name": d.verbose_name,
+            "value": value,
+            "time_since": time_since,
+            "icon": d.icon,
+        })
+    return rows
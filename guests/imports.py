@@ -0,0 +1,358 @@
+"""
+Batch guest import from Excel or CSV.
+
+The sheet is streamed twice (workbooks in read-only mode): a first pass collects the
+assignee usernames (resolved with one query), the second validates and
+normalises each row and writes valid guests with chunked bulk_create.
+custom_ids are allocated as one block, the stats rollup and search columns
+are filled without per-row signals, and the import ends with one summary
+notification instead of one per guest. Rows that fail validation are
+reported by spreadsheet row number; dry_run validates without writing.
+"""
+import csv
+import io
+import re
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import openpyxl
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.urls import reverse
+from django.utils.timezone import localdate, localtime, now
+
+from gforceapp.versioning import GUEST_ASSIGNMENTS, bump_version
+
+from .models import GuestEntry
+from . import search, stats
+from .custom_ids import custom_id_block
+
+
+IMPORT_CHUNK_SIZE = 500
+USERNAME_HEADER = 'Assigned To (Username)'
+
+# Column order of the original import sheet, used when the header row is not recognised
+POSITIONAL_COLUMNS = (
+    'title', 'full_name', 'gender', 'phone_number', 'email', 'date_of_birth',
+    'marital_status', 'home_address', 'occupation', 'date_of_visit',
+    'purpose_of_visit', 'channel_of_visit', 'service_attended',
+    'referrer_name', 'referrer_phone_number', 'message',
+)
+IMPORT_FIELDS = POSITIONAL_COLUMNS + ('status', 'age_range', 'picture')
+CHOICE_FIELDS = ('title', 'gender', 'marital_status', 'purpose_of_visit',
+                 'channel_of_visit', 'service_attended', 'status', 'age_range')
+REQUIRED_FIELDS = ('full_name',)
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y", "%d %B %Y", "%d %b %Y", "%B %d, %Y")
+BIRTHDAY_FORMATS = ("%B %d", "%b %d", "%d %B", "%d %b")
+
+
+def _header_key(value):
+    return re.sub(r'[^a-z0-9]+', '_', str(value or '').lower()).strip('_')
+
+
+def _choice_key(value):
+    return re.sub(r'\s+', ' ', str(value).strip().lower()).replace('–', '-').rstrip('.')
+
+
+def _build_choice_maps():
+    maps = {}
+    for name in CHOICE_FIELDS:
+        field = GuestEntry._meta.get_field(name)
+        lookup = {}
+        for stored, label in field.flatchoices:
+            lookup[_choice_key(stored)] = stored
+            lookup[_choice_key(label)] = stored
+        maps[name] = lookup
+    return maps
+
+
+def _build_header_aliases():
+    aliases = {}
+    for name in IMPORT_FIELDS:
+        field = GuestEntry._meta.get_field(name)
+        aliases[_header_key(name)] = name
+        aliases[_header_key(field.verbose_name)] = name
+    for alias in (USERNAME_HEADER, 'assigned_to', 'username', 'assigned to username'):
+        aliases[_header_key(alias)] = 'assigned_to'
+    aliases[_header_key('picture_url')] = 'picture'  # download_csv_template's column: a Cloudinary URL
+    return aliases
+
+
+CHOICE_MAPS = _build_choice_maps()
+HEADER_ALIASES = _build_header_aliases()
+MAX_LENGTHS = {
+    name: GuestEntry._meta.get_field(name).max_length
+    for name in IMPORT_FIELDS
+    if GuestEntry._meta.get_field(name).max_length
+}
+
+
+def column_map(headers):
+    """
+    {field: column index} for a header row. Sheets in the original layout
+    (positional guest columns + 'Assigned To (Username)') are mapped by position.
+    """
+    columns = {}
+    for index, header in enumerate(headers):
+        field = HEADER_ALIASES.get(_header_key(header))
+        if field and field not in columns:
+            columns[field] = index
+    if 'full_name' not in columns or 'title' not in columns:
+        positional = {field: i for i, field in enumerate(POSITIONAL_COLUMNS)}
+        positional.update({k: v for k, v in columns.items() if k not in positional})
+        columns = positional
+    return columns
+
+
+# ---------------------- Cell normalisation ----------------------
+def clean_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # phone numbers typed as numbers
+    if isinstance(value, datetime):
+        value = value.date()
+    return str(value).strip()
+
+
+def clean_choice(field, value):
+    text = clean_text(value)
+    if not text:
+        return ''
+    stored = CHOICE_MAPS[field].get(_choice_key(text))
+    if stored is None:
+        raise ValidationError(f"'{text}' is not a valid {GuestEntry._meta.get_field(field).verbose_name}")
+    return stored
+
+
+def parse_date(value):
+    """date from a date/datetime cell or a text date, None when blank; raises on unreadable text."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = clean_text(value)
+    if not text:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValidationError(f"'{text}' is not a recognised date")
+
+
+def clean_birthday(value):
+    """Date of birth in the guest form's format ('April 01'); a year, if given, is dropped."""
+    if not isinstance(value, (date, datetime)):
+        text = clean_text(value)
+        if not text:
+            return ''
+        for fmt in BIRTHDAY_FORMATS:
+            try:
+                return datetime.strptime(text, fmt).strftime("%B %d")
+            except ValueError:
+                continue
+        try:
+            value = parse_date(text)
+        except ValidationError:
+            raise ValidationError(f"'{text}' is not a valid date of birth (e.g. January 01)")
+    return value.strftime("%B %d")
+
+
+def clean_row(row, columns):
+    """Normalised field values for one sheet row; raises ValidationError with every problem found."""
+    def cell(field):
+        index = columns.get(field)
+        return row[index] if index is not None and index < len(row) else None
+
+    values, problems = {}, []
+    for field in IMPORT_FIELDS:
+        try:
+            if field in CHOICE_FIELDS:
+                values[field] = clean_choice(field, cell(field))
+            elif field == 'date_of_birth':
+                values[field] = clean_birthday(cell(field))
+            elif field == 'date_of_visit':
+                values[field] = parse_date(cell(field)) or localdate()
+            elif field == 'picture':
+                values[field] = clean_text(cell(field)) or None
+            else:
+                values[field] = clean_text(cell(field))
+        except ValidationError as e:
+            problems.extend(e.messages)
+            continue
+        limit = MAX_LENGTHS.get(field)
+        if limit and isinstance(values[field], str) and len(values[field]) > limit:
+            problems.append(f"{GuestEntry._meta.get_field(field).verbose_name} is longer than {limit} characters")
+
+    for field in REQUIRED_FIELDS:
+        if field in values and not values[field]:
+            problems.append(f"{GuestEntry._meta.get_field(field).verbose_name} is required")
+    if values.get('email'):
+        try:
+            validate_email(values['email'])
+        except ValidationError:
+            problems.append(f"'{values['email']}' is not a valid email")
+
+    if problems:
+        raise ValidationError(problems)
+    values['username'] = clean_text(cell('assigned_to'))
+    return values
+
+
+# ---------------------- Import ----------------------
+class ImportReport:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.created = 0
+        self.errors = []  # [(sheet row number, message)]
+        self.assigned = {}  # assignee -> number of guests
+
+    @property
+    def valid(self):
+        return self.rows - len(self.errors)
+
+    def add_error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+    def as_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'rows': self.rows,
+            'valid': self.valid,
+            'created': self.created,
+            'errors': [{'row': row, 'error': message} for row, message in self.errors],
+        }
+
+
+@contextmanager
+def _sheet(file, is_csv=False):
+    """Iterator over the rows of an .xlsx workbook's active sheet or a UTF-8 CSV file, header first."""
+    file.seek(0)
+    if is_csv:
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        try:
+            yield (tuple(row) for row in csv.reader(text))
+        finally:
+            text.detach()  # leave `file` open for the second pass
+        return
+    wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _data_rows(rows):
+    """(row number, values) for non-empty rows below the header."""
+    for number, row in enumerate(rows, start=2):
+        if any(value not in (None, '') for value in row):
+            yield number, row
+
+
+def _scan(file, is_csv=False):
+    """
+    First pass: the column map, the number of data rows and every username
+    referenced by the sheet, resolved in one query.
+    Returns (columns, {username: user}, rows).
+    """
+    with _sheet(file, is_csv) as rows:
+        columns = column_map(next(rows, ()))
+        index = columns.get('assigned_to')
+        if index is None:
+            return columns, {}, 0
+        usernames, total = set(), 0
+        for _, row in _data_rows(rows):
+            total += 1
+            if index < len(row) and clean_text(row[index]):
+                usernames.add(clean_text(row[index]))
+    users = get_user_model().objects.filter(username__in=usernames)
+    return columns, {user.username: user for user in users}, total
+
+
+def _write_chunk(guests):
+    for guest, custom_id in zip(guests, custom_id_block(len(guests))):
+        guest.custom_id = custom_id
+        search.index_guest(guest)
+    created = GuestEntry.objects.bulk_create(guests)
+    written = GuestEntry.objects.filter(pk__in=[g.pk for g in created])
+    stats.record_guests(written)
+    search.refresh_vectors(written)
+    return len(created)
+
+
+def import_guests(file, importer=None, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE, progress=None, is_csv=False):
+    """
+    Validate and import an .xlsx guest sheet (or a CSV file with is_csv); returns an ImportReport.
+    progress(rows_done, rows_total) is called after every chunk_size rows.
+    """
+    report = ImportReport(dry_run=dry_run)
+
+    columns, assignees, total = _scan(file, is_csv)
+    if 'assigned_to' not in columns:
+        report.add_error(1, f"Missing '{USERNAME_HEADER}' column")
+        return report
+
+    assigned_at = now()
+    with _sheet(file, is_csv) as rows:
+        next(rows, None)  # header
+        with transaction.atomic():
+            batch = []
+            for number, row in _data_rows(rows):
+                report.rows += 1
+                if progress and report.rows % chunk_size == 0:
+                    progress(report.rows, total)
+                try:
+                    values = clean_row(row, columns)
+                except ValidationError as e:
+                    report.add_error(number, '; '.join(e.messages))
+                    continue
+                username = values.pop('username')
+                user = assignees.get(username)
+                if user is None:
+                    report.add_error(number, f"User '{username}' not found" if username else "No assignee username")
+                    continue
+
+                report.assigned[user] = report.assigned.get(user, 0) + 1
+                if dry_run:
+                    continue
+                batch.append(GuestEntry(**values, assigned_to=user, assigned_at=assigned_at))
+                if len(batch) >= chunk_size:
+                    report.created += _write_chunk(batch)
+                    batch = []
+            if batch:
+                report.created += _write_chunk(batch)
+
+    if report.created:
+        transaction.on_commit(lambda: bump_version(GUEST_ASSIGNMENTS))
+        transaction.on_commit(lambda: notify_import(report, importer))
+    return report
+
+
+def notify_import(report, importer=None):
+    """One summary for admins and the importer, one count per assignee (instead of a notice per guest)."""
+    from notifications.utils import notify_users, get_user_role, user_full_name
+
+    User = get_user_model()
+    link = reverse('guest_list')
+    ts = localtime().strftime("%b. %d, %Y - %H:%M")
+    summary = (
+        f"{report.created} guests imported by {user_full_name(importer)}, at {ts}.\n"
+        f"Rows skipped: {len(report.errors)}.\n"
+        f"New Guest Count: {GuestEntry.objects.count()}."
+    )
+    admins = [
+        u for u in User.objects.filter(is_active=True)
+        if u.is_superuser or get_user_role(u) in ["Admin", "Magnet Admin"]
+    ]
+    if importer is not None and importer not in admins:
+        admins.append(importer)
+    notify_users(admins, "Guests Imported", summary, link, is_success=True)
+
+    for user, count in report.assigned.items():
+        noun = "guest" if count == 1 else "guests"
+        notify_users([user], "Guests Assigned", f"I have been assigned {count} imported {noun}, at {ts}.", link, is_success=True)
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from guests.models import GuestEntry
+from guests import custom_ids
 from django.db import transaction
 
 class Command(BaseCommand):
@@ -20,4 +21,7 @@ class Command(BaseCommand):
                 self.stdout.write(f"Assigned custom_id={guest.custom_id} to guest id={guest.id} (date_of_visit={guest.date_of_visit})")
                 current_custom_id += 1
 
+            # New guests continue after the renumbered ones
+            custom_ids.sync()
+
         self.stdout.write(self.style.SUCCESS("Successfully assigned custom_id to all guests."))
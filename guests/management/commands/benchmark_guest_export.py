@@ -0,0 +1,149 @@
+import resource
+import time
+import tracemalloc
+from datetime import datetime
+from io import BytesIO
+
+import openpyxl
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import CustomUser
+from guests.exports import build_xlsx
+from guests.models import GuestEntry
+from jobs.utils import enqueue, run_job
+
+SERVICE = "Benchmark Export"
+ASSIGNEES = 50
+
+
+class Rollback(Exception):
+    pass
+
+
+def safe_date(value):
+    """The previous views.safe_date: parses every cell again, no caching."""
+    if not value:
+        return ""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).strftime("%Y-%m-%d")
+        except:
+            # Try flexible formats
+            for fmt in ("%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y"):
+                try:
+                    return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+                except:
+                    pass
+            return value  # return raw string if all parsing fails
+    return value.strftime("%Y-%m-%d")
+
+
+def legacy_export(guests):
+    """The previous export_guests_excel body: full Workbook in memory, N+1 on assigned_to."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Guest Entries"
+    ws.append(['Full Name', 'Phone Number', 'Email', 'Gender', 'Date of Birth', 'Marital Status',
+               'Home Address', 'Occupation', 'Date of Visit', 'Purpose of Visit', 'Channel of Visit',
+               'Service Attended', 'Referrer Name', 'Referrer Phone Number', 'Status', 'Assigned To'])
+    for guest in guests:
+        ws.append([
+            f"{guest.title} {guest.full_name}", guest.phone_number, guest.email, guest.gender,
+            safe_date(guest.date_of_birth), guest.marital_status, guest.home_address, guest.occupation,
+            safe_date(guest.date_of_visit), guest.purpose_of_visit, guest.channel_of_visit,
+            guest.service_attended, guest.referrer_name, guest.referrer_phone_number, guest.status,
+            guest.assigned_to.get_full_name() if guest.assigned_to else '',
+        ])
+    output = BytesIO()
+    wb.save(output)
+    return output.getbuffer().nbytes
+
+
+def streaming_export(guests):
+    output = build_xlsx(guests)
+    output.seek(0, 2)
+    size = output.tell()
+    output.close()
+    return size
+
+
+def job_export(owner):
+    """The shipped background path: enqueue guests.export_excel and run it as the worker would."""
+    def export(guests):
+        job = run_job(enqueue('guests.export_excel', owner, params={'service': SERVICE}).pk)
+        if job.status != job.SUCCEEDED:
+            raise RuntimeError(job.error)
+        size = job.result_file.size
+        job.result_file.delete(save=False)  # the rollback does not reach storage
+        return size
+    return export
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare peak memory and wall time of the write-only Excel export, and of the job that runs it, "
+        "against the old in-memory one"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--skip-legacy', action='store_true', help="Only time the write-only exporter")
+
+    def measure(self, label, fn, guests):
+        # Timed run first, then a tracemalloc run for the Python heap peak (tracing skews timings)
+        rss_before = max_rss_mb()
+        started = time.perf_counter()
+        size = fn(guests)
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        fn(guests)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f"  {label:<12} {elapsed:8.2f}s  peak heap {peak / 1024 / 1024:8.1f} MB  "
+            f"max RSS +{max_rss_mb() - rss_before:7.1f} MB  file {size / 1024:8.0f} KB"
+        )
+
+    def seed(self, count):
+        """`count` guests spread over ASSIGNEES workers (so the legacy path pays its assigned_to N+1), plus an admin owning the job."""
+        prefix = "BENCH"
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f"bench_assignee_{i}", first_name="Bench", last_name=f"Worker {i}", password="!")
+            for i in range(ASSIGNEES)
+        ])
+        assignees = list(CustomUser.objects.filter(username__startswith="bench_assignee_"))
+        owner = CustomUser.objects.create(username="bench_export_owner", is_superuser=True, password="!")
+        GuestEntry.objects.bulk_create(
+            [
+                GuestEntry(
+                    custom_id=f"{prefix}{i:08d}", title="Mr.", full_name=f"Benchmark Guest {i}",
+                    gender="Male", phone_number=f"0803{i:07d}", email=f"guest{i}@example.com",
+                    date_of_birth="14/02/1990", service_attended=SERVICE, status="Work in Progress",
+                    assigned_to=assignees[i % len(assignees)],
+                )
+                for i in range(count)
+            ],
+            batch_size=2000,
+        )
+        return GuestEntry.objects.filter(custom_id__startswith=prefix), owner
+
+    def handle(self, *args, **options):
+        for count in options['rows']:
+            self.stdout.write(f"{count} guests:")
+            try:
+                with transaction.atomic():
+                    guests, owner = self.seed(count)
+                    # New paths first: max RSS only ever grows, so their deltas are not hidden by the legacy run
+                    self.measure("write-only", streaming_export, guests)
+                    self.measure("job", job_export(owner), guests)
+                    if not options['skip_legacy']:
+                        self.measure("legacy", legacy_export, guests)
+                    raise Rollback
+            except Rollback:
+                pass
+        self.stdout.write(self.style.SUCCESS("Benchmark finished (seeded rows rolled back)."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from guests.models import GuestEntry
+from guests import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the guest search document, phone digits and search vector"
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding guest search index...")
+        indexed = search.reindex(GuestEntry.objects.all())
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} guests."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from guests import stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the guest statistics rollup from GuestEntry"
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding guest statistics...")
+        buckets = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {buckets} guest statistics buckets."))
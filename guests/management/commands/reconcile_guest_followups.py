@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from guests import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute per-guest report_count, last_reported and unread_reviews where they have drifted"
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconciling guest follow-up counters...")
+        drifted = stats.reconcile_followup_stats()
+        self.stdout.write(self.style.SUCCESS(f"Repaired {drifted} guest(s)."))
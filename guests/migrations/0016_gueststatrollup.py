@@ -0,0 +1,63 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:36
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+DIMENSIONS = ('service_attended', 'channel_of_visit', 'purpose_of_visit', 'status')
+
+
+def build_rollup(apps, schema_editor):
+    GuestEntry = apps.get_model('guests', 'GuestEntry')
+    GuestStatRollup = apps.get_model('guests', 'GuestStatRollup')
+
+    buckets = {}
+    rows = (
+        GuestEntry.objects
+        .annotate(year=ExtractYear('date_of_visit'), month=ExtractMonth('date_of_visit'))
+        .values('year', 'month', 'assigned_to_id', *DIMENSIONS)
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        key = (row['year'], row['month'], *[row[f] or '' for f in DIMENSIONS], row['assigned_to_id'] or 0)
+        buckets[key] = buckets.get(key, 0) + row['total']
+
+    GuestStatRollup.objects.bulk_create([
+        GuestStatRollup(
+            year=key[0], month=key[1],
+            service_attended=key[2], channel_of_visit=key[3], purpose_of_visit=key[4], status=key[5],
+            assignee_id=key[6], guest_count=count,
+        )
+        for key, count in buckets.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guests', '0015_guestentry_age_range_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GuestStatRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('service_attended', models.CharField(blank=True, max_length=50)),
+                ('channel_of_visit', models.CharField(blank=True, max_length=30)),
+                ('purpose_of_visit', models.CharField(blank=True, max_length=30)),
+                ('status', models.CharField(blank=True, max_length=30)),
+                ('assignee_id', models.BigIntegerField(db_index=True, default=0)),
+                ('guest_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['year', 'month'], name='guests_gues_year_559da3_idx')],
+                'unique_together': {('year', 'month', 'service_attended', 'channel_of_visit', 'purpose_of_visit', 'status', 'assignee_id')},
+            },
+        ),
+        migrations.RunPython(build_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:37
+
+import re
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+# Frozen copies of guests.search as of this migration, so later changes to
+# that module do not change what the backfill writes
+DOCUMENT_FIELDS = (
+    'title', 'full_name', 'phone_number', 'email', 'referrer_name',
+    'referrer_phone_number', 'service_attended', 'status',
+    'channel_of_visit', 'purpose_of_visit',
+)
+_NON_DIGIT = re.compile(r'\D+')
+_SPACES = re.compile(r'\s+')
+
+
+def phone_key(value):
+    digits = _NON_DIGIT.sub('', value or '')
+    if digits.startswith('234') and len(digits) > 10:
+        digits = digits[3:]
+    return digits.lstrip('0')
+
+
+def build_document(values, assignee_name=''):
+    parts = [values.get(field) or '' for field in DOCUMENT_FIELDS]
+    parts.append(assignee_name or '')
+    parts.extend(phone_key(values.get(field)) for field in ('phone_number', 'referrer_phone_number'))
+    return _SPACES.sub(' ', ' '.join(str(p) for p in parts if p)).strip().lower()
+
+
+def build_phone_digits(values):
+    keys = [phone_key(values.get(field)) for field in ('phone_number', 'referrer_phone_number')]
+    return ' '.join(k for k in keys if k)
+
+
+POSTGRES_INDEXES = [
+    ("guests_guestentry_search_vector_gin",
+     "CREATE INDEX IF NOT EXISTS {name} ON guests_guestentry USING gin (search_vector)"),
+    ("guests_guestentry_search_document_trgm",
+     "CREATE INDEX IF NOT EXISTS {name} ON guests_guestentry USING gin (search_document gin_trgm_ops)"),
+    ("guests_guestentry_phone_digits_trgm",
+     "CREATE INDEX IF NOT EXISTS {name} ON guests_guestentry USING gin (phone_digits gin_trgm_ops)"),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, sql in POSTGRES_INDEXES:
+        schema_editor.execute(sql.format(name=name))
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in POSTGRES_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def backfill_search_columns(apps, schema_editor):
+    GuestEntry = apps.get_model('guests', 'GuestEntry')
+    batch = []
+    for guest in GuestEntry.objects.select_related('assigned_to').iterator(chunk_size=500):
+        values = {field: getattr(guest, field) for field in DOCUMENT_FIELDS}
+        assignee = guest.assigned_to
+        assignee_name = (assignee.full_name or f"{assignee.first_name} {assignee.last_name}".strip()) if assignee else ''
+        guest.search_document = build_document(values, assignee_name)
+        guest.phone_digits = build_phone_digits(values)
+        batch.append(guest)
+        if len(batch) >= 500:
+            GuestEntry.objects.bulk_update(batch, ['search_document', 'phone_digits'])
+            batch = []
+    if batch:
+        GuestEntry.objects.bulk_update(batch, ['search_document', 'phone_digits'])
+
+    if schema_editor.connection.vendor == 'postgresql':
+        GuestEntry.objects.update(
+            search_vector=django.contrib.postgres.search.SearchVector('search_document', config='simple')
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guests', '0016_gueststatrollup'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='guestentry',
+            name='phone_digits',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='guestentry',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='guestentry',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_search_columns, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
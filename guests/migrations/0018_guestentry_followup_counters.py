@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:40
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_followup_counters(apps, schema_editor):
+    GuestEntry = apps.get_model('guests', 'GuestEntry')
+    FollowUpReport = apps.get_model('guests', 'FollowUpReport')
+    Review = apps.get_model('guests', 'Review')
+
+    reports = FollowUpReport.objects.filter(guest=OuterRef('pk')).order_by().values('guest')
+    unread = Review.objects.filter(guest=OuterRef('pk'), is_read=False).order_by().values('guest')
+    GuestEntry.objects.update(
+        report_count=Coalesce(Subquery(reports.annotate(n=Count('id')).values('n')), 0),
+        last_reported=Subquery(reports.annotate(last=Max('report_date')).values('last')),
+        unread_reviews=Coalesce(Subquery(unread.annotate(n=Count('id')).values('n')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guests', '0017_guestentry_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='guestentry',
+            name='last_reported',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='guestentry',
+            name='report_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='guestentry',
+            name='unread_reviews',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_followup_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:58
+
+import re
+
+from django.db import migrations, models
+
+
+PREFIX = 'GNG'
+SEQUENCE_NAME = 'guests_custom_id_seq'
+
+
+def highest_custom_id(GuestEntry):
+    numbers = [
+        int(m.group(1))
+        for value in GuestEntry.objects.filter(custom_id__startswith=PREFIX).values_list('custom_id', flat=True).iterator()
+        if (m := re.fullmatch(rf'{PREFIX}(\d+)', value))
+    ]
+    return max(numbers, default=0)
+
+
+def create_allocator(apps, schema_editor):
+    """Start the sequence (Postgres) or the counter row after the highest existing custom_id."""
+    GuestEntry = apps.get_model('guests', 'GuestEntry')
+    highest = highest_custom_id(GuestEntry)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE_NAME}")
+        schema_editor.execute("SELECT setval(%s, %s, %s)", [SEQUENCE_NAME, max(highest, 1), highest > 0])
+    else:
+        CustomIdCounter = apps.get_model('guests', 'CustomIdCounter')
+        CustomIdCounter.objects.update_or_create(prefix=PREFIX, defaults={'last_value': highest})
+
+
+def drop_allocator(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f"DROP SEQUENCE IF EXISTS {SEQUENCE_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guests', '0018_guestentry_followup_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomIdCounter',
+            fields=[
+                ('prefix', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_allocator, drop_allocator),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.4 on 2026-10-17 21:40
+
+import re
+
+from django.db import migrations
+from django.db.models import Q
+
+
+# Frozen copies of guests.custom_ids as of this migration
+PREFIX = 'GNG'
+SEQUENCE_NAME = 'guests_custom_id_seq'
+
+
+def format_custom_id(number):
+    return f'{PREFIX}{number:06d}'
+
+
+def highest_custom_id(GuestEntry):
+    numbers = [
+        int(m.group(1))
+        for value in GuestEntry.objects.filter(custom_id__startswith=PREFIX).values_list('custom_id', flat=True).iterator()
+        if (m := re.fullmatch(rf'{PREFIX}(\d+)', value))
+    ]
+    return max(numbers, default=0)
+
+
+def allocate(apps, schema_editor, count):
+    """`count` unused numbers from the allocator set up by migration 0019."""
+    if schema_editor.connection.vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [SEQUENCE_NAME, count])
+            return sorted(row[0] for row in cursor.fetchall())
+    GuestEntry = apps.get_model('guests', 'GuestEntry')
+    CustomIdCounter = apps.get_model('guests', 'CustomIdCounter')
+    counter, _ = CustomIdCounter.objects.get_or_create(
+        prefix=PREFIX, defaults={'last_value': highest_custom_id(GuestEntry)},
+    )
+    first = counter.last_value + 1
+    counter.last_value += count
+    counter.save(update_fields=['last_value'])
+    return list(range(first, first + count))
+
+
+def backfill_custom_ids(apps, schema_editor):
+    """Give legacy guests without a custom_id the next ones, oldest first, so the column can be NOT NULL."""
+    GuestEntry = apps.get_model('guests', 'GuestEntry')
+    guests = list(
+        GuestEntry.objects.filter(Q(custom_id__isnull=True) | Q(custom_id='')).order_by('id').only('id')
+    )
+    if not guests:
+        return
+    for guest, number in zip(guests, allocate(apps, schema_editor, len(guests))):
+        guest.custom_id = format_custom_id(number)
+    GuestEntry.objects.bulk_update(guests, ['custom_id'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guests', '0019_customidcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_custom_ids, migrations.RunPython.noop),
+    ]
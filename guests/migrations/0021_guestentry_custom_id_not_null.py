@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-17 21:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guests', '0020_backfill_custom_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='guestentry',
+            name='custom_id',
+            field=models.CharField(blank=True, editable=False, max_length=20, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='guestentry',
+            index=models.Index(fields=['-custom_id', '-id'], name='guest_list_order_idx'),
+        ),
+    ]
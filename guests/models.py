@@ -1,7 +1,7 @@
-import re
 from django.db import models
 from django.conf import settings
 from django.utils.timezone import localdate
+from django.contrib.postgres.search import SearchVectorField
 from cloudinary.models import CloudinaryField
 
 
@@ -51,7 +51,7 @@ class GuestEntry(models.Model):
   ]
 
   picture = CloudinaryField('image', blank=True, null=True)
-  custom_id = models.CharField(max_length=20, unique=True, blank=True, null=True, editable=False)
+  custom_id = models.CharField(max_length=20, unique=True, blank=True, editable=False)
   title = models.CharField(max_length=20, choices=TITLE_CHOICES, blank=False)
   full_name = models.CharField(max_length=100)
   gender = models.CharField(max_length=10, choices=GENDER_CHOICES, blank=False)
@@ -79,6 +79,28 @@ class GuestEntry(models.Model):
   )
   assigned_at = models.DateTimeField(null=True, blank=True, editable=False)
 
+  # Bookkeeping columns that are never shown as guest details
+  INTERNAL_FIELDS = {
+    'search_document', 'phone_digits', 'search_vector',
+    'report_count', 'last_reported', 'unread_reviews',
+  }
+
+  # Search columns, maintained by guests.search (GIN indexes are Postgres-only, see migration 0017)
+  search_document = models.TextField(blank=True, default='', editable=False)
+  phone_digits = models.CharField(max_length=64, blank=True, default='', editable=False)
+  search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
+  # Follow-up counters, maintained by guests.stats.refresh_followup_stats
+  report_count = models.PositiveIntegerField(default=0, editable=False)
+  last_reported = models.DateField(null=True, blank=True, editable=False)
+  unread_reviews = models.PositiveIntegerField(default=0, editable=False)
+
+  class Meta:
+    indexes = [
+      # The guest list's keyset order (views.guest_list): every page is one index range scan
+      models.Index(fields=['-custom_id', '-id'], name='guest_list_order_idx'),
+    ]
+
 
   def save(self, *args, **kwargs):
     if self.assigned_to and not self.assigned_at:
@@ -86,14 +108,8 @@ class GuestEntry(models.Model):
         self.assigned_at = now()
 
     if not self.custom_id:
-      prefix = 'GNG'
-      last_guest = GuestEntry.objects.filter(custom_id__startswith=prefix).order_by('-custom_id').first()
-      if last_guest and last_guest.custom_id:
-        last_num = int(re.sub(r'^\D+', '', last_guest.custom_id))
-        new_num = last_num + 1
-      else:
-        new_num = 1
-      self.custom_id = f'{prefix}{new_num:06d}'
+      from .custom_ids import next_custom_id
+      self.custom_id = next_custom_id()
     super().save(*args, **kwargs)
 
   @property
@@ -189,4 +205,37 @@ class Review(models.Model):
 
     @property
     def has_unread_reviews(self):
-        return self.reviews.filter(is_read=False).exists()
\ No newline at end of file
+        return self.reviews.filter(is_read=False).exists()
+
+class GuestStatRollup(models.Model):
+    """Number of guests in one (year, month, service, channel, purpose, status, assignee) bucket."""
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    service_attended = models.CharField(max_length=50, blank=True)
+    channel_of_visit = models.CharField(max_length=30, blank=True)
+    purpose_of_visit = models.CharField(max_length=30, blank=True)
+    status = models.CharField(max_length=30, blank=True)
+    # Plain id rather than a FK so "unassigned" (0) stays part of the unique key
+    assignee_id = models.BigIntegerField(default=0, db_index=True)
+    guest_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (
+            'year', 'month', 'service_attended', 'channel_of_visit',
+            'purpose_of_visit', 'status', 'assignee_id',
+        )
+        indexes = [
+            models.Index(fields=['year', 'month']),
+        ]
+
+    def __str__(self):
+        return f"{self.year}-{self.month:02d} {self.service_attended or '-'}: {self.guest_count}"
+
+
+class CustomIdCounter(models.Model):
+    """Last number handed out per custom_id prefix (used by guests.custom_ids where there is no sequence)."""
+    prefix = models.CharField(max_length=10, primary_key=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.prefix}: {self.last_value}"
@@ -0,0 +1,128 @@
+"""
+Guest search.
+
+Each guest carries a lower-cased `search_document` (name, phones, email,
+referrer, service, status, channel, purpose, assignee name) and a
+`phone_digits` key with formatting and the country prefix stripped. On
+Postgres the document also feeds a `search_vector` column and a trigram GIN
+index, so full-text, partial and misspelled-name searches use indexes. Other
+databases (SQLite in development) fall back to substring matching on the
+same document.
+
+guest_list_view, export_csv and export_guests_excel all go through search_guests().
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db import connection
+from django.db.models import Q
+
+from .models import GuestEntry
+
+
+DOCUMENT_FIELDS = (
+    'title', 'full_name', 'phone_number', 'email', 'referrer_name',
+    'referrer_phone_number', 'service_attended', 'status',
+    'channel_of_visit', 'purpose_of_visit',
+)
+MIN_PHONE_DIGITS = 4
+
+_PHONE_QUERY = re.compile(r'^[\d\s+()\-.]+$')
+_NON_DIGIT = re.compile(r'\D+')
+_SPACES = re.compile(r'\s+')
+
+
+def is_postgres():
+    return connection.vendor == 'postgresql'
+
+
+# ---------------------- Document building ----------------------
+def phone_key(value):
+    """Digits of a phone number without the +234 / 0 trunk prefix: '+234 (803) 123-4567' -> '8031234567'."""
+    digits = _NON_DIGIT.sub('', value or '')
+    if digits.startswith('234') and len(digits) > 10:
+        digits = digits[3:]
+    return digits.lstrip('0')
+
+
+def build_document(values, assignee_name=''):
+    """Lower-cased text searched by every guest search, built from a dict of guest fields."""
+    parts = [values.get(field) or '' for field in DOCUMENT_FIELDS]
+    parts.append(assignee_name or '')
+    parts.extend(phone_key(values.get(field)) for field in ('phone_number', 'referrer_phone_number'))
+    return _SPACES.sub(' ', ' '.join(str(p) for p in parts if p)).strip().lower()
+
+
+def build_phone_digits(values):
+    keys = [phone_key(values.get(field)) for field in ('phone_number', 'referrer_phone_number')]
+    return ' '.join(k for k in keys if k)
+
+
+def index_guest(guest):
+    """Fill search_document and phone_digits on an unsaved instance."""
+    values = {field: getattr(guest, field) for field in DOCUMENT_FIELDS}
+    assignee = guest.assigned_to if guest.assigned_to_id else None
+    assignee_name = (assignee.full_name or assignee.get_full_name()) if assignee else ''
+    guest.search_document = build_document(values, assignee_name)
+    guest.phone_digits = build_phone_digits(values)
+
+
+def refresh_vectors(queryset):
+    """Recompute search_vector from search_document (Postgres only, no-op elsewhere)."""
+    if not is_postgres():
+        return
+    queryset.update(search_vector=SearchVector('search_document', config='simple'))
+
+
+def reindex(queryset, batch_size=500):
+    """Rebuild the search columns for guests written without signals. Returns the number indexed."""
+    indexed = 0
+    batch = []
+    for guest in queryset.select_related('assigned_to').iterator(chunk_size=batch_size):
+        index_guest(guest)
+        batch.append(guest)
+        if len(batch) >= batch_size:
+            GuestEntry.objects.bulk_update(batch, ['search_document', 'phone_digits'])
+            indexed += len(batch)
+            batch = []
+    if batch:
+        GuestEntry.objects.bulk_update(batch, ['search_document', 'phone_digits'])
+        indexed += len(batch)
+    refresh_vectors(queryset)
+    return indexed
+
+
+# ---------------------- Querying ----------------------
+def _phone_filter(query):
+    if not _PHONE_QUERY.match(query):
+        return None
+    digits = phone_key(query)
+    if len(digits) < MIN_PHONE_DIGITS:
+        return None
+    return Q(phone_digits__contains=digits)
+
+
+def search_guests(queryset, query):
+    """Restrict a GuestEntry queryset to guests matching a free-text query."""
+    query = _SPACES.sub(' ', (query or '').strip()).lower()
+    if not query:
+        return queryset
+
+    phone = _phone_filter(query)
+    if phone is not None:
+        return queryset.filter(phone)
+
+    terms = query.split(' ')
+    contains_all = Q()
+    for term in terms:
+        contains_all &= Q(search_document__contains=term)
+
+    if not is_postgres():
+        return queryset.filter(contains_all)
+
+    # Full-text words, partial words (trigram-indexed LIKE) or a close misspelling
+    return queryset.filter(
+        Q(search_vector=SearchQuery(query, config='simple', search_type='websearch'))
+        | contains_all
+        | Q(search_document__trigram_word_similar=query)
+    )
@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.db.models.signals import pre_save, post_save, post_delete, post_init
+from django.dispatch import receiver
+
+from .models import GuestEntry, FollowUpReport, Review
+from gforceapp.versioning import GUEST_ASSIGNMENTS, bump_version
+from . import search, stats
+
+
+# ---------------------- Guest statistics rollup ----------------------
+@receiver(pre_save, sender=GuestEntry)
+def cache_old_stats_key(sender, instance, raw=False, **kwargs):
+    instance._old_stats_key = None
+    if instance.pk and not raw:
+        instance._old_stats_key = stats.stored_key(instance.pk)
+
+
+@receiver(post_save, sender=GuestEntry)
+def update_guest_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    stats.move_guest(getattr(instance, '_old_stats_key', None), stats.guest_key(instance))
+
+
+@receiver(post_delete, sender=GuestEntry)
+def remove_guest_stats(sender, instance, **kwargs):
+    stats.apply_delta(stats.guest_key(instance), -1)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def fold_deleted_assignee_stats(sender, instance, **kwargs):
+    stats.fold_assignee(instance.pk)
+
+
+# ---------------------- Search columns ----------------------
+NAME_FIELDS = {'full_name', 'first_name', 'last_name'}
+
+
+@receiver(pre_save, sender=GuestEntry)
+def index_guest_for_search(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_guest(instance)
+
+
+@receiver(post_save, sender=GuestEntry)
+def refresh_guest_search_vector(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    guest = GuestEntry.objects.filter(pk=instance.pk)
+    if update_fields is not None:
+        # save(update_fields=...) skipped the columns filled in pre_save
+        guest.update(search_document=instance.search_document, phone_digits=instance.phone_digits)
+    search.refresh_vectors(guest)
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def cache_old_assignee_name(sender, instance, update_fields=None, **kwargs):
+    instance._old_search_name = None
+    if instance.pk and (update_fields is None or NAME_FIELDS & set(update_fields)):
+        instance._old_search_name = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list('full_name', 'first_name', 'last_name').first()
+        )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reindex_assigned_guests(sender, instance, created, **kwargs):
+    old = getattr(instance, '_old_search_name', None)
+    if created or old is None:
+        return
+    if old != (instance.full_name, instance.first_name, instance.last_name):
+        search.reindex(GuestEntry.objects.filter(assigned_to=instance))
+
+
+# ---------------------- Follow-up counters ----------------------
+@receiver(post_init, sender=FollowUpReport)
+@receiver(post_init, sender=Review)
+def remember_loaded_guest(sender, instance, **kwargs):
+    instance._loaded_guest_id = instance.guest_id
+
+
+@receiver(post_save, sender=FollowUpReport)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=FollowUpReport)
+@receiver(post_delete, sender=Review)
+def refresh_guest_followups(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    stats.refresh_followup_stats(instance.guest_id, getattr(instance, '_loaded_guest_id', None))
+    instance._loaded_guest_id = instance.guest_id
+
+
+# ---------------------- Cached guest payloads ----------------------
+@receiver(post_save, sender=GuestEntry)
+@receiver(post_delete, sender=GuestEntry)
+def guest_assignments_changed(sender, raw=False, **kwargs):
+    if not raw:
+        bump_version(GUEST_ASSIGNMENTS)
@@ -0,0 +1,337 @@
+"""
+Incrementally maintained guest statistics.
+
+Every guest belongs to exactly one GuestStatRollup bucket keyed by
+(year, month, service, channel, purpose, status, assignee). Signals move a
+guest between buckets as it is created, edited, reassigned or deleted, so the
+dashboards only ever sum a handful of small rows instead of scanning GuestEntry.
+"""
+import calendar
+from datetime import date, datetime, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+from django.utils.dateparse import parse_date
+
+from .models import FollowUpReport, GuestEntry, GuestStatRollup, Review
+
+
+DIMENSIONS = ('service_attended', 'channel_of_visit', 'purpose_of_visit', 'status')
+KEY_FIELDS = ('year', 'month') + DIMENSIONS + ('assignee_id',)
+PURPOSES = ["Home Church", "Occasional Visit", "One-Time Visit", "Special Programme"]
+
+
+# ---------------------- Bucket keys ----------------------
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        return parse_date(value.strip())
+    return None
+
+
+def key_from_values(values):
+    """Build a bucket key from a dict holding date_of_visit, the dimensions and assigned_to_id."""
+    visit = _as_date(values.get('date_of_visit'))
+    if visit is None:
+        return None
+    return (
+        visit.year,
+        visit.month,
+        *[(values.get(field) or '') for field in DIMENSIONS],
+        values.get('assigned_to_id') or 0,
+    )
+
+
+def stored_key(pk):
+    """Bucket key of the guest as currently stored in the database."""
+    values = (
+        GuestEntry.objects.filter(pk=pk)
+        .values('date_of_visit', 'assigned_to_id', *DIMENSIONS)
+        .first()
+    )
+    return key_from_values(values) if values else None
+
+
+def guest_key(guest):
+    values = {field: getattr(guest, field) for field in DIMENSIONS}
+    values['date_of_visit'] = guest.date_of_visit
+    values['assigned_to_id'] = guest.assigned_to_id
+    key = key_from_values(values)
+    if key is None and guest.pk:
+        # Unparsed values (e.g. raw import strings) — trust what was saved
+        key = stored_key(guest.pk)
+    return key
+
+
+# ---------------------- Counter updates ----------------------
+def apply_delta(key, delta):
+    """Add delta to the bucket for key, creating the bucket on first use."""
+    if key is None or not delta:
+        return
+    lookup = dict(zip(KEY_FIELDS, key))
+    updated = GuestStatRollup.objects.filter(**lookup).update(guest_count=F('guest_count') + delta)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            GuestStatRollup.objects.create(guest_count=delta, **lookup)
+    except IntegrityError:
+        # Another request created the bucket first
+        GuestStatRollup.objects.filter(**lookup).update(guest_count=F('guest_count') + delta)
+
+
+def move_guest(old_key, new_key):
+    if old_key == new_key:
+        return
+    apply_delta(old_key, -1)
+    apply_delta(new_key, 1)
+
+
+def _grouped_buckets(queryset):
+    return (
+        queryset.annotate(year=ExtractYear('date_of_visit'), month=ExtractMonth('date_of_visit'))
+        .values('year', 'month', 'assigned_to_id', *DIMENSIONS)
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+
+
+def record_guests(queryset, delta=1):
+    """Count guests written without signals (bulk_create, raw updates) in one grouped pass."""
+    for row in _grouped_buckets(queryset):
+        key = (row['year'], row['month'], *[row[f] or '' for f in DIMENSIONS], row['assigned_to_id'] or 0)
+        apply_delta(key, delta * row['total'])
+
+
+def fold_assignee(assignee_id):
+    """Move a deleted user's buckets into the unassigned buckets (guests are SET_NULL)."""
+    rows = list(GuestStatRollup.objects.filter(assignee_id=assignee_id))
+    with transaction.atomic():
+        for row in rows:
+            key = tuple(getattr(row, f) for f in KEY_FIELDS[:-1]) + (0,)
+            apply_delta(key, row.guest_count)
+        GuestStatRollup.objects.filter(assignee_id=assignee_id).delete()
+
+
+def rebuild():
+    """Recompute every bucket from GuestEntry. Returns the number of buckets written."""
+    rollups = [
+        GuestStatRollup(
+            year=row['year'],
+            month=row['month'],
+            assignee_id=row['assigned_to_id'] or 0,
+            guest_count=row['total'],
+            **{f: row[f] or '' for f in DIMENSIONS},
+        )
+        for row in _grouped_buckets(GuestEntry.objects.all())
+    ]
+    # Merge rows that only differed by NULL vs '' in a dimension
+    merged = {}
+    for r in rollups:
+        key = tuple(getattr(r, f) for f in KEY_FIELDS)
+        if key in merged:
+            merged[key].guest_count += r.guest_count
+        else:
+            merged[key] = r
+    with transaction.atomic():
+        GuestStatRollup.objects.all().delete()
+        GuestStatRollup.objects.bulk_create(merged.values(), batch_size=1000)
+    return len(merged)
+
+
+# ---------------------- Reads ----------------------
+def rollups_for(assigned_to=None, everyone=False):
+    """Buckets visible to a dashboard: every guest, or only guests assigned to one user."""
+    qs = GuestStatRollup.objects.filter(guest_count__gt=0)
+    if everyone:
+        return qs
+    if assigned_to is None:
+        return qs.none()
+    return qs.filter(assignee_id=assigned_to.pk)
+
+
+def total(qs):
+    return qs.aggregate(n=Sum('guest_count'))['n'] or 0
+
+
+def counts_by(qs, field):
+    """[(value, count), ...] for one dimension, largest first."""
+    rows = qs.values(field).annotate(n=Sum('guest_count')).order_by('-n', field)
+    return [(row[field], row['n']) for row in rows]
+
+
+def available_years(qs):
+    return sorted(qs.values_list('year', flat=True).distinct())
+
+
+def month_total(qs, day):
+    return total(qs.filter(year=day.year, month=day.month))
+
+
+def year_summary(qs, year):
+    """Same payload guest_entry_summary has always returned."""
+    counts = {m: 0 for m in range(1, 13)}
+    for row in qs.filter(year=year).values('month').annotate(n=Sum('guest_count')):
+        counts[row['month']] = row['n']
+
+    max_count = max(counts.values())
+    min_count = min(counts.values())
+    avg_count = sum(counts.values()) // 12
+    max_month = next((calendar.month_name[m] for m, c in counts.items() if c == max_count), "N/A")
+    min_month = next((calendar.month_name[m] for m, c in counts.items() if c == min_count), "N/A")
+
+    def percent(count):
+        return round((count / max_count) * 100, 1) if max_count > 0 else 0
+
+    return {
+        'max_month': max_month,
+        'max_count': max_count,
+        'max_percent': percent(max_count),
+        'min_month': min_month,
+        'min_count': min_count,
+        'min_percent': percent(min_count),
+        'avg_count': avg_count,
+        'avg_percent': percent(avg_count),
+        'total_count': sum(counts.values()),
+    }
+
+
+def _change(current, previous):
+    if previous == 0:
+        return 100 if current else 0
+    return round(((current - previous) / previous) * 100, 1)
+
+
+def dashboard_stats(qs, user, today):
+    """
+    Guest cards shared by dashboard_view and admin_dashboard.
+    Month figures are calendar-month buckets.
+    """
+    this_month = today.replace(day=1)
+    last_month = this_month - timedelta(days=1)
+
+    services = counts_by(qs, 'service_attended')
+    channels = counts_by(qs, 'channel_of_visit')
+    statuses = counts_by(qs, 'status')
+    purposes = counts_by(qs, 'purpose_of_visit')
+    total_guests = sum(n for _, n in services)
+
+    service_labels = [s or "Not Specified" for s, _ in services]
+    service_counts = [n for _, n in services]
+    if services:
+        most_attended_service, most_attended_count = service_labels[0], service_counts[0]
+        attendance_rate = round((most_attended_count / total_guests) * 100, 1) if total_guests else 0
+    else:
+        most_attended_service, most_attended_count, attendance_rate = "No Data", 0, 0
+
+    purpose_stats = {}
+    for p in PURPOSES:
+        count = sum(n for value, n in purposes if (value or "").lower() == p.lower())
+        purpose_stats[p] = {
+            'count': count,
+            'percentage': round((count / total_guests) * 100, 1) if total_guests else 0,
+        }
+
+    status_data = {}
+    for value, n in statuses:
+        status_data[value or "Unknown"] = status_data.get(value or "Unknown", 0) + n
+
+    channel_progress = [
+        {'label': c or "Unknown", 'count': n, 'percent': round((n / total_guests) * 100, 2) if total_guests else 0}
+        for c, n in channels
+    ]
+
+    current_month_count = month_total(qs, this_month)
+    last_month_count = month_total(qs, last_month)
+    increase_rate = _change(current_month_count, last_month_count)
+
+    # ---------------------- Per-user figures ----------------------
+    mine = qs.filter(assignee_id=user.pk)
+    planted = mine.filter(status="Planted")
+    user_total = total(mine)
+    user_current = month_total(mine, this_month)
+    user_last = month_total(mine, last_month)
+    user_planted_total = total(planted)
+
+    if user_last == 0:
+        user_diff_percent = 100 if user_current else 0
+        user_diff_positive = True
+    else:
+        diff = ((user_current - user_last) / user_last) * 100
+        user_diff_percent = round(abs(diff), 1)
+        user_diff_positive = diff >= 0
+
+    return {
+        'service_labels': service_labels,
+        'service_counts': service_counts,
+        'status_labels': list(status_data.keys()),
+        'status_counts': list(status_data.values()),
+        'channel_progress': channel_progress,
+        'planted_count': status_data.get("Planted", 0),
+        'planted_elsewhere_count': status_data.get("Planted Elsewhere", 0),
+        'relocated_count': status_data.get("Relocated", 0),
+        'work_in_progress_count': status_data.get("Work in Progress", 0),
+        'total_guests': total_guests,
+        'increase_rate': increase_rate,
+        'percent_change': increase_rate,
+        'user_total_guest_entries': user_total,
+        'user_guest_entry_diff_percent': user_diff_percent,
+        'user_guest_entry_diff_positive': user_diff_positive,
+        'user_planted_total': user_planted_total,
+        'planted_growth_rate': round((user_planted_total / user_total) * 100, 1) if user_total else 0,
+        'planted_growth_change': _change(month_total(planted, this_month), month_total(planted, last_month)),
+        'most_attended_service': most_attended_service,
+        'most_attended_count': most_attended_count,
+        'attendance_rate': attendance_rate,
+        'home_church_count': purpose_stats["Home Church"]["count"],
+        'home_church_percentage': purpose_stats["Home Church"]["percentage"],
+        'occasional_visit_count': purpose_stats["Occasional Visit"]["count"],
+        'occasional_visit_percentage': purpose_stats["Occasional Visit"]["percentage"],
+        'one_time_visit_count': purpose_stats["One-Time Visit"]["count"],
+        'one_time_visit_percentage': purpose_stats["One-Time Visit"]["percentage"],
+        'special_programme_count': purpose_stats["Special Programme"]["count"],
+        'special_programme_percentage': purpose_stats["Special Programme"]["percentage"],
+        'purpose_stats': purpose_stats,
+    }
+
+
+# ---------------------- Per-guest follow-up counters ----------------------
+FOLLOWUP_FIELDS = ('report_count', 'last_reported', 'unread_reviews')
+
+
+def _followup_expressions():
+    reports = FollowUpReport.objects.filter(guest=OuterRef('pk')).order_by().values('guest')
+    unread = Review.objects.filter(guest=OuterRef('pk'), is_read=False).order_by().values('guest')
+    return {
+        'report_count': Coalesce(Subquery(reports.annotate(n=Count('id')).values('n')), 0),
+        'last_reported': Subquery(reports.annotate(last=Max('report_date')).values('last')),
+        'unread_reviews': Coalesce(Subquery(unread.annotate(n=Count('id')).values('n')), 0),
+    }
+
+
+def refresh_followup_stats(*guest_ids):
+    """Recompute report_count / last_reported / unread_reviews for the given guests in one UPDATE."""
+    guest_ids = [pk for pk in guest_ids if pk]
+    if guest_ids:
+        GuestEntry.objects.filter(pk__in=guest_ids).update(**_followup_expressions())
+
+
+def reconcile_followup_stats(batch_size=1000):
+    """Repair drifted follow-up counters. Returns the number of guests that were wrong."""
+    expected = {f'expected_{field}': expr for field, expr in _followup_expressions().items()}
+    rows = (
+        GuestEntry.objects.annotate(**expected)
+        .values_list('pk', *FOLLOWUP_FIELDS, *expected)
+        .iterator(chunk_size=batch_size)
+    )
+    drifted = []
+    for pk, *values in rows:
+        actual, wanted = values[:3], values[3:]
+        if actual != wanted:
+            drifted.append(GuestEntry(pk=pk, **dict(zip(FOLLOWUP_FIELDS, wanted))))
+    GuestEntry.objects.bulk_update(drifted, FOLLOWUP_FIELDS, batch_size=batch_size)
+    return len(drifted)
@@ -0,0 +1,75 @@
+"""Background versions of the guest imports and exports (run by the jobs worker)."""
+import tempfile
+
+from django.utils.timezone import localdate
+
+from accounts.utils import is_magnet_admin
+from jobs.registry import JobOutput, register
+from .exports import (
+    SPOOL_LIMIT, XLSX_CONTENT_TYPE, build_xlsx, csv_blocks, followup_reports_pdf,
+    guests_for_export, selected_columns, spool,
+)
+from .imports import import_guests
+from .models import GuestEntry
+
+
+def _percent(done, total):
+    return int(done * 100 / total) if total else 0
+
+
+@register('guests.export_csv', label="Guest CSV export")
+def export_csv(job, progress):
+    guests = guests_for_export(job.user, job.params)
+    columns = selected_columns(job.params.get('fields'))
+    gzip = job.params.get('gzip') in ('1', 'true', 'yes')
+    total = guests.count()
+    data = csv_blocks(
+        guests, columns, gzip=gzip,
+        progress=lambda count: progress(_percent(count, total), f"{count} of {total} guests"),
+    )
+    filename = f"guest_entries_{localdate():%Y%m%d}.csv"
+    if gzip:
+        return JobOutput(spool(data), f"{filename}.gz", 'application/gzip', {"rows": total})
+    return JobOutput(spool(data), filename, 'text/csv', {"rows": total})
+
+
+@register('guests.export_excel', label="Guest Excel export")
+def export_excel(job, progress):
+    guests = guests_for_export(job.user, job.params)
+    total = guests.count()
+    output = build_xlsx(guests, progress=lambda count: progress(_percent(count, total), f"{count} of {total} guests"))
+    return JobOutput(output, f"guest_entries_{localdate():%Y%m%d}.xlsx", XLSX_CONTENT_TYPE, {"rows": total})
+
+
+def _import(job, progress, extension):
+    if not job.input_file or not job.input_name.lower().endswith(extension):
+        raise ValueError(f"Only {extension} files are supported.")
+    # The import reads the file twice and openpyxl seeks in it: work on a local copy
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_LIMIT) as file:
+        with job.input_file.open('rb') as stored:
+            for chunk in stored.chunks():
+                file.write(chunk)
+        report = import_guests(
+            file,
+            importer=job.user,
+            dry_run=job.params.get('dry_run') in ('1', 'true', 'on'),
+            progress=lambda done, total: progress(_percent(done, total), f"{done} of {total} rows"),
+            is_csv=extension == '.csv',
+        )
+    return JobOutput(data=report.as_dict())
+
+
+@register('guests.import_excel', label="Guest Excel import", permission=is_magnet_admin)
+def import_excel(job, progress):
+    return _import(job, progress, '.xlsx')
+
+
+@register('guests.import_csv', label="Guest CSV import", permission=is_magnet_admin)
+def import_csv(job, progress):
+    return _import(job, progress, '.csv')
+
+
+@register('guests.followup_pdf', label="Follow-up report PDF")
+def followup_pdf(job, progress):
+    guest = GuestEntry.objects.get(pk=job.params.get('guest_id'))
+    return JobOutput(followup_reports_pdf(guest), f"followup_reports_{guest.id}.pdf", 'application/pdf')
@@ -0,0 +1,69 @@
+import threading
+from collections import Counter
+
+from unittest import SkipTest
+
+from django.db import connection, connections
+from django.test import TransactionTestCase
+
+from . import custom_ids
+
+
+class CustomIdAllocatorConcurrencyTests(TransactionTestCase):
+    """Several threads (each with its own DB connection) allocating at once never get the same number."""
+
+    THREADS = 8
+    ROUNDS = 25
+
+    @classmethod
+    def setUpClass(cls):
+        # Threads share an in-memory SQLite database through one connection, which would prove nothing
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise SkipTest("needs a test database with real concurrent connections (Postgres, or SQLite with TEST NAME)")
+        super().setUpClass()
+
+    def allocate_concurrently(self, block):
+        results, errors = [], []
+        start = threading.Barrier(self.THREADS)
+
+        def worker():
+            taken = []
+            try:
+                start.wait()
+                for _ in range(self.ROUNDS):
+                    taken.extend(custom_ids.allocate(block))
+            except Exception as e:  # reported by the test; keep the other threads running
+                errors.append(e)
+            finally:
+                results.append(taken)
+                connections.close_all()
+
+        pool = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        self.assertEqual(errors, [])
+        return [number for taken in results for number in taken]
+
+    def assertNoDuplicates(self, numbers, expected):
+        duplicates = [number for number, seen in Counter(numbers).items() if seen > 1]
+        self.assertEqual(duplicates, [])
+        self.assertEqual(len(numbers), expected)
+
+    def test_single_allocations(self):
+        numbers = self.allocate_concurrently(1)
+        self.assertNoDuplicates(numbers, self.THREADS * self.ROUNDS)
+
+    def test_block_allocations(self):
+        numbers = self.allocate_concurrently(5)
+        self.assertNoDuplicates(numbers, self.THREADS * self.ROUNDS * 5)
+
+    def test_counter_starts_after_existing_custom_ids(self):
+        from .models import GuestEntry
+
+        GuestEntry.objects.create(full_name="Existing Guest", custom_id=custom_ids.format_custom_id(41))
+        custom_ids.sync()
+        numbers = self.allocate_concurrently(1)
+        self.assertNoDuplicates(numbers, self.THREADS * self.ROUNDS)
+        self.assertEqual(min(numbers), 42)
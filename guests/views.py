@@ -5,6 +5,13 @@ from django.views.decorators.http import require_POST
 from django.http import HttpResponseRedirect, HttpResponse, JsonResponse, Http404, HttpResponseForbidden
 from .models import GuestEntry, FollowUpReport, SocialMediaEntry, Review
 from .forms import GuestEntryForm, FollowUpReportForm
+from . import stats
+from .search import search_guests
+from .fields import card_fields, detail_fields, icon_sprite_url
+from .exports import export_queryset, followup_reports_pdf, selected_columns, streaming_csv_response, xlsx_response
+from jobs.registry import can_enqueue, get_job_type
+from jobs.utils import enqueue
+from gforceapp.pagination import KeysetPaginator, count_cache_key
 import csv
 import io
 from django.utils.dateparse import parse_date
@@ -12,7 +19,7 @@ from django.contrib.auth import get_user_model, authenticate, login
 from django.core.paginator import Paginator
 from django.contrib.auth.models import Group, User
 from django.db.models import Q, Count, Max, F, Prefetch
-from django.utils.http import urlencode
+from django.utils.http import url_has_allowed_host_and_scheme, urlencode
 import openpyxl
 from openpyxl.utils import get_column_letter
 from django.contrib import messages
@@ -30,11 +37,6 @@ from django.db.models.functions import ExtractYear, ExtractMonth, TruncMonth
 import calendar
 import base64
 import json
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-import os
 from django.db import IntegrityError, transaction
 from django.middleware.csrf import get_token
 from urllib.parse import urlencode
@@ -68,126 +70,17 @@ def dashboard_view(request):
     current_year = today.year
     last_30_days = today - timedelta(days=30)
 
-    # ---------------------- Base queryset ----------------------
-    if is_magnet_admin(user):
-        queryset = GuestEntry.objects.all()
-    else:
-        queryset = GuestEntry.objects.filter(assigned_to=user)
+    # ---------------------- Base rollup ----------------------
+    rollups = stats.rollups_for(user, everyone=is_magnet_admin(user))
 
     # ---------------------- Available years ----------------------
-    guest_entries = GuestEntry.objects.all()
-    available_years = [d.year for d in guest_entries.dates('date_of_visit', 'year')]
-
-    # ---------------------- Summary JSON ----------------------
-    request.GET = request.GET.copy()
-    request.GET['year'] = str(current_year)
-    summary_json = guest_entry_summary(request)
-    summary_data = json.loads(summary_json.content.decode())
-
-    # ---------------------- Aggregate services, purposes, status ----------------------
-    agg_qs = queryset.values('service_attended', 'purpose_of_visit', 'status', 'channel_of_visit').annotate(count=Count('id'))
-
-    # Service data
-    service_data = {}
-    total_services = 0
-    for entry in agg_qs:
-        service = entry['service_attended'] or "Not Specified"
-        service_data[service] = service_data.get(service, 0) + entry['count']
-        total_services += entry['count']
-
-    service_labels = list(service_data.keys())
-    service_counts = list(service_data.values())
-    if service_counts:
-        most_attended_service = service_labels[service_counts.index(max(service_counts))]
-        most_attended_count = max(service_counts)
-        attendance_rate = round((most_attended_count / total_services) * 100, 1) if total_services else 0
-    else:
-        most_attended_service, most_attended_count, attendance_rate = "No Data", 0, 0
-
-    # Purpose stats
-    purposes = ["Home Church", "Occasional Visit", "One-Time Visit", "Special Programme"]
-    total_purposes = sum(entry['count'] for entry in agg_qs)
-    purpose_stats = {
-        p: {
-            'count': sum(entry['count'] for entry in agg_qs if (entry['purpose_of_visit'] or "").lower() == p.lower()),
-            'percentage': round((sum(entry['count'] for entry in agg_qs if (entry['purpose_of_visit'] or "").lower() == p.lower()) / total_purposes)*100,1) if total_purposes else 0
-        }
-        for p in purposes
-    }
-
-    home_church_count = purpose_stats["Home Church"]["count"]
-    home_church_percentage = purpose_stats["Home Church"]["percentage"]
-    occasional_visit_count = purpose_stats["Occasional Visit"]["count"]
-    occasional_visit_percentage = purpose_stats["Occasional Visit"]["percentage"]
-    one_time_visit_count = purpose_stats["One-Time Visit"]["count"]
-    one_time_visit_percentage = purpose_stats["One-Time Visit"]["percentage"]
-    special_programme_count = purpose_stats["Special Programme"]["count"]
-    special_programme_percentage = purpose_stats["Special Programme"]["percentage"]
-
-    # Status data
-    status_data = {}
-    for entry in agg_qs:
-        status = entry['status'] or "Unknown"
-        status_data[status] = status_data.get(status, 0) + entry['count']
-    status_labels = list(status_data.keys())
-    status_counts = list(status_data.values())
-
-    # Channel progress
-    channel_data = {}
-    total_channels = 0
-    for entry in agg_qs:
-        channel = entry['channel_of_visit'] or "Unknown"
-        channel_data[channel] = channel_data.get(channel, 0) + entry['count']
-        total_channels += entry['count']
-    channel_progress = [
-        {'label': c, 'count': channel_data[c], 'percent': round((channel_data[c]/total_channels)*100,2) if total_channels else 0}
-        for c in channel_data
-    ]
-
-    # Planted & other statuses
-    planted_count = status_data.get("Planted", 0)
-    planted_elsewhere_count = status_data.get("Planted Elsewhere", 0)
-    relocated_count = status_data.get("Relocated", 0)
-    work_in_progress_count = status_data.get("Work in Progress", 0)
-
-    # ---------------------- Monthly & planted growth metrics in ONE query ----------------------
-    first_day_this_month = today.replace(day=1)
-    last_month_end = first_day_this_month - timedelta(days=1)
-    first_day_last_month = last_month_end.replace(day=1)
-
-    metrics = queryset.aggregate(
-        total_guests=Count('id'),
-        current_month_count=Count('id', filter=Q(date_of_visit__gte=first_day_this_month, date_of_visit__lte=today)),
-        last_month_count=Count('id', filter=Q(date_of_visit__gte=first_day_last_month, date_of_visit__lte=last_month_end)),
-        user_total_guest_entries=Count('id', filter=Q(assigned_to=user)),
-        user_current_month_count=Count('id', filter=Q(assigned_to=user, date_of_visit__gte=first_day_this_month, date_of_visit__lte=today)),
-        user_last_month_count=Count('id', filter=Q(assigned_to=user, date_of_visit__gte=first_day_last_month, date_of_visit__lte=last_month_end)),
-        user_planted_total=Count('id', filter=Q(assigned_to=user, status="Planted")),
-        user_planted_current_month=Count('id', filter=Q(assigned_to=user, status="Planted", date_of_visit__gte=first_day_this_month, date_of_visit__lte=today)),
-        user_planted_last_month=Count('id', filter=Q(assigned_to=user, status="Planted", date_of_visit__gte=first_day_last_month, date_of_visit__lte=last_month_end)),
-    )
-
-    # Global increase rate
-    if metrics['last_month_count'] == 0:
-        increase_rate = percent_change = 100 if metrics['current_month_count'] else 0
-    else:
-        increase_rate = percent_change = round(((metrics['current_month_count'] - metrics['last_month_count']) / metrics['last_month_count'])*100,1)
-
-    # User metrics
-    if metrics['user_last_month_count'] == 0:
-        user_diff_percent = 100 if metrics['user_current_month_count'] else 0
-        user_diff_positive = True
-    else:
-        diff = ((metrics['user_current_month_count'] - metrics['user_last_month_count']) / metrics['user_last_month_count'])*100
-        user_diff_percent = round(abs(diff),1)
-        user_diff_positive = diff >= 0
+    available_years = stats.available_years(stats.rollups_for(everyone=True))
 
-    planted_growth_rate = round((metrics['user_planted_total'] / metrics['user_total_guest_entries'])*100,1) if metrics['user_total_guest_entries'] else 0
+    # ---------------------- Summary ----------------------
+    summary_data = stats.year_summary(stats.rollups_for(everyone=True), current_year)
 
-    if metrics['user_planted_last_month'] == 0:
-        planted_growth_change = 100 if metrics['user_planted_current_month'] else 0
-    else:
-        planted_growth_change = round(((metrics['user_planted_current_month'] - metrics['user_planted_last_month']) / metrics['user_planted_last_month'])*100,1)
+    # ---------------------- Services, purposes, status, channels & growth ----------------------
+    guest_stats = stats.dashboard_stats(rollups, user, today)
 
     # ---------------------- Teams + Other Users (optimized) ----------------------
     user_teams = Team.objects.prefetch_related(
@@ -237,35 +130,6 @@ def dashboard_view(request):
         'available_years': available_years,
         'current_year': current_year,
         'summary_data': summary_data,
-        "service_labels": service_labels,
-        "service_counts": service_counts,
-        "status_labels": status_labels,
-        "status_counts": status_counts,
-        "channel_progress": channel_progress,
-        "planted_count": planted_count,
-        "planted_elsewhere_count": planted_elsewhere_count,
-        "relocated_count": relocated_count,
-        "work_in_progress_count": work_in_progress_count,
-        "total_guests": metrics['total_guests'],
-        "increase_rate": increase_rate,
-        "percent_change": percent_change,
-        "user_total_guest_entries": metrics['user_total_guest_entries'],
-        "user_guest_entry_diff_percent": user_diff_percent,
-        "user_guest_entry_diff_positive": user_diff_positive,
-        "user_planted_total": metrics['user_planted_total'],
-        "planted_growth_rate": planted_growth_rate,
-        "planted_growth_change": planted_growth_change,
-        "most_attended_service": most_attended_service,
-        "most_attended_count": most_attended_count,
-        "attendance_rate": attendance_rate,
-        "home_church_count": home_church_count,
-        "home_church_percentage": home_church_percentage,
-        "occasional_visit_count": occasional_visit_count,
-        "occasional_visit_percentage": occasional_visit_percentage,
-        "one_time_visit_count": one_time_visit_count,
-        "one_time_visit_percentage": one_time_visit_percentage,
-        "special_programme_count": special_programme_count,
-        "special_programme_percentage": special_programme_percentage,
         "other_users": other_users,
         "user_teams": user_teams,
         "team_member_pairs": team_member_pairs,
@@ -276,7 +140,8 @@ def dashboard_view(request):
         'today_clock_out': getattr(today_record,'clock_out',None),
         "available_events": upcoming_events,
         "next_events_for_week": next_events,
-        "page_title": "Dashboard"
+        "page_title": "Dashboard",
+        **guest_stats,
     }
 
     return render(request, "guests/dashboard.html", context)
@@ -292,64 +157,14 @@ def guest_entry_summary(request):
     except (TypeError, ValueError):
         return JsonResponse({'error': 'Invalid year'}, status=400)
 
-    guests = GuestEntry.objects.filter(date_of_visit__year=year)
-
-    # Total guests for the year
-    total_count = guests.count()
-
-    # Group by month and count
-    month_counts = (
-        guests.annotate(month=ExtractMonth('date_of_visit'))
-        .values('month')
-        .annotate(count=Count('id'))
-        .order_by('month')
-    )
-
-    # Build dict: {1: 5, 2: 10, ..., 12: 0}
-    counts_dict = {month: 0 for month in range(1, 13)}
-    for entry in month_counts:
-        counts_dict[entry['month']] = entry['count']
-
-    max_count = max(counts_dict.values())
-    min_count = min(counts_dict.values())
-    avg_count = sum(counts_dict.values()) // 12 if counts_dict else 0
-
-    # Find month names
-    max_months = [calendar.month_name[m] for m, c in counts_dict.items() if c == max_count]
-    min_months = [calendar.month_name[m] for m, c in counts_dict.items() if c == min_count]
-
-    # Just use the first if tie
-    max_month = max_months[0] if max_months else "N/A"
-    min_month = min_months[0] if min_months else "N/A"
-
-    def percent(count):
-        return round((count / max_count) * 100, 1) if max_count > 0 else 0
-
-    data = {
-        'max_month': max_month,
-        'max_count': max_count,
-        'max_percent': percent(max_count),
-        'min_month': min_month,
-        'min_count': min_count,
-        'min_percent': percent(min_count),
-        'avg_count': avg_count,
-        'avg_percent': percent(avg_count),
-        'total_count': total_count,
-    }
-
-    return JsonResponse(data)
+    return JsonResponse(stats.year_summary(stats.rollups_for(everyone=True), year))
 
 
 def top_services_data(request):
-    top_services = (
-        GuestEntry.objects
-        .values('service_attended')
-        .annotate(count=Count('id'))
-        .order_by('-count')[:10]
-    )
+    top_services = stats.counts_by(stats.rollups_for(everyone=True), 'service_attended')[:10]
 
     # Prepare data: list of dicts with service, count
-    data = list(top_services)
+    data = [{'service_attended': service, 'count': count} for service, count in top_services]
 
     # Calculate total count of these top 10 to calculate % widths
     total = sum(item['count'] for item in data) or 1  # avoid division by zero
@@ -368,11 +183,9 @@ def top_services_data(request):
 def services_attended_chart(request):
     """AJAX endpoint for services attended chart."""
 
-    queryset = GuestEntry.objects.all()  # No filtering by user
-
-    qs = queryset.values('service_attended').annotate(count=Count('id')).order_by('-count')
-    labels = [item['service_attended'] or "Not Specified" for item in qs]
-    counts = [item['count'] for item in qs]
+    qs = stats.counts_by(stats.rollups_for(everyone=True), 'service_attended')  # No filtering by user
+    labels = [service or "Not Specified" for service, _ in qs]
+    counts = [count for _, count in qs]
 
     return JsonResponse({'labels': labels, 'counts': counts})
 
@@ -381,18 +194,16 @@ def services_attended_chart(request):
 @login_required
 def channel_breakdown(request):
     """AJAX endpoint for channel of visit table."""
-    
-    queryset = GuestEntry.objects.all() 
 
-    qs = queryset.values('channel_of_visit').annotate(count=Count('id')).order_by('-count')
-    total = sum(item['count'] for item in qs)
+    qs = stats.counts_by(stats.rollups_for(everyone=True), 'channel_of_visit')
+    total = sum(count for _, count in qs)
     data = [
         {
-            'label': item['channel_of_visit'] or 'Unknown',
-            'count': item['count'],
-            'percent': round((item['count'] / total) * 100, 2) if total else 0
+            'label': channel or 'Unknown',
+            'count': count,
+            'percent': round((count / total) * 100, 2) if total else 0
         }
-        for item in qs
+        for channel, count in qs
     ]
     #return JsonResponse({"disabled": True})
     return JsonResponse(data, safe=False)
@@ -438,13 +249,6 @@ def guest_list_view(request):
             Q(full_name="Wunmi Jordan")
         )
 
-    # ---------------------- Annotations ----------------------
-    qs = qs.annotate(
-        report_count=Count('reports', distinct=True),
-        last_reported=Max('reports__report_date'),
-        unread_reviews=Count('reviews', filter=Q(reviews__is_read=False), distinct=True)
-    )
-
     # ---------------------- Filters ----------------------
     filters = {
         "status__iexact": status_filter,
@@ -456,88 +260,31 @@ def guest_list_view(request):
     qs = qs.filter(**{k: v for k, v in filters.items() if v})
 
     # ---------------------- Search ----------------------
-    if search_query:
-        qs = qs.filter(
-            Q(full_name__icontains=search_query) |
-            Q(phone_number__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(referrer_name__icontains=search_query) |
-            Q(service_attended__icontains=search_query) |
-            Q(status__icontains=search_query) |
-            Q(channel_of_visit__icontains=search_query) |
-            Q(purpose_of_visit__icontains=search_query) |
-            Q(assigned_to__full_name__icontains=search_query)
-        )
-
-    qs = qs.order_by('-custom_id').select_related('assigned_to')  # avoid n+1 on foreign key
+    qs = search_guests(qs, search_query)
 
     if user_filter:
         qs = qs.filter(assigned_to_id=user_filter)
 
-    # ---------------------- Pagination ----------------------
+    # report_count / last_reported / unread_reviews are columns kept current by guests.signals
+    qs = qs.select_related('assigned_to')  # avoid n+1 on foreign key
+
+    # ---------------------- Pagination (keyset, ?after= / ?before=) ----------------------
     per_page = 50 if view_type == 'list' else 45
-    paginator = Paginator(qs, per_page)
-    page_obj = paginator.get_page(request.GET.get('page', 1))
+    count_key = count_cache_key(
+        "guest_list_count",
+        None if is_magnet_admin(user) else user.pk,
+        filters, search_query, user_filter,
+    )
+    # Served by GuestEntry's guest_list_order_idx (custom_id is never NULL since migration 0020)
+    paginator = KeysetPaginator(qs, per_page, ('-custom_id', '-id'), count_key=count_key)
+    page_obj = paginator.page_from_request(request)
 
     # ---------------------- Field Data (lightweight) ----------------------
-    excluded_fields = {"id", "custom_id", "title", "full_name", "gender",
-                       "message", "picture", "phone_number", "assigned_to"}
-    
-    svg_icons={
-        "email":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M12 12m-4 0a4 4 0 1 0 8 0a4 4 0 1 0 -8 0" />
-            <path d="M16 12v1.5a2.5 2.5 0 0 0 5 0v-1.5a9 9 0 1 0 -5.5 8.28" />""",  # replace with real paths
-        "date_of_birth":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M4 7a2 2 0 0 1 2 -2h12a2 2 0 0 1 2 2v12a2 2 0 0 1 -2 2h-12a2 2 0 0 1 -2 -2v-12z" />
-            <path d="M16 3v4" /><path d="M8 3v4" />
-            <path d="M4 11h16" /><path d="M11 15h1" /><path d="M12 15v3" />""",
-        "age_range":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/>
-            <path d="M12 12m-9 0a9 9 0 1 0 18 0a9 9 0 1 0 -18 0" />
-            <path d="M11.5 10.5m-1.5 0a1.5 1.5 0 1 0 3 0a1.5 1.5 0 1 0 -3 0" />
-            <path d="M11.5 13.5m-1.5 0a1.5 1.5 0 1 0 3 0a1.5 1.5 0 1 0 -3 0" />
-            <path d="M7 15v-6" /><path d="M15.5 12h3" /><path d="M17 10.5v3" />""",
-        "marital_status":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M7 5m-2 0a2 2 0 1 0 4 0a2 2 0 1 0 -4 0" /><path d="M5 22v-5l-1 -1v-4a1 1 0 0 1 1 -1h4a1 1 0 0 1 1 1v4l-1 1v5" /><path d="M17 5m-2 0a2 2 0 1 0 4 0a2 2 0 1 0 -4 0" />
-            <path d="M15 22v-4h-2l2 -6a1 1 0 0 1 1 -1h2a1 1 0 0 1 1 1l2 6h-2v4" />""",
-        "home_address":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M5 12l-2 0l9 -9l9 9l-2 0" /><path d="M5 12v7a2 2 0 0 0 2 2h10a2 2 0 0 0 2 -2v-7" />
-            <path d="M9 21v-6a2 2 0 0 1 2 -2h2a2 2 0 0 1 2 2v6" />""",
-        "occupation":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M3 7m0 2a2 2 0 0 1 2 -2h14a2 2 0 0 1 2 2v9a2 2 0 0 1 -2 2h-14a2 2 0 0 1 -2 -2z" /><path d="M8 7v-2a2 2 0 0 1 2 -2h4a2 2 0 0 1 2 2v2" />
-            <path d="M12 12l0 .01" /><path d="M3 13a20 20 0 0 0 18 0" />""",
-        "date_of_visit":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M11.795 21h-6.795a2 2 0 0 1 -2 -2v-12a2 2 0 0 1 2 -2h12a2 2 0 0 1 2 2v4" />
-            <path d="M18 18m-4 0a4 4 0 1 0 8 0a4 4 0 1 0 -8 0" /><path d="M15 3v4" />
-            <path d="M7 3v4" /><path d="M3 11h16" /><path d="M18 16.496v1.504l1 1" />""",
-        "purpose_of_visit":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/>
-            <path d="M3 21l18 0" /><path d="M10 21v-4a2 2 0 0 1 4 0v4" /><path d="M10 5l4 0" />
-            <path d="M12 3l0 5" /><path d="M6 21v-7m-2 2l8 -8l8 8m-2 -2v7" />""",
-        "channel_of_visit":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M3 7m0 2a2 2 0 0 1 2 -2h14a2 2 0 0 1 2 2v9a2 2 0 0 1 -2 2h-14a2 2 0 0 1 -2 -2z" />
-            <path d="M16 3l-4 4l-4 -4" />""",
-        "service_attended":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M12 5m-1 0a1 1 0 1 0 2 0a1 1 0 1 0 -2 0" />
-            <path d="M7 20h8l-4 -4v-7l4 3l2 -2" />""",
-        "referrer_name":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M19.5 12.572l-7.5 7.428l-7.5 -7.428a5 5 0 1 1 7.5 -6.566a5 5 0 1 1 7.5 6.572" /><path d="M12 6l-3.293 3.293a1 1 0 0 0 0 1.414l.543 .543c.69 .69 1.81 .69 2.5 0l1 -1a3.182 3.182 0 0 1 4.5 0l2.25 2.25" />
-            <path d="M12.5 15.5l2 2" /><path d="M15 13l2 2" />""",
-        "referrer_phone_number":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M3 3m0 2a2 2 0 0 1 2 -2h8a2 2 0 0 1 2 2v14a2 2 0 0 1 -2 2h-8a2 2 0 0 1 -2 -2z" />
-            <path d="M8 4l2 0" /><path d="M9 17l0 .01" /><path d="M21 6l-2 3l2 3l-2 3l2 3" />""",
-        "status":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M9 11a3 3 0 1 0 6 0a3 3 0 0 0 -6 0" />
-            <path d="M14.997 19.317l-1.583 1.583a2 2 0 0 1 -2.827 0l-4.244 -4.243a8 8 0 1 1 13.657 -5.584" />
-            <path d="M19 22v.01" /><path d="M19 19a2.003 2.003 0 0 0 .914 -3.782a1.98 1.98 0 0 0 -2.414 .483" />""",
-        "assigned_at":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/>
-            <path d="M8 7a4 4 0 1 0 8 0a4 4 0 0 0 -8 0" /><path d="M16 19h6" />
-            <path d="M19 16v6" /><path d="M6 21v-2a4 4 0 0 1 4 -4h4" />""",
-    }
-
-    # Precompute svg_icons and avoid per-row heavy calculations
+    current_time = now()
     for guest in page_obj:
-        fields = []
-        for field in (f for f in guest._meta.fields if f.name not in excluded_fields):
-            value = getattr(guest, field.name, None)
-            display_value = getattr(guest, f"get_{field.name}_display")() if field.choices else value
-            fields.append({
-                "name": field.name,
-                "verbose_name": getattr(field, "verbose_name", field.name).title(),
-                "value": display_value,
-                "icon": field.name,
-                "svg": svg_icons.get(field.name)
-            })
-        guest.field_data = fields
+        guest.field_data = card_fields(guest)
         guest.has_unread_reviews = guest.unread_reviews > 0
-        guest.is_new = guest.assigned_at and (now() - guest.assigned_at <= timedelta(days=14))
+        guest.is_new = guest.assigned_at and (current_time - guest.assigned_at <= timedelta(days=14))
 
     # ---------------------- Cached filters ----------------------
     def cache_list(key, field):
@@ -553,8 +300,9 @@ def guest_list_view(request):
 
     # ---------------------- Query string ----------------------
     params = request.GET.copy()
-    params.pop('page', None)
-    query_string = urlencode(params)
+    for key in ('page', 'after', 'before'):
+        params.pop(key, None)
+    query_string = params.urlencode()
 
     # ---------------------- Magnet users ----------------------
     magnet_users = CustomUser.objects.filter(
@@ -583,8 +331,7 @@ def guest_list_view(request):
         'services': services,
         'query_string': query_string,
         'role': role,
-        'svg_icons': svg_icons,
-        'excluded_fields': excluded_fields,
+        'icon_sprite': icon_sprite_url(),
         "magnet_team": {"id": magnet_team.id, "name": magnet_team.name} if magnet_team else None,
         "magnet_users": magnet_users,
         'page_title': 'Guests',
@@ -607,76 +354,7 @@ from django.contrib.auth.decorators import login_required
 def guest_detail_api(request, guest_id):
     guest = get_object_or_404(GuestEntry, id=guest_id)
 
-    # Build field data just like in guest_list_view
-    excluded_fields = {
-        "id", "custom_id", "title", "full_name", "gender",
-        "message", "picture", "phone_number", "assigned_to"
-    }
-
-    svg_icons={
-        "email":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M12 12m-4 0a4 4 0 1 0 8 0a4 4 0 1 0 -8 0" />
-            <path d="M16 12v1.5a2.5 2.5 0 0 0 5 0v-1.5a9 9 0 1 0 -5.5 8.28" />""",  # replace with real paths
-        "date_of_birth":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M4 7a2 2 0 0 1 2 -2h12a2 2 0 0 1 2 2v12a2 2 0 0 1 -2 2h-12a2 2 0 0 1 -2 -2v-12z" />
-            <path d="M16 3v4" /><path d="M8 3v4" />
-            <path d="M4 11h16" /><path d="M11 15h1" /><path d="M12 15v3" />""",
-        "age_range":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/>
-            <path d="M12 12m-9 0a9 9 0 1 0 18 0a9 9 0 1 0 -18 0" />
-            <path d="M11.5 10.5m-1.5 0a1.5 1.5 0 1 0 3 0a1.5 1.5 0 1 0 -3 0" />
-            <path d="M11.5 13.5m-1.5 0a1.5 1.5 0 1 0 3 0a1.5 1.5 0 1 0 -3 0" />
-            <path d="M7 15v-6" /><path d="M15.5 12h3" /><path d="M17 10.5v3" />""",
-        "marital_status":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M7 5m-2 0a2 2 0 1 0 4 0a2 2 0 1 0 -4 0" /><path d="M5 22v-5l-1 -1v-4a1 1 0 0 1 1 -1h4a1 1 0 0 1 1 1v4l-1 1v5" /><path d="M17 5m-2 0a2 2 0 1 0 4 0a2 2 0 1 0 -4 0" />
-            <path d="M15 22v-4h-2l2 -6a1 1 0 0 1 1 -1h2a1 1 0 0 1 1 1l2 6h-2v4" />""",
-        "home_address":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M5 12l-2 0l9 -9l9 9l-2 0" /><path d="M5 12v7a2 2 0 0 0 2 2h10a2 2 0 0 0 2 -2v-7" />
-            <path d="M9 21v-6a2 2 0 0 1 2 -2h2a2 2 0 0 1 2 2v6" />""",
-        "occupation":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M3 7m0 2a2 2 0 0 1 2 -2h14a2 2 0 0 1 2 2v9a2 2 0 0 1 -2 2h-14a2 2 0 0 1 -2 -2z" /><path d="M8 7v-2a2 2 0 0 1 2 -2h4a2 2 0 0 1 2 2v2" />
-            <path d="M12 12l0 .01" /><path d="M3 13a20 20 0 0 0 18 0" />""",
-        "date_of_visit":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M11.795 21h-6.795a2 2 0 0 1 -2 -2v-12a2 2 0 0 1 2 -2h12a2 2 0 0 1 2 2v4" />
-            <path d="M18 18m-4 0a4 4 0 1 0 8 0a4 4 0 1 0 -8 0" /><path d="M15 3v4" />
-            <path d="M7 3v4" /><path d="M3 11h16" /><path d="M18 16.496v1.504l1 1" />""",
-        "purpose_of_visit":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/>
-            <path d="M3 21l18 0" /><path d="M10 21v-4a2 2 0 0 1 4 0v4" /><path d="M10 5l4 0" />
-            <path d="M12 3l0 5" /><path d="M6 21v-7m-2 2l8 -8l8 8m-2 -2v7" />""",
-        "channel_of_visit":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M3 7m0 2a2 2 0 0 1 2 -2h14a2 2 0 0 1 2 2v9a2 2 0 0 1 -2 2h-14a2 2 0 0 1 -2 -2z" />
-            <path d="M16 3l-4 4l-4 -4" />""",
-        "service_attended":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M12 5m-1 0a1 1 0 1 0 2 0a1 1 0 1 0 -2 0" />
-            <path d="M7 20h8l-4 -4v-7l4 3l2 -2" />""",
-        "referrer_name":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M19.5 12.572l-7.5 7.428l-7.5 -7.428a5 5 0 1 1 7.5 -6.566a5 5 0 1 1 7.5 6.572" /><path d="M12 6l-3.293 3.293a1 1 0 0 0 0 1.414l.543 .543c.69 .69 1.81 .69 2.5 0l1 -1a3.182 3.182 0 0 1 4.5 0l2.25 2.25" />
-            <path d="M12.5 15.5l2 2" /><path d="M15 13l2 2" />""",
-        "referrer_phone_number":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M3 3m0 2a2 2 0 0 1 2 -2h8a2 2 0 0 1 2 2v14a2 2 0 0 1 -2 2h-8a2 2 0 0 1 -2 -2z" />
-            <path d="M8 4l2 0" /><path d="M9 17l0 .01" /><path d="M21 6l-2 3l2 3l-2 3l2 3" />""",
-        "status":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/><path d="M9 11a3 3 0 1 0 6 0a3 3 0 0 0 -6 0" />
-            <path d="M14.997 19.317l-1.583 1.583a2 2 0 0 1 -2.827 0l-4.244 -4.243a8 8 0 1 1 13.657 -5.584" />
-            <path d="M19 22v.01" /><path d="M19 19a2.003 2.003 0 0 0 .914 -3.782a1.98 1.98 0 0 0 -2.414 .483" />""",
-        "assigned_at":"""<path stroke="none" d="M0 0h24v24H0z" fill="none"/>
-            <path d="M8 7a4 4 0 1 0 8 0a4 4 0 0 0 -8 0" /><path d="M16 19h6" />
-            <path d="M19 16v6" /><path d="M6 21v-2a4 4 0 0 1 4 -4h4" />""",
-    }
-
-    field_data = []
-    for field in guest._meta.fields:
-        if field.name in excluded_fields:
-            continue
-        value = getattr(guest, field.name)
-        time_since = None
-        formatted_value = value
-        if field.name == "date_of_visit" and value:
-            formatted_value = value.strftime("%b. %-d, %Y")
-            dt_value = datetime.combine(value, datetime.min.time())
-            if is_naive(dt_value):
-                dt_value = make_aware(dt_value)
-            delta = timesince(dt_value, now())
-            time_since = delta.split(",")[0]
-
-        if field.name == "assigned_at" and value:
-            formatted_value = value.strftime("%b. %-d, %Y %I:%M %p")
-
-        field_data.append({
-            "name": field.name,
-            "verbose_name": field.verbose_name.title(),
-            "value": formatted_value,
-            "time_since": time_since,
-            "icon": field.name,
-        })
+    field_data = detail_fields(guest)
 
     social_accounts = []
     for account in guest.social_media_accounts.all():
@@ -694,7 +372,7 @@ def guest_detail_api(request, guest_id):
         "picture": guest.picture.url if guest.picture else None,
         "field_data": field_data,
         "social_media_accounts": social_accounts,
-        "svg_icons": svg_icons,
+        "icon_sprite": icon_sprite_url(),
     }
 
     return JsonResponse(data)
@@ -917,6 +595,8 @@ def mark_reviews_read(request, guest_id):
     # Only unread reviews for this user, optionally excluding self-authored reviews
     unread_reviews = guest.reviews.filter(is_read=False).exclude(reviewer=request.user)
     reviews_marked = unread_reviews.update(is_read=True)
+    if reviews_marked:
+        stats.refresh_followup_stats(guest.id)
 
     # Mark notifications corresponding to these reviews as read
     notif_qs = Notification.objects.filter(
@@ -1038,77 +718,62 @@ def parse_flexible_date(date_str):
 
 User = get_user_model()
 
-@login_required
-def import_guests_csv(request):
-    if request.method != "POST" or not request.FILES.get("csv_file"):
-        messages.error(request, "Please upload a valid CSV file.")
-        return redirect("guest_list")
 
-    csv_file = request.FILES["csv_file"]
-    decoded_file = csv_file.read().decode("utf-8").splitlines()
-    reader = csv.DictReader(decoded_file)
+# ---------------------- Background jobs (imports, exports, PDFs) ----------------------
+def wants_json(request):
+    return request.headers.get("x-requested-with") == "XMLHttpRequest" or request.GET.get("format") == "json"
 
-    guests_to_create = []
 
-    # --- Step 1: Prepare GuestEntry objects ---
-    for row in reader:
-        username = row.get("assigned_to", "").strip()
-        try:
-            user = User.objects.get(username=username)
-        except User.DoesNotExist:
-            messages.warning(request, f"User '{username}' not found. Skipping row.")
-            continue
-
-        dob = row.get("date_of_birth", "").strip() or None
-        dov = row.get("date_of_visit", "").strip() or None
-
-        guest = GuestEntry(
-            full_name=row.get("full_name", "").strip(),
-            title=row.get("title", "").strip(),
-            gender=row.get("gender", "").strip(),
-            phone_number=row.get("phone_number", "").strip(),
-            email=row.get("email", "").strip(),
-            date_of_birth=dob,
-            marital_status=row.get("marital_status", "").strip(),
-            home_address=row.get("home_address", "").strip(),
-            occupation=row.get("occupation", "").strip(),
-            date_of_visit=dov,
-            purpose_of_visit=row.get("purpose_of_visit", "").strip(),
-            channel_of_visit=row.get("channel_of_visit", "").strip(),
-            service_attended=row.get("service_attended", "").strip(),
-            referrer_name=row.get("referrer_name", "").strip(),
-            referrer_phone_number=row.get("referrer_phone_number", "").strip(),
-            message=row.get("message", "").strip(),
-            status=row.get("status", "").strip(),
-            assigned_to=user,
-            picture=row.get("picture_url", "").strip() or None  # <-- store Cloudinary URL directly
-        )
-        guests_to_create.append(guest)
+def wants_job(request):
+    """Exports and PDFs run on the worker only when asked (POST, or ?async=1); a plain GET downloads in the request."""
+    return request.method == "POST" or request.GET.get("async") == "1"
 
-    if not guests_to_create:
-        messages.warning(request, "No valid guests found to import.")
-        return redirect("guest_list")
 
-    # --- Step 2: Bulk create guests ---
-    with transaction.atomic():
-        GuestEntry.objects.bulk_create(guests_to_create)
+def export_params(request):
+    """Query and form fields of an export request, as job params."""
+    params = {**request.GET.dict(), **request.POST.dict()}
+    for key in ("csrfmiddlewaretoken", "async", "format"):
+        params.pop(key, None)
+    return params
 
-        # --- Step 3: Backfill custom_id ---
-        prefix = "GNG"
-        last_custom_id = GuestEntry.objects.filter(custom_id__startswith=prefix)\
-            .aggregate(max_id=Max('custom_id'))['max_id']
-        last_num = int(last_custom_id.replace(prefix, "")) if last_custom_id else 0
 
-        new_guests = GuestEntry.objects.filter(custom_id__isnull=True).order_by("id")
-        for idx, guest in enumerate(new_guests, start=last_num + 1):
-            guest.custom_id = f"{prefix}{idx:06d}"
+def enqueue_guest_job(request, kind, params, upload=None, started=""):
+    """
+    Hand `kind` to the jobs worker instead of running it in the request.
+    AJAX / ?format=json callers get the job (202) and follow its job:progress
+    events; plain links and forms are sent back with a message, and the
+    owner is notified when the job is done (params notify=1).
+    """
+    if not can_enqueue(get_job_type(kind), request.user):
+        if wants_json(request):
+            return JsonResponse({"status": "error", "message": "Permission denied"}, status=403)
+        messages.error(request, "You do not have permission to do this.")
+        return redirect("guest_list")
 
-        GuestEntry.objects.bulk_update(new_guests, ["custom_id"])
+    if wants_json(request):
+        return JsonResponse(enqueue(kind, request.user, params=params, upload=upload).as_dict(), status=202)
 
-    messages.success(request, f"{len(guests_to_create)} guests imported successfully!")
+    enqueue(kind, request.user, params={**params, "notify": "1"}, upload=upload)
+    messages.info(request, started)
+    back = request.META.get("HTTP_REFERER")
+    if back and url_has_allowed_host_and_scheme(back, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        return redirect(back)
     return redirect("guest_list")
 
 
+@login_required
+def import_guests_csv(request):
+    """Queue a CSV import on the job worker (guests.tasks.import_csv)."""
+    upload = request.FILES.get("csv_file")
+    if request.method != "POST" or not upload or not upload.name.lower().endswith(".csv"):
+        messages.error(request, "Please upload a valid CSV file.")
+        return redirect("guest_list")
+    return enqueue_guest_job(
+        request, 'guests.import_csv', {}, upload=upload,
+        started=f"Importing {upload.name}. You will be notified when it is done.",
+    )
+
+
 
 
 
@@ -1158,166 +823,37 @@ def download_csv_template(request):
 @login_required
 def export_csv(request):
     """
-    Export filtered guest entries as CSV.
+    Stream filtered guest entries as CSV; POST or ?async=1 builds the file
+    on the job worker instead (guests.tasks.export_csv).
     - Admins can export all or filter by user.
     - Regular users can only export their own entries.
     - Respects service and search filters.
+    - ?fields=full_name,phone_number,... picks columns, ?gzip=1 compresses.
     """
-    User = get_user_model()
-
-    filter_user_id = request.GET.get('user')
-    filter_service = request.GET.get('service')
-    search_query = request.GET.get('q')
-
-    # Base queryset
-    if is_magnet_admin(request.user):
-        guests = GuestEntry.objects.all()
-        if filter_user_id and filter_user_id.isdigit():
-            guests = guests.filter(assigned_to__id=filter_user_id)
-    else:
-        guests = GuestEntry.objects.filter(assigned_to=request.user)
-
-    # Service filter
-    if filter_service:
-        guests = guests.filter(service_attended__iexact=filter_service)
-
-    # Search filter
-    if search_query:
-        guests = guests.filter(
-            Q(full_name__icontains=search_query) |
-            Q(phone_number__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(referrer_name__icontains=search_query)
+    if wants_job(request):
+        return enqueue_guest_job(
+            request, 'guests.export_csv', export_params(request),
+            started="Preparing the CSV export. You will be notified when it is ready to download.",
         )
-
-    # CSV response
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="guest_entries.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow([
-        'Full Name', 'Phone Number', 'Email', 'Gender',
-        'Date of Birth', 'Marital Status', 'Home Address',
-        'Occupation', 'Date of Visit', 'Purpose of Visit',
-        'Channel of Visit', 'Service Attended',
-        'Referrer Name', 'Referrer Phone Number', 'Status',
-        'Assigned To'
-    ])
-
-    for guest in guests:
-        writer.writerow([
-            guest.full_name,
-            guest.phone_number,
-            guest.email,
-            guest.gender,
-            guest.date_of_birth,
-            guest.marital_status,
-            guest.home_address,
-            guest.occupation,
-            guest.date_of_visit,
-            guest.purpose_of_visit,
-            guest.channel_of_visit,
-            guest.service_attended,
-            guest.referrer_name,
-            guest.referrer_phone_number,
-            guest.status,
-            guest.assigned_to.get_full_name() if guest.assigned_to else '',
-        ])
-
-    return response
-
-
-from datetime import datetime
-
-def safe_date(value):
-    if not value:
-        return ""
-    if isinstance(value, str):
-        try:
-            return datetime.fromisoformat(value).strftime("%Y-%m-%d")
-        except:
-            # Try flexible formats
-            for fmt in ("%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y"):
-                try:
-                    return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
-                except:
-                    pass
-            return value  # return raw string if all parsing fails
-    return value.strftime("%Y-%m-%d")
-
-
-
+    guests = export_queryset(request)
+    columns = selected_columns(request.GET.get('fields'))
+    gzip = request.GET.get('gzip') in ('1', 'true', 'yes')
+    return streaming_csv_response(request, guests, columns, 'guest_entries.csv', gzip=gzip)
 
 
 @login_required
 def export_guests_excel(request):
-    filter_user_id = request.GET.get('user')
-    filter_service = request.GET.get('service')
-    search_query = request.GET.get('q')
-
-    guests = GuestEntry.objects.all() if is_magnet_admin(request.user) else GuestEntry.objects.filter(assigned_to=request.user)
-
-    if filter_user_id and filter_user_id.isdigit():
-        guests = guests.filter(assigned_to__id=filter_user_id)
-
-    if filter_service:
-        guests = guests.filter(service_attended__iexact=filter_service)
-
-    if search_query:
-        guests = guests.filter(
-            Q(full_name__icontains=search_query) |
-            Q(phone_number__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(referrer_name__icontains=search_query)
+    """
+    Excel export with the same filters as export_csv, written in openpyxl
+    write-only mode; POST or ?async=1 builds it on the job worker instead.
+    """
+    if wants_job(request):
+        return enqueue_guest_job(
+            request, 'guests.export_excel', export_params(request),
+            started="Preparing the Excel export. You will be notified when it is ready to download.",
         )
-
-    # Create workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Guest Entries"
-
-    headers = [
-        'Full Name', 'Phone Number', 'Email', 'Gender',
-        'Date of Birth', 'Marital Status', 'Home Address',
-        'Occupation', 'Date of Visit', 'Purpose of Visit',
-        'Channel of Visit', 'Service Attended',
-        'Referrer Name', 'Referrer Phone Number', 'Status',
-        'Assigned To'
-    ]
-    ws.append(headers)
-
-    for guest in guests:
-        ws.append([
-            f"{guest.title} {guest.full_name}",
-            guest.phone_number,
-            guest.email,
-            guest.gender,
-            safe_date(guest.date_of_birth),
-            guest.marital_status,
-            guest.home_address,
-            guest.occupation,
-            safe_date(guest.date_of_visit),
-            guest.purpose_of_visit,
-            guest.channel_of_visit,
-            guest.service_attended,
-            guest.referrer_name,
-            guest.referrer_phone_number,
-            guest.status,
-            guest.assigned_to.get_full_name() if guest.assigned_to else '',
-        ])
-
-    # ---- ASGI-SAFE: Write to BytesIO first ----
-    from io import BytesIO
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    response = HttpResponse(
-        output.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = 'attachment; filename=guest_entries.xlsx'
-    return response
+    guests = export_queryset(request)
+    return xlsx_response(request, guests, 'guest_entries.xlsx')
 
 
 
@@ -1339,52 +875,23 @@ def export_guests_excel(request):
 @login_required
 @user_passes_test(lambda u: is_magnet_admin(u))  # Only staff users can import
 def import_guests_excel(request):
+    """
+    Queue a batch import from .xlsx on the job worker (see guests.imports).
+    POST dry_run=1 to validate only; the per-row report is the job's result.
+    """
     if request.method == "POST":
         file = request.FILES.get("excel_file")
-        if not file.name.endswith(".xlsx"):
+        if not file or not file.name.endswith(".xlsx"):
+            if wants_json(request):
+                return JsonResponse({"error": "Only .xlsx files are supported."}, status=400)
             messages.error(request, "Only .xlsx files are supported.")
-            return redirect("import_guests")
-
-        wb = openpyxl.load_workbook(file)
-        sheet = wb.active
-
-        headers = [cell.value for cell in sheet[1]]
-        username_col = headers.index("Assigned To (Username)")
+            return redirect("guest_list")
 
-        for row in sheet.iter_rows(min_row=2, values_only=True):
-            try:
-                assigned_to_username = row[username_col]
-                assigned_to_user = User.objects.get(username=assigned_to_username)
-
-                GuestEntry.objects.create(
-                    title=row[0],
-                    full_name=row[1],
-                    gender=row[2],
-                    phone_number=row[3],
-                    email=row[4],
-                    date_of_birth=row[5],
-                    marital_status=row[6],
-                    home_address=row[7],
-                    occupation=row[8],
-                    date_of_visit=row[9],
-                    purpose_of_visit=row[10],
-                    channel_of_visit=row[11],
-                    service_attended=row[12],
-                    referrer_name=row[13],
-                    referrer_phone_number=row[14],
-                    message=row[15],
-                    assigned_to=assigned_to_user,
-                )
-
-            except User.DoesNotExist:
-                messages.warning(request, f"User '{assigned_to_username}' not found. Skipping row.")
-                continue
-            except Exception as e:
-                messages.error(request, f"Error importing row: {e}")
-                continue
-
-        messages.success(request, "Guests imported successfully.")
-        return redirect("guest_list")
+        dry_run = request.POST.get("dry_run") in ("1", "true", "on")
+        return enqueue_guest_job(
+            request, 'guests.import_excel', {"dry_run": "1" if dry_run else ""}, upload=file,
+            started=f"{'Checking' if dry_run else 'Importing'} {file.name}. You will be notified when it is done.",
+        )
 
     return render(request, "guests/import_excel.html")
 
@@ -1478,63 +985,16 @@ def followup_history_view(request, guest_id):
     })
 
 
+@login_required
 def export_followup_reports_pdf(request, guest_id):
+    """Download the follow-up report PDF; POST or ?async=1 renders it on the job worker (guests.tasks.followup_pdf)."""
     guest = get_object_or_404(GuestEntry, id=guest_id)
-    reports = FollowUpReport.objects.filter(guest=guest).order_by('-report_date')
-
-    # Create a PDF buffer
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, title="Guest Reports")
-
-    styles = getSampleStyleSheet()
-    elements = []
-
-    # Custom title style
-    title_style = ParagraphStyle(
-        name='Title',
-        fontSize=16,
-        leading=24,
-        alignment=1,  # Center
-        spaceAfter=20,
-    )
-
-    # Optional Logo
-    logo_path = os.path.join('static', 'your_logo.png')  # Adjust path
-    if os.path.exists(logo_path):
-        logo = Image(logo_path, width=100, height=40)
-        logo.hAlign = 'LEFT'
-        elements.append(logo)
-
-    # Title
-    elements.append(Paragraph(f"Follow-Up Report for {guest.full_name}", title_style))
-    elements.append(Spacer(1, 10))
-
-    # Table header and data
-    data = [['Date', 'Sunday', 'Midweek', 'Message', 'Assigned To']]
-    for report in reports:
-        assigned_to_name = report.assigned_to.get_full_name() if report.assigned_to else 'Unknown'
-        data.append([
-            report.report_date.strftime("%Y-%m-%d"),
-            '✔️' if report.service_sunday else '',
-            '✔️' if report.service_midweek else '',
-            report.note or ''
-        ])
-
-    table = Table(data, colWidths=[80, 60, 60, 280, 80])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f0f0f0")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor("#000000")),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('PADDING', (0, 0), (-1, -1), 6),
-    ]))
-
-    elements.append(table)
-    doc.build(elements)
-
-    buffer.seek(0)
-    return HttpResponse(buffer, content_type='application/pdf', headers={
+    if wants_job(request):
+        return enqueue_guest_job(
+            request, 'guests.followup_pdf', {"guest_id": guest.id},
+            started="Preparing the PDF. You will be notified when it is ready to download.",
+        )
+    return HttpResponse(followup_reports_pdf(guest), content_type='application/pdf', headers={
         'Content-Disposition': f'attachment; filename="followup_reports_{guest.id}.pdf"'
     })
 
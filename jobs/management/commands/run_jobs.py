@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from jobs.queues import get_queue
+from jobs.utils import WORKER_ID, purge_finished_jobs, queued_job_ids, requeue_stale_jobs, run_job, start_heartbeat
+
+
+MAINTENANCE_INTERVAL = 600  # seconds between stale-job / purge sweeps
+
+
+class Command(BaseCommand):
+    help = "Run the background job worker (imports, exports, PDF reports)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll', type=float, default=5.0, help="Seconds to wait on the queue before checking the table")
+        parser.add_argument('--once', action='store_true', help="Run every queued job, then exit")
+
+    def handle(self, *args, **options):
+        # Lets other workers tell our running jobs from orphaned ones
+        heartbeat = start_heartbeat()
+        try:
+            if options['once']:
+                ran = self.drain()
+                self.stdout.write(self.style.SUCCESS(f"Ran {ran} queued jobs."))
+                return
+            self.serve(options)
+        finally:
+            heartbeat.set()
+
+    def serve(self, options):
+        self.stdout.write(self.style.SUCCESS(f"🚀 Job worker {WORKER_ID} started"))
+        queue = get_queue()
+        last_maintenance = 0
+        while True:
+            if time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                close_old_connections()
+                requeue_stale_jobs()
+                purge_finished_jobs()
+                last_maintenance = time.monotonic()
+
+            job_id = queue.pop(timeout=options['poll'])
+            close_old_connections()
+            if job_id is not None:
+                self.run(job_id)
+            self.drain()
+
+    def drain(self):
+        ran = 0
+        while True:
+            ids = queued_job_ids()
+            if not ids:
+                return ran
+            for job_id in ids:
+                ran += bool(self.run(job_id))
+
+    def run(self, job_id):
+        job = run_job(job_id)
+        if job is not None:
+            style = self.style.SUCCESS if job.status == job.SUCCEEDED else self.style.ERROR
+            self.stdout.write(style(f"{job} finished in {(job.finished_at - job.started_at).total_seconds():.1f}s"))
+        return job
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:10
+
+import jobs.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Job inputs and results move from bytea columns to job_storage(). Files
+    of existing jobs are dropped: finished ones are purged after a week, and
+    a job still queued at deploy time fails and can be started again.
+    """
+
+    dependencies = [
+        ('jobs', '0002_job_worker'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='job',
+            name='input_file',
+        ),
+        migrations.RemoveField(
+            model_name='job',
+            name='result_file',
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='input_file',
+            field=models.FileField(blank=True, max_length=255, storage=jobs.models.job_storage, upload_to=jobs.models.job_file_path),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='result_file',
+            field=models.FileField(blank=True, max_length=255, storage=jobs.models.job_storage, upload_to=jobs.models.job_file_path),
+        ),
+    ]
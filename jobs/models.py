@@ -0,0 +1,87 @@
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import storages
+from django.db import models
+from django.urls import reverse
+
+
+def job_storage():
+    """
+    The storage holding job inputs and results: the settings.JOBS_STORAGE
+    alias of STORAGES. The web processes save uploads and serve downloads,
+    the worker reads and writes them, so it must be shared by both.
+    """
+    return storages[getattr(settings, 'JOBS_STORAGE', 'default')]
+
+
+def job_file_path(job, filename):
+    # A random directory per file: names are not guessable and never collide
+    return f"jobs/{uuid.uuid4().hex}/{filename}"
+
+
+class Job(models.Model):
+    """A background task run by the run_jobs worker; its input and result files live in job_storage()."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    kind = models.CharField(max_length=50)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='jobs')
+    params = models.JSONField(default=dict, blank=True)
+    input_file = models.FileField(upload_to=job_file_path, storage=job_storage, max_length=255, blank=True)
+    input_name = models.CharField(max_length=255, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    worker = models.CharField(max_length=100, blank=True)  # run_jobs process running it (jobs.utils.WORKER_ID)
+    progress = models.PositiveSmallIntegerField(default=0)
+    message = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+
+    result_file = models.FileField(upload_to=job_file_path, storage=job_storage, max_length=255, blank=True)
+    result_name = models.CharField(max_length=255, blank=True)
+    result_content_type = models.CharField(max_length=100, blank=True)
+    result_data = models.JSONField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['user', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    @property
+    def has_result_file(self):
+        return bool(self.result_file)
+
+    def as_dict(self):
+        return {
+            "id": self.pk,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "error": self.error,
+            "result": self.result_data,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "status_url": reverse('jobs:job_status', args=[self.pk]),
+            "download_url": reverse('jobs:download_job_result', args=[self.pk]) if self.has_result_file else None,
+        }
@@ -0,0 +1,53 @@
+"""
+Wake-up queues for the job worker.
+
+The Job table is the source of truth (the worker also picks up queued rows
+it was never told about); a queue only carries job ids so the worker starts
+them immediately instead of at its next poll. Select one with
+settings.JOBS_QUEUE_BACKEND:
+
+- jobs.queues.RedisQueue: shared by the web processes and the worker.
+- jobs.queues.InMemoryQueue: a process-local queue for tests and for running
+  the worker in the same process, no external services needed.
+"""
+import queue
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+DEFAULT_BACKEND = 'jobs.queues.RedisQueue'
+
+
+class InMemoryQueue:
+    _queue = queue.Queue()  # shared by every instance in the process
+
+    def push(self, job_id):
+        self._queue.put(job_id)
+
+    def pop(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class RedisQueue:
+    key = 'gforceapp:jobs:queue'
+
+    def __init__(self, url=None):
+        import redis
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+
+    def push(self, job_id):
+        self.client.rpush(self.key, job_id)
+
+    def pop(self, timeout):
+        item = self.client.blpop([self.key], timeout=max(int(timeout), 1))
+        return int(item[1]) if item else None
+
+
+@lru_cache(maxsize=None)
+def get_queue():
+    return import_string(getattr(settings, 'JOBS_QUEUE_BACKEND', DEFAULT_BACKEND))()
@@ -0,0 +1,42 @@
+"""
+Job handlers, registered from each app's tasks.py:
+
+    @register('guests.export_csv', label="Guest CSV export")
+    def export_csv(job, progress):
+        ...
+        progress(50, "Halfway")
+        return JobOutput(content=data, filename="guests.csv", content_type="text/csv")
+
+content is bytes or a file object (read in chunks, then closed); it is
+saved to job_storage() and served by jobs:download_job_result.
+
+permission(user) decides who may enqueue a kind (any logged-in user by default).
+"""
+from collections import namedtuple
+
+from django.utils.module_loading import autodiscover_modules
+
+
+JobType = namedtuple('JobType', 'kind handler label permission')
+JobOutput = namedtuple('JobOutput', 'content filename content_type data', defaults=(None, '', '', None))
+
+_registry = {}
+
+
+def register(kind, label=None, permission=None):
+    def decorator(handler):
+        _registry[kind] = JobType(kind, handler, label or kind, permission)
+        return handler
+    return decorator
+
+
+def get_job_type(kind):
+    return _registry.get(kind)
+
+
+def can_enqueue(job_type, user):
+    return job_type.permission is None or job_type.permission(user)
+
+
+def discover():
+    autodiscover_modules('tasks')
@@ -0,0 +1,11 @@
+from django.urls import path
+from . import views
+
+app_name = "jobs"
+
+urlpatterns = [
+    path("", views.job_list, name="job_list"),
+    path("enqueue/<str:kind>/", views.enqueue_job, name="enqueue_job"),
+    path("<int:job_id>/", views.job_status, name="job_status"),
+    path("<int:job_id>/download/", views.download_job_result, name="download_job_result"),
+]
@@ -0,0 +1,230 @@
+"""
+Enqueueing, running and reporting background jobs.
+
+Web requests call enqueue(); the run_jobs worker claims queued rows one at a
+time (an UPDATE ... WHERE status='queued', so two workers never run the same
+job), calls the registered handler and stores its output on the row, with
+files in job_storage().
+Progress is written to the row and pushed to the owner's user_<id> group,
+where NotificationConsumer forwards it as a "job_progress" frame.
+
+Each worker stamps the jobs it claims with its WORKER_ID and keeps a
+heartbeat key alive in the cache while it runs (start_heartbeat). A running
+job is only re-queued once its worker's heartbeat has expired, so a slow
+import on a live worker is never picked up a second time.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Job
+from .queues import get_queue
+from .registry import get_job_type
+
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL = 0.5  # seconds between progress writes/pushes
+HEARTBEAT_INTERVAL = 30  # seconds between a worker's heartbeats
+HEARTBEAT_TTL = 120  # a worker silent for this long is dead; its running jobs are re-queued
+KEEP_FOR = timedelta(days=7)  # finished jobs (and their files) are purged after this
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def push_job_progress(job):
+    """Send the job's state to its owner's open tabs; never fails the job over a channel layer hiccup."""
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            f"user_{job.user_id}",
+            {"type": "job_progress", "job": job.as_dict()},
+        )
+    except Exception:
+        logger.warning("Could not push progress for job %s", job.pk, exc_info=True)
+
+
+# ---------------------- Worker heartbeats ----------------------
+def _heartbeat_key(worker_id):
+    return f"jobs:worker:{worker_id}"
+
+
+def beat(worker_id=WORKER_ID):
+    cache.set(_heartbeat_key(worker_id), timezone.now().isoformat(), HEARTBEAT_TTL)
+
+
+def worker_alive(worker_id):
+    return bool(worker_id) and cache.get(_heartbeat_key(worker_id)) is not None
+
+
+def start_heartbeat(worker_id=WORKER_ID):
+    """Beat every HEARTBEAT_INTERVAL from a daemon thread (only the cache is touched, never the Job rows); set() the returned event to stop."""
+    stop = threading.Event()
+
+    def loop():
+        while True:
+            try:
+                beat(worker_id)
+            except Exception:
+                logger.warning("Job worker heartbeat failed", exc_info=True)
+            if stop.wait(HEARTBEAT_INTERVAL):
+                break
+        cache.delete(_heartbeat_key(worker_id))
+
+    threading.Thread(target=loop, name="jobs-heartbeat", daemon=True).start()
+    return stop
+
+
+# ---------------------- Jobs ----------------------
+def enqueue(kind, user, params=None, upload=None):
+    """Create a queued job (upload: an optional UploadedFile saved as the job's input) and wake the worker."""
+    job = Job(kind=kind, user=user, params=params or {}, input_name=upload.name if upload else '')
+    if upload:
+        job.input_file.save(upload.name, upload, save=False)
+    job.save()
+    transaction.on_commit(lambda: get_queue().push(job.pk))
+    push_job_progress(job)
+    return job
+
+
+class ProgressReporter:
+    """
+    progress(percent, message='') callable handed to job handlers. Writes are
+    throttled to one per PROGRESS_INTERVAL; a handler running inside its own
+    transaction.atomic() only exposes the row to pollers on commit, but the
+    websocket event goes out immediately.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.last_sent = 0
+
+    def __call__(self, percent, message=''):
+        percent = max(0, min(int(percent), 100))
+        if percent == self.job.progress and message == self.job.message:
+            return
+        self.job.progress, self.job.message = percent, message[:255]
+        if time.monotonic() - self.last_sent < PROGRESS_INTERVAL:
+            return
+        self.last_sent = time.monotonic()
+        Job.objects.filter(pk=self.job.pk).update(progress=self.job.progress, message=self.job.message)
+        push_job_progress(self.job)
+
+
+def claim(job_id, worker_id=WORKER_ID):
+    """Mark a queued job as running on `worker_id`; False if another worker got it first (or it is not queued)."""
+    return bool(
+        Job.objects.filter(pk=job_id, status=Job.QUEUED)
+        .update(status=Job.RUNNING, worker=worker_id, started_at=timezone.now(), progress=0)
+    )
+
+
+def notify_finished(job, label):
+    """Notification for jobs enqueued from a plain form or link (params notify=1), which have no page waiting on them."""
+    from notifications.utils import notify_users
+
+    if job.status == Job.FAILED:
+        notify_users([job.user], f"{label} failed", job.error[:255], is_urgent=True)
+    elif job.has_result_file:
+        link = reverse('jobs:download_job_result', args=[job.pk])
+        notify_users([job.user], f"{label} ready", f"{job.result_name} is ready to download.", link, is_success=True)
+    else:
+        notify_users([job.user], f"{label} finished", job.message or "Done", is_success=True)
+
+
+def store_result(job, output):
+    """Copy a handler's JobOutput onto the job; content (bytes or a file object) is saved to storage in chunks."""
+    content = output.content
+    if content is not None:
+        file = ContentFile(content) if isinstance(content, bytes) else File(content)
+        try:
+            job.result_file.save(output.filename, file, save=False)
+        finally:
+            file.close()
+        job.result_name = output.filename
+    job.result_content_type = output.content_type
+    job.result_data = output.data
+
+
+def run_job(job_id, worker_id=WORKER_ID):
+    """Run one queued job to completion. Returns the finished Job, or None if it was not claimed."""
+    if not claim(job_id, worker_id):
+        return None
+    job = Job.objects.select_related('user').get(pk=job_id)
+    push_job_progress(job)
+    job_type = get_job_type(job.kind)
+
+    try:
+        if job_type is None:
+            raise LookupError(f"No handler registered for '{job.kind}'")
+        output = job_type.handler(job, ProgressReporter(job))
+        if output is not None:
+            store_result(job, output)
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job.pk, job.kind)
+        job.status, job.error = Job.FAILED, str(e) or e.__class__.__name__
+    else:
+        job.status, job.progress, job.message = Job.SUCCEEDED, 100, "Done"
+
+    job.finished_at = timezone.now()
+    if job.input_file:
+        job.input_file.delete(save=False)  # the upload is not needed once the job has run
+    job.save()
+    push_job_progress(job)
+    if job.params.get('notify'):
+        try:
+            notify_finished(job, job_type.label if job_type else job.kind)
+        except Exception:
+            logger.warning("Could not notify the owner of job %s", job.pk, exc_info=True)
+    return job
+
+
+def queued_job_ids(limit=20):
+    """Queued jobs, oldest first (catches jobs whose wake-up never reached the worker)."""
+    return list(
+        Job.objects.filter(status=Job.QUEUED).order_by('created_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+
+
+def requeue_stale_jobs():
+    """
+    Re-queue running jobs whose worker stopped beating (crashed, redeployed).
+    Jobs claimed less than HEARTBEAT_TTL ago are left alone: their worker
+    may not have written its first heartbeat yet.
+    """
+    running = Job.objects.filter(
+        status=Job.RUNNING, started_at__lt=timezone.now() - timedelta(seconds=HEARTBEAT_TTL),
+    ).values_list('pk', 'worker')
+    requeued = 0
+    for job_id, worker_id in running:
+        if worker_alive(worker_id):
+            continue
+        # Conditional on the same claim, in case the job finished meanwhile
+        requeued += Job.objects.filter(pk=job_id, status=Job.RUNNING, worker=worker_id).update(
+            status=Job.QUEUED, worker='', started_at=None,
+        )
+    return requeued
+
+
+def purge_finished_jobs(older_than=KEEP_FOR):
+    finished = Job.objects.filter(
+        status__in=[Job.SUCCEEDED, Job.FAILED], finished_at__lt=timezone.now() - older_than,
+    )
+    for job in finished.exclude(result_file='').only('pk', 'result_file').iterator():
+        try:
+            job.result_file.delete(save=False)
+        except Exception:
+            logger.warning("Could not delete the result file of job %s", job.pk, exc_info=True)
+    deleted, _ = finished.delete()
+    return deleted
@@ -0,0 +1,56 @@
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_POST
+
+from gforceapp.streaming import file_blocks, streaming_response
+from .models import Job
+from .registry import can_enqueue, get_job_type
+from .utils import enqueue
+
+
+RECENT_JOBS = 20
+
+
+def _user_jobs(user):
+    return Job.objects.filter(user=user)
+
+
+@login_required
+@require_POST
+def enqueue_job(request, kind):
+    """Queue a job of `kind`; query/form fields become its params, an uploaded `file` its input."""
+    job_type = get_job_type(kind)
+    if job_type is None:
+        return JsonResponse({"status": "error", "message": f"Unknown job type '{kind}'"}, status=404)
+    if not can_enqueue(job_type, request.user):
+        return JsonResponse({"status": "error", "message": "Permission denied"}, status=403)
+
+    params = {**request.GET.dict(), **request.POST.dict()}
+    params.pop("csrfmiddlewaretoken", None)
+    job = enqueue(kind, request.user, params=params, upload=request.FILES.get("file"))
+    return JsonResponse(job.as_dict(), status=202)
+
+
+@login_required
+def job_status(request, job_id):
+    return JsonResponse(get_object_or_404(_user_jobs(request.user), pk=job_id).as_dict())
+
+
+@login_required
+def job_list(request):
+    jobs = _user_jobs(request.user)[:RECENT_JOBS]
+    return JsonResponse({"jobs": [job.as_dict() for job in jobs]})
+
+
+@login_required
+def download_job_result(request, job_id):
+    job = get_object_or_404(Job, pk=job_id, user=request.user)
+    if job.status != Job.SUCCEEDED or not job.result_file:
+        raise Http404("This job has no file to download.")
+    try:
+        file = job.result_file.open('rb')
+    except FileNotFoundError:
+        raise Http404("This job's file is no longer available.")
+    content_type = job.result_content_type or 'application/octet-stream'
+    return streaming_response(request, file_blocks(file), content_type, job.result_name, size=job.result_file.size)
@@ -23,3 +23,12 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             "type": "notification",
             "content": event["content"],
         }))
+
+    async def job_progress(self, event):
+        """
+        Called by group_send from jobs.utils.push_job_progress
+        """
+        await self.send(text_data=json.dumps({
+            "type": "job_progress",
+            "job": event["job"],
+        }))
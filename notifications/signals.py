@@ -263,11 +263,6 @@ def notify_user_login(sender, request, user, **kwargs):
 
 
 
-def escape_regex(string):
-    if not string:
-        return ""
-    return re.escape(string)
-
 def detect_mentions_from_text(text, sender=None):
     """
     Detects mentions in a message, considering @Title FullName.
@@ -280,28 +275,11 @@ def detect_mentions_from_text(text, sender=None):
     Returns:
         QuerySet[User]: Users mentioned in the message within sender's teams.
     """
-    if not text:
+    if not text or "@" not in text:
         return User.objects.none()
 
-    # Determine allowed users based on sender's teams
-    if sender:
-        sender_team_ids = TeamMembership.objects.filter(user=sender).values_list("team_id", flat=True)
-        allowed_users = User.objects.filter(team_memberships__team_id__in=sender_team_ids).distinct()
-    else:
-        allowed_users = User.objects.all()
-
-    mentioned_users = []
-    for u in allowed_users:
-        full_name = escape_regex(u.full_name or u.username)
-        title = escape_regex(u.title) if u.title else ""
-        if title:
-            pattern = rf"@(?:{title}\s+)?{full_name}"
-        else:
-            pattern = rf"@{full_name}"
-        if re.search(pattern, text, re.IGNORECASE):
-            mentioned_users.append(u)
-
-    return User.objects.filter(id__in=[u.id for u in mentioned_users])
+    from workforce.mentions import get_mention_index
+    return User.objects.filter(id__in=get_mention_index().mentioned_in_teams(text, sender))
 
 
 @receiver(pre_save, sender=ChatMessage)
@@ -121,7 +121,7 @@ document.addEventListener("DOMContentLoaded", () => {
         <ul class="timeline">
           <li class="timeline-event">
             <div class="timeline-event-icon bg-x-lt d-flex align-items-center justify-content-center" style="width:32px; height:32px;">
-              ${guest.svg_icons?.[field.icon] || ""}
+              <svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"><use href="${guest.icon_sprite}#${field.icon}"></use></svg>
             </div>
             <div class="card timeline-event-card">
               <div class="card-body">
@@ -450,6 +450,9 @@ document.addEventListener('DOMContentLoaded', () => {
           renderNotification(data.content);
           playNotifSound();
           vibrate();
+        } else if (data.type === "job_progress") {
+          // Background import/export progress, shown by BACKGROUND JOBS below
+          document.dispatchEvent(new CustomEvent("job:progress", { detail: data.job }));
         }
       };
 
@@ -578,4 +581,169 @@ document.addEventListener('DOMContentLoaded', () => {
     connectNotifSocket();
   })();
 
+  /* =========================
+     1️⃣2️⃣ BACKGROUND JOBS
+     Imports, exports and PDFs run on the jobs worker. Links and forms with
+     data-job-kind are sent to /jobs/enqueue/<kind>/ instead of the page URL;
+     progress comes from the job:progress event (see NOTIFICATIONS), with
+     polling of the job's status_url while no event arrives.
+     ========================= */
+  (() => {
+    const POLL_MS = 3000;
+    const HIDE_AFTER_MS = 8000;
+    const ERRORS_SHOWN = 5;
+    const jobs = new Map(); // job id -> { label, toast, seen, timer }
+
+    let container = null;
+    function toastContainer() {
+      if (!container) {
+        container = document.createElement("div");
+        container.className = "position-fixed bottom-0 end-0 p-3";
+        container.style.zIndex = 1090;
+        document.body.appendChild(container);
+      }
+      return container;
+    }
+
+    function escapeHtml(text) {
+      const div = document.createElement("div");
+      div.textContent = text ?? "";
+      return div.innerHTML;
+    }
+
+    function createToast(label) {
+      const toast = document.createElement("div");
+      toast.className = "toast show mb-2";
+      toast.setAttribute("role", "status");
+      toast.innerHTML = `
+        <div class="toast-header">
+          <strong class="me-auto">${escapeHtml(label)}</strong>
+          <button type="button" class="btn-close" aria-label="Close"></button>
+        </div>
+        <div class="toast-body">
+          <div class="progress progress-sm mb-2"><div class="progress-bar" style="width: 0%"></div></div>
+          <div class="job-message small text-secondary">Queued…</div>
+        </div>`;
+      toast.querySelector(".btn-close").addEventListener("click", () => toast.remove());
+      toastContainer().appendChild(toast);
+      return toast;
+    }
+
+    function importSummary(report) {
+      const verb = report.dry_run ? "valid" : "imported";
+      const count = report.dry_run ? report.valid : report.created;
+      let html = `${count} of ${report.rows} rows ${verb}.`;
+      if (report.errors.length) {
+        const shown = report.errors.slice(0, ERRORS_SHOWN)
+          .map(e => `<li>Row ${e.row}: ${escapeHtml(e.error)}</li>`).join("");
+        const more = report.errors.length > ERRORS_SHOWN ? `<li>…and ${report.errors.length - ERRORS_SHOWN} more</li>` : "";
+        html += `<ul class="mb-0 ps-3 text-danger">${shown}${more}</ul>`;
+      }
+      return html;
+    }
+
+    function finish(job, entry) {
+      clearInterval(entry.timer);
+      jobs.delete(job.id);
+      const bar = entry.toast.querySelector(".progress-bar");
+      const message = entry.toast.querySelector(".job-message");
+      if (job.status === "failed") {
+        bar.classList.add("bg-danger");
+        message.className = "job-message small text-danger";
+        message.textContent = job.error || "Failed";
+        return;
+      }
+      bar.classList.add("bg-success");
+      if (job.download_url) {
+        message.innerHTML = `Done. <a href="${job.download_url}">Download again</a>`;
+        window.location.href = job.download_url;
+      } else if (job.result && "rows" in job.result) {
+        message.innerHTML = importSummary(job.result);
+        if (job.result.created) {
+          message.insertAdjacentHTML("beforeend", ' <a href="#" class="job-reload">Reload</a>');
+          message.querySelector(".job-reload").addEventListener("click", e => {
+            e.preventDefault();
+            window.location.reload();
+          });
+        }
+        return; // keep import reports until closed
+      } else {
+        message.textContent = job.message || "Done";
+      }
+      setTimeout(() => entry.toast.remove(), HIDE_AFTER_MS);
+    }
+
+    function update(job) {
+      const entry = jobs.get(job.id);
+      if (!entry) return;
+      entry.seen = Date.now();
+      entry.toast.querySelector(".progress-bar").style.width = `${job.progress}%`;
+      entry.toast.querySelector(".job-message").textContent =
+        job.message || (job.status === "queued" ? "Queued…" : "Working…");
+      if (job.status === "succeeded" || job.status === "failed") finish(job, entry);
+    }
+
+    function track(job, label) {
+      const entry = { label, toast: createToast(label), seen: Date.now() };
+      entry.timer = setInterval(async () => {
+        if (Date.now() - entry.seen < POLL_MS) return; // the socket is delivering
+        try {
+          const res = await fetch(job.status_url);
+          if (res.ok) update(await res.json());
+        } catch (err) {
+          console.warn("Job status poll failed", err);
+        }
+      }, POLL_MS);
+      jobs.set(job.id, entry);
+      update(job);
+    }
+
+    async function start(kind, body, label) {
+      try {
+        const res = await fetch(`/jobs/enqueue/${encodeURIComponent(kind)}/`, {
+          method: "POST",
+          headers: { "X-CSRFToken": getCookie("csrftoken") },
+          body
+        });
+        const job = await res.json();
+        if (!res.ok) throw new Error(job.message || res.statusText);
+        track(job, label);
+      } catch (err) {
+        console.error("Could not start job", err);
+        alert(`⚠️ Could not start "${label}": ${err.message}`);
+      }
+    }
+
+    document.addEventListener("job:progress", e => update(e.detail));
+
+    // <a data-job-kind="guests.export_excel" data-job-params="guest_id=1">: the href's query string + data-job-params
+    document.addEventListener("click", e => {
+      const link = e.target.closest("a[data-job-kind]");
+      if (!link) return;
+      e.preventDefault();
+      const body = new URLSearchParams(new URL(link.href, window.location.origin).search);
+      new URLSearchParams(link.dataset.jobParams || "").forEach((value, key) => body.set(key, value));
+      start(link.dataset.jobKind, body, link.dataset.jobLabel || link.textContent.trim());
+    });
+
+    // <form data-job-kind="guests.import_csv">: its fields, with the chosen file sent as `file`
+    document.addEventListener("submit", e => {
+      const form = e.target.closest("form[data-job-kind]");
+      if (!form) return;
+      e.preventDefault();
+      const body = new FormData(form);
+      const input = form.querySelector('input[type="file"]');
+      if (input) {
+        if (!input.files.length) return;
+        body.delete(input.name);
+        body.append("file", input.files[0]);
+      }
+      body.delete("csrfmiddlewaretoken");
+      start(form.dataset.jobKind, body, form.dataset.jobLabel || "Import");
+      form.reset();
+      const modal = form.closest(".modal");
+      if (modal) bootstrap.Modal.getInstance(modal)?.hide();
+    });
+  })();
+
 });
@@ -393,7 +393,7 @@ document.addEventListener("DOMContentLoaded", () => {
               <div class="timeline-event-icon bg-x-lt d-flex align-items-center justify-content-center" style="width:32px; height:32px;">
                 <svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" viewBox="0 0 24 24"
                     fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
-                  ${guest.svg_icons?.[field.icon] || ""}
+                  <use href="${guest.icon_sprite}#${field.icon}"></use>
                 </svg>
               </div>
               <div class="card timeline-event-card">
@@ -1568,7 +1568,7 @@ document.addEventListener("DOMContentLoaded", () => {
               <div class="timeline-event-icon bg-x-lt d-flex align-items-center justify-content-center" style="width:32px; height:32px;">
                 <svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" viewBox="0 0 24 24"
                     fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
-                  ${guest.svg_icons?.[field.icon] || ""}
+                  <use href="${guest.icon_sprite}#${field.icon}"></use>
                 </svg>
               </div>
               <div class="card timeline-event-card">
@@ -32,3 +32,12 @@ class WorkforceConfig(AppConfig):
                 Team.objects.get_or_create(name=name)
 
         post_migrate.connect(create_default_teams, sender=self)
+
+        # ---- Version bumps for the cached chat payloads ----
+        from . import chat_data, pinned  # noqa: F401
+
+        # ---- Per-room chat summaries, updated with each message write ----
+        from . import room_summaries  # noqa: F401
+
+        # ---- Full-text search vectors (Postgres) ----
+        from . import chat_search  # noqa: F401
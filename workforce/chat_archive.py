@@ -0,0 +1,138 @@
+"""
+Archival of old chat history: the hot/cold split of ChatMessage.
+
+archive_old_messages() (a nightly scheduler job, and manage.py
+archive_chat_messages) moves messages older than
+settings.CHAT_ARCHIVE_AFTER_DAYS to ArchivedChatMessage, keeping their ids.
+ChatMessage then holds only recent history, so unread counts, pinned
+stacks, syncs and the first history pages scan a table that grows with
+chat activity, not with chat age. Read state needs no copying: it is one
+cursor per user and room (ChatReadCursor), and archived messages simply
+never count as unread.
+
+chat_history merges both tables when a page reaches back past
+newest_archived(), so scrolling up into archived history looks the same to
+load_more_messages. Archived messages are read-only: they cannot be pinned,
+edited or searched.
+
+A message stays in ChatMessage while it is pinned, or while it has a reply
+that is not archived with it (ChatMessage.parent is a foreign key); it
+moves with a later run.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from gforceapp.versioning import bump_version, get_version
+from .models import ArchivedChatMessage, ChatMessage
+
+
+DEFAULT_AFTER_DAYS = 180
+ARCHIVE_BATCH = 1000
+NEWEST_TIMEOUT = 24 * 60 * 60
+NAMESPACE = "chat_archive"
+
+COPIED_FIELDS = (
+    "id", "sender_id", "team_id", "parent_id", "message", "voice_note", "guest_card_id", "created_at",
+    "file", "file_type", "file_name", "link_url", "link_title", "link_description", "link_image",
+)
+ARCHIVE_RELATED = ("sender", "guest_card__assigned_to")
+
+logger = logging.getLogger(__name__)
+
+
+def horizon(days=None):
+    """Messages created before this are archived."""
+    if days is None:
+        days = getattr(settings, "CHAT_ARCHIVE_AFTER_DAYS", DEFAULT_AFTER_DAYS)
+    return timezone.now() - timedelta(days=days)
+
+
+# ---------------------- Archiving ----------------------
+def _movable(ids):
+    """`ids` minus the messages with a reply staying in ChatMessage (repeated, for reply chains)."""
+    ids = set(ids)
+    while ids:
+        blocked = set(
+            ChatMessage.objects.filter(parent_id__in=ids).exclude(id__in=ids).values_list("parent_id", flat=True)
+        )
+        if not blocked:
+            break
+        ids -= blocked
+    return ids
+
+
+def _archive(ids):
+    rows = list(ChatMessage.objects.filter(id__in=ids).values(*COPIED_FIELDS))
+    with transaction.atomic():
+        ArchivedChatMessage.objects.bulk_create([ArchivedChatMessage(**row) for row in rows])
+        # Moved, not deleted: no post_delete receivers (room summaries keep their
+        # counts, nothing is pinned), and _movable() left no replies to cascade to
+        ChatMessage.objects.filter(id__in=ids)._raw_delete(ChatMessage.objects.db)
+    return len(rows)
+
+
+def archive_old_messages(days=None, batch_size=ARCHIVE_BATCH, max_batches=None):
+    """Move every archivable message older than the horizon, oldest first, in batches."""
+    cutoff = horizon(days)
+    candidates = (
+        ChatMessage.objects.filter(created_at__lt=cutoff, pinned=False)
+        .exclude(replies__created_at__gte=cutoff)
+        .exclude(replies__pinned=True)
+        .order_by("created_at", "id")
+    )
+    archived = batches = 0
+    after = None
+    while max_batches is None or batches < max_batches:
+        page = candidates
+        if after:
+            page = page.filter(created_at__gte=after[0]).exclude(created_at=after[0], id__lte=after[1])
+        rows = list(page.values_list("id", "created_at")[:batch_size])
+        if not rows:
+            break
+        try:
+            archived += _archive(_movable(message_id for message_id, _ in rows))
+        except IntegrityError:
+            # A reply to one of them came in meanwhile; the batch is retried next run
+            logger.warning("Chat archive batch after %s skipped", after, exc_info=True)
+        batches += 1
+        after = (rows[-1][1], rows[-1][0])
+        if len(rows) < batch_size:
+            break
+    if archived:
+        bump_version(NAMESPACE)
+    return {"archived": archived, "batches": batches, "cutoff": cutoff}
+
+
+# ---------------------- Reads ----------------------
+def newest_archived(team_id):
+    """created_at of a room's newest archived message (None = nothing archived); cached until the next run."""
+    key = f"{NAMESPACE}:newest:{team_id or 'central'}:v{get_version(NAMESPACE)}"
+    cached = cache.get(key)
+    if cached is None:
+        newest = ArchivedChatMessage.objects.filter(team_id=team_id).aggregate(newest=Max("created_at"))["newest"]
+        cached = {"newest": newest}
+        cache.set(key, cached, NEWEST_TIMEOUT)
+    return cached["newest"]
+
+
+def attach_parents(messages):
+    """Set .parent on archived messages from either table (ChatMessage.parent is a relation, these are ids)."""
+    parent_ids = {m.parent_id for m in messages if isinstance(m, ArchivedChatMessage) and m.parent_id}
+    if not parent_ids:
+        return messages
+    parents = {m.id: m for m in ChatMessage.objects.filter(id__in=parent_ids).select_related("sender", "guest_card")}
+    missing = parent_ids - parents.keys()
+    if missing:
+        parents.update(
+            (m.id, m) for m in ArchivedChatMessage.objects.filter(id__in=missing).select_related("sender", "guest_card")
+        )
+    for m in messages:
+        if isinstance(m, ArchivedChatMessage):
+            m.parent = parents.get(m.parent_id)
+    return messages
@@ -0,0 +1,214 @@
+"""
+Cached JSON payloads behind the chat page.
+
+chat_room renders a light shell; the team roster, user directory and guest
+assignments are served by separate endpoints that the page fetches in
+parallel. Each payload is built with one query per entity type and cached
+under a version counter (gforceapp.versioning):
+
+- PEOPLE: users, titles, groups, teams and memberships (bumped by the receivers below)
+- GUEST_ASSIGNMENTS: guest names/pictures/assignees (bumped by guests.signals and the bulk importers)
+
+The versions are part of the endpoint URLs, so browsers may cache responses too.
+Presence changes constantly; it comes from workforce.presence through its own
+uncached endpoint.
+"""
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import CustomUser, TeamMembership
+from accounts.utils import get_role_summaries, is_magnet_admin, is_project_admin
+from gforceapp.versioning import GUEST_ASSIGNMENTS, PEOPLE, bump_version, get_version
+from guests.models import GuestEntry
+from .consumers import get_user_color
+from .models import Team
+
+
+PAYLOAD_TIMEOUT = 60 * 60
+GUEST_PAYLOAD_TIMEOUT = 5 * 60  # also covers guest writes that bypass signals (queryset.update)
+PRESENCE_FIELDS = {'is_online', 'last_active', 'last_login'}
+
+
+def _cached(namespace, name, builder, *parts, timeout=PAYLOAD_TIMEOUT):
+    key = ':'.join(str(p) for p in (namespace, name, f"v{get_version(namespace)}", *parts))
+    return cache.get_or_set(key, builder, timeout)
+
+
+def versions():
+    return {'people': get_version(PEOPLE), 'guests': get_version(GUEST_ASSIGNMENTS)}
+
+
+def _initials(user):
+    return "".join(p[0].upper() for p in (user.full_name or user.username).split()[:2])
+
+
+def _image_url(field):
+    return field.url if field else None
+
+
+# ---------------------- Teams ----------------------
+def visible_teams(user):
+    """Active teams shown to `user`: all for superusers and project admins, otherwise their own."""
+    teams = list(Team.objects.filter(is_active=True).order_by("name"))
+    if user.is_superuser or is_project_admin(user):
+        return teams
+    own = set(TeamMembership.objects.filter(user=user).values_list("team_id", flat=True))
+    return [team for team in teams if team.id in own]
+
+
+def followable_team_ids(user):
+    """Team rooms `user` may follow on the chat socket: the teams chat_room shows them."""
+    if not user.is_authenticated:
+        return set()
+    return {team.id for team in visible_teams(user)}
+
+
+# ---------------------- People ----------------------
+def people(team=None):
+    """
+    Every non-superuser, Pastor/Admin first then by name, with the role for
+    `team` (the user directory, minus presence).
+    """
+    def build():
+        users = list(
+            CustomUser.objects.filter(is_superuser=False)
+            .only("id", "username", "full_name", "title", "phone_number", "image", "is_superuser")
+        )
+        roles = get_role_summaries(users, team)
+        users.sort(key=lambda u: (not roles[u.id][1], (u.full_name or u.username).lower()))
+        return [
+            {
+                "id": u.id,
+                "full_name": u.full_name,
+                "username": u.username,
+                "title": u.title,
+                "initials": u.initials,
+                "phone_number": u.phone_number,
+                "image": _image_url(u.image),
+                "role": roles[u.id][0],
+                "is_project_level": roles[u.id][1],
+                "color": get_user_color(u.id),
+                "team_name": team.name if team else "",
+            }
+            for u in users
+        ]
+    return _cached(PEOPLE, 'directory', build, team.id if team else 'central')
+
+
+def roster():
+    """{team_id: [member, ...]} for every active team, in directory order."""
+    def build():
+        order = {person["id"]: i for i, person in enumerate(people())}
+        members = {}
+        rows = (
+            TeamMembership.objects.filter(team__is_active=True, user__is_superuser=False)
+            .select_related("user").only(
+                "team_id", "user__id", "user__username", "user__full_name",
+                "user__title", "user__phone_number", "user__image",
+            )
+        )
+        for m in rows:
+            u = m.user
+            team_members = members.setdefault(m.team_id, {})
+            team_members[u.id] = {
+                "id": u.id,
+                "full_name": u.full_name,
+                "username": u.username,
+                "title": u.title,
+                "phone_number": u.phone_number,
+                "color": get_user_color(u.id),
+                "initials": _initials(u),
+                "image": _image_url(u.image),
+            }
+        return {
+            team_id: sorted(team_members.values(), key=lambda m: order.get(m["id"], len(order)))
+            for team_id, team_members in members.items()
+        }
+    return _cached(PEOPLE, 'roster', build)
+
+
+def online_user_ids():
+    from .presence import get_presence
+    return get_presence().online_user_ids()
+
+
+# ---------------------- Guests ----------------------
+def _guest_entry(guest, assigned):
+    return {
+        "id": guest.id,
+        "name": guest.full_name,
+        "custom_id": guest.custom_id,
+        "image": _image_url(guest.picture),
+        "title": guest.title,
+        "date_of_visit": guest.date_of_visit.strftime("%Y-%m-%d") if guest.date_of_visit else "",
+        "assigned": assigned,
+    }
+
+
+GUEST_FIELDS = ("id", "full_name", "custom_id", "picture", "title", "date_of_visit", "assigned_to_id")
+
+
+def guest_assignments(team=None):
+    """Each directory user with the guests assigned to them (the chat's guest picker)."""
+    def build():
+        by_user = {}
+        guests = GuestEntry.objects.filter(assigned_to__isnull=False).only(*GUEST_FIELDS).order_by("id")
+        for guest in guests:
+            by_user.setdefault(guest.assigned_to_id, []).append(_guest_entry(guest, True))
+        return [
+            {
+                "id": person["id"],
+                "name": person["full_name"] or person["username"],
+                "role": person["role"],
+                "team_name": person["team_name"],
+                "guests": by_user.get(person["id"], []),
+            }
+            for person in people(team)
+        ]
+    return _cached(
+        GUEST_ASSIGNMENTS, 'assigned', build,
+        team.id if team else 'central', f"p{get_version(PEOPLE)}",
+        timeout=GUEST_PAYLOAD_TIMEOUT,
+    )
+
+
+def unassigned_guests():
+    def build():
+        guests = GuestEntry.objects.filter(assigned_to__isnull=True).only(*GUEST_FIELDS).order_by("id")
+        return [_guest_entry(guest, False) for guest in guests]
+    return _cached(GUEST_ASSIGNMENTS, 'unassigned', build, timeout=GUEST_PAYLOAD_TIMEOUT)
+
+
+def guest_payload(user, team=None):
+    return {
+        "user_guests": guest_assignments(team),
+        # Unassigned guests: only for Magnet admins (and project-level admins)
+        "unassigned_guests": unassigned_guests() if is_magnet_admin(user) else [],
+    }
+
+
+# ---------------------- Invalidation ----------------------
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= PRESENCE_FIELDS:
+        return
+    bump_version(PEOPLE)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+@receiver(post_save, sender=TeamMembership)
+@receiver(post_delete, sender=TeamMembership)
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+@receiver(post_save, sender=Group)
+def people_changed(sender, **kwargs):
+    bump_version(PEOPLE)
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def user_groups_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_version(PEOPLE)
@@ -0,0 +1,137 @@
+"""
+Keyset pagination of a chat room's history (load_more_messages).
+
+Pages run newest to oldest along (created_at, id), so messages sharing a
+timestamp are neither skipped nor repeated, and each page is one range scan
+of the (team, created_at, id) index however deep it is. A room opened at a
+search hit (history_around) also pages forward, towards the latest message.
+Pages reaching back past the room's newest archived message also scan
+ArchivedChatMessage (chat_archive) and merge the two.
+The cursor handed to the client is opaque: a message's created_at and id,
+base64 encoded.
+"""
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from . import chat_archive
+from .models import ArchivedChatMessage, ChatMessage
+from .utils import MESSAGE_RELATED, serialize_messages
+
+
+DEFAULT_PAGE = 50
+MAX_PAGE = 100
+
+
+def encode_cursor(message):
+    raw = f"{message.created_at.isoformat()}|{message.id}"
+    return urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """(created_at, id) from a cursor, or None when the token is not one."""
+    try:
+        raw = urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        created_at, _, message_id = raw.rpartition("|")
+        created_at = parse_datetime(created_at)
+        return (created_at, int(message_id)) if created_at else None
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+
+
+def page_size(value, default=DEFAULT_PAGE, maximum=MAX_PAGE):
+    try:
+        return min(max(int(value), 1), maximum)
+    except (TypeError, ValueError):
+        return default
+
+
+def history_page(team_id, cursor=None, limit=DEFAULT_PAGE):
+    """
+    The `limit` messages of a room (team_id None = central) before `cursor`,
+    oldest first, with the cursor of the next (older) page or None at the start.
+    """
+    messages, has_more = _page(team_id, cursor, limit)
+    next_cursor = encode_cursor(messages[-1]) if has_more else None
+    messages.reverse()
+    return {"messages": serialize_messages(messages), "next_cursor": next_cursor}
+
+
+def newer_page(team_id, cursor, limit=DEFAULT_PAGE):
+    """
+    The `limit` messages of a room after `cursor`, oldest first, with the
+    cursor of the next (newer) page or None once the latest message is in.
+    """
+    messages, has_more = _page(team_id, cursor, limit, newer=True)
+    newer_cursor = encode_cursor(messages[-1]) if has_more else None
+    return {"messages": serialize_messages(messages), "newer_cursor": newer_cursor}
+
+
+def history_around(team_id, message_id, limit=DEFAULT_PAGE):
+    """
+    A room's message `message_id` with up to `limit` messages on either side,
+    oldest first, plus the cursors to page on from there in both directions:
+    a search hit opens without paging through everything newer than it.
+    None when the room has no such message.
+    """
+    message = ChatMessage.objects.filter(team_id=team_id, id=message_id).select_related(*MESSAGE_RELATED).first()
+    if message is None:
+        message = (
+            ArchivedChatMessage.objects.filter(team_id=team_id, id=message_id)
+            .select_related(*chat_archive.ARCHIVE_RELATED).first()
+        )
+        if message is None:
+            return None
+        chat_archive.attach_parents([message])
+    cursor = (message.created_at, message.id)
+    older, more_older = _page(team_id, cursor, limit)
+    newer, more_newer = _page(team_id, cursor, limit, newer=True)
+    older.reverse()
+    # With limit 0 the pages are empty and the hit itself is where paging goes on
+    return {
+        "messages": serialize_messages(older + [message] + newer),
+        "next_cursor": encode_cursor(older[0] if older else message) if more_older else None,
+        "newer_cursor": encode_cursor(newer[-1] if newer else message) if more_newer else None,
+    }
+
+
+def _range(qs, cursor, limit, newer):
+    """Up to limit + 1 messages of `qs` from `cursor` on, nearest first."""
+    if cursor:
+        created_at, message_id = cursor
+        # The created_at bound limits the index scan; the OR only settles ties
+        if newer:
+            qs = qs.filter(created_at__gte=created_at).filter(
+                Q(created_at__gt=created_at) | Q(id__gt=message_id)
+            )
+        else:
+            qs = qs.filter(created_at__lte=created_at).filter(
+                Q(created_at__lt=created_at) | Q(id__lt=message_id)
+            )
+    order = ("created_at", "id") if newer else ("-created_at", "-id")
+    return list(qs.order_by(*order)[:limit + 1])
+
+
+def _reaches_archive(team_id, cursor, messages, limit, newer):
+    newest = chat_archive.newest_archived(team_id)
+    if newest is None:
+        return False
+    if newer:
+        return cursor[0] <= newest
+    # Archived messages are older than the page unless it ran out or reaches back to them
+    return len(messages) <= limit or messages[limit].created_at <= newest
+
+
+def _page(team_id, cursor, limit, newer=False):
+    """Up to `limit` messages of a room from `cursor` on, nearest first, and whether there are more."""
+    messages = _range(ChatMessage.objects.filter(team_id=team_id).select_related(*MESSAGE_RELATED), cursor, limit, newer)
+    if _reaches_archive(team_id, cursor, messages, limit, newer):
+        archived = _range(
+            ArchivedChatMessage.objects.filter(team_id=team_id).select_related(*chat_archive.ARCHIVE_RELATED),
+            cursor, limit, newer,
+        )
+        chat_archive.attach_parents(archived)
+        messages = sorted(messages + archived, key=lambda m: (m.created_at, m.id), reverse=not newer)[:limit + 1]
+    return messages[:limit], len(messages) > limit
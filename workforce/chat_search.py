@@ -0,0 +1,189 @@
+"""
+Full-text search of chat history (chat_search view).
+
+Each message's text and attachment name are indexed. On Postgres they feed
+a `search_vector` column with a GIN index (migration 0022), refreshed by the
+receiver below. On SQLite (development) an FTS5 table mirrors them,
+maintained by triggers. Other databases fall back to substring matching.
+
+Every word of the query must match, and the last one also matches as a
+prefix, so results narrow while the user types. Hits are limited to the
+rooms the user can open. They come newest first in keyset pages
+(chat_history cursors), each with an HTML snippet whose matches are wrapped
+in <mark>. load_more_messages?around=<id> then opens the room around a hit.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils.html import escape
+
+from .chat_history import encode_cursor
+from .models import ChatMessage
+
+
+DEFAULT_PAGE = 20
+MAX_PAGE = 50  # see chat_history.page_size
+MAX_TERMS = 8
+SNIPPET_LENGTH = 160
+SNIPPET_CONTEXT = 40  # characters shown before the first match
+INDEXED_FIELDS = {"message", "file_name"}
+
+FTS_TABLE = "workforce_chatmessage_fts"
+FTS_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"message, file_name, content='workforce_chatmessage', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON workforce_chatmessage BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, message, file_name) VALUES (new.id, new.message, new.file_name); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON workforce_chatmessage BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message, file_name) "
+    f"VALUES ('delete', old.id, old.message, old.file_name); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF message, file_name ON workforce_chatmessage BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message, file_name) "
+    f"VALUES ('delete', old.id, old.message, old.file_name); "
+    f"INSERT INTO {FTS_TABLE}(rowid, message, file_name) VALUES (new.id, new.message, new.file_name); END",
+]
+DROP_FTS_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+_TERM = re.compile(r"[^\W_]+")
+_SPACES = re.compile(r"\s+")
+
+
+def is_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def uses_fts5():
+    return connection.vendor == 'sqlite'
+
+
+def query_terms(query):
+    """Lower-cased words of a query, in order, without repeats."""
+    terms = dict.fromkeys(t.lower() for t in _TERM.findall(query or ""))
+    return list(terms)[:MAX_TERMS]
+
+
+# ---------------------- Index ----------------------
+def search_vector():
+    return SearchVector("message", "file_name", config="simple")
+
+
+def refresh_vectors(queryset):
+    """Recompute search_vector for the messages in `queryset` (Postgres only, no-op elsewhere)."""
+    if is_postgres():
+        queryset.update(search_vector=search_vector())
+
+
+def install_fts(cursor):
+    """Create the SQLite FTS5 table and its triggers if they are missing (Django's table rebuilds drop triggers)."""
+    for sql in FTS_SQL:
+        cursor.execute(sql)
+
+
+def reindex():
+    """Rebuild the search index from ChatMessage; returns the number of messages indexed."""
+    if is_postgres():
+        refresh_vectors(ChatMessage.objects.all())
+    elif uses_fts5():
+        with connection.cursor() as cursor:
+            install_fts(cursor)
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return ChatMessage.objects.count()
+
+
+# ---------------------- Querying ----------------------
+def _matching(queryset, terms):
+    if is_postgres():
+        tsquery = " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+        return queryset.filter(search_vector=SearchQuery(tsquery, config="simple", search_type="raw"))
+    if uses_fts5():
+        match = " ".join([f'"{t}"' for t in terms[:-1]] + [f'"{terms[-1]}"*'])
+        return queryset.filter(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+    for term in terms:
+        queryset = queryset.filter(Q(message__icontains=term) | Q(file_name__icontains=term))
+    return queryset
+
+
+def _term_pattern(terms, tail=""):
+    """Words (as the indexes split them: letters and digits) starting with one of `terms`."""
+    return re.compile(r"(?<![^\W_])(?:%s)%s" % ("|".join(map(re.escape, terms)), tail), re.IGNORECASE)
+
+
+def snippet(text, terms):
+    """Escaped excerpt of `text` from just before the first match, with words starting with a term in <mark>."""
+    text = _SPACES.sub(" ", text or "").strip()
+    pattern = _term_pattern(terms, r"[^\W_]*")
+    first = pattern.search(text)
+    start = max(0, first.start() - SNIPPET_CONTEXT) if first else 0
+    window = text[start:start + SNIPPET_LENGTH]
+    parts, end = [], 0
+    for match in pattern.finditer(window):
+        parts += [escape(window[end:match.start()]), f"<mark>{escape(match.group())}</mark>"]
+        end = match.end()
+    parts.append(escape(window[end:]))
+    return ("…" if start else "") + "".join(parts) + ("…" if start + SNIPPET_LENGTH < len(text) else "")
+
+
+def _hit(message, terms):
+    pattern = _term_pattern(terms)
+    text = message.message or ""
+    if not pattern.search(text) and message.file_name:
+        text = message.file_name
+    return {
+        "id": message.id,
+        "room": str(message.team_id) if message.team_id else "central",
+        "team_id": message.team_id,
+        "team_name": message.team.name if message.team else "Central",
+        "sender": {
+            "id": message.sender.id,
+            "name": message.sender.full_name or message.sender.username,
+            "title": message.sender.title,
+        },
+        "created_at": message.created_at.isoformat(),
+        "file_name": message.file_name,
+        "snippet": snippet(text, terms),
+    }
+
+
+def search_messages(query, team_ids, include_central=True, cursor=None, limit=DEFAULT_PAGE):
+    """
+    Messages of central and the `team_ids` rooms matching `query`, newest
+    first: {"results": [...], "next_cursor": cursor of the next page or None}.
+    """
+    terms = query_terms(query)
+    if not terms or not (team_ids or include_central):
+        return {"results": [], "next_cursor": None}
+    rooms = Q(team_id__in=team_ids)
+    if include_central:
+        rooms |= Q(team__isnull=True)
+
+    qs = _matching(ChatMessage.objects.filter(rooms), terms)
+    if cursor:
+        created_at, message_id = cursor
+        qs = qs.filter(created_at__lte=created_at).filter(Q(created_at__lt=created_at) | Q(id__lt=message_id))
+    messages = list(
+        qs.select_related("sender", "team")
+        .only("id", "team_id", "team__name", "message", "file_name", "created_at",
+              "sender__id", "sender__full_name", "sender__username", "sender__title")
+        .order_by("-created_at", "-id")[:limit + 1]
+    )
+    next_cursor = encode_cursor(messages[limit - 1]) if len(messages) > limit else None
+    return {"results": [_hit(m, terms) for m in messages[:limit]], "next_cursor": next_cursor}
+
+
+# ---------------------- Receivers ----------------------
+@receiver(post_save, sender=ChatMessage)
+def message_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not is_postgres():
+        return
+    if created or update_fields is None or INDEXED_FIELDS & set(update_fields):
+        refresh_vectors(ChatMessage.objects.filter(pk=instance.pk))
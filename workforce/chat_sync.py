@@ -0,0 +1,47 @@
+"""
+Delta sync for chat reconnects and room switches.
+
+A client that already shows a room sends a 'sync' frame with the newest and
+oldest message ids it has per room ("central" or a team id). Each room is
+answered with the messages after the newest id and the ids of pinned
+messages from the oldest id on, so pins and unpins made meanwhile are
+applied as well. A room more than MAX_SYNC_MESSAGES behind gets
+{"reload": true}, and the client reloads it through load_more_messages.
+"""
+from .models import ChatMessage
+from .utils import MESSAGE_RELATED, serialize_messages
+
+
+MAX_SYNC_ROOMS = 10
+MAX_SYNC_MESSAGES = 100
+
+
+def room_delta(team_id, last_id, oldest_id):
+    room = ChatMessage.objects.filter(team_id=team_id)
+    missing = list(
+        room.filter(id__gt=last_id).select_related(*MESSAGE_RELATED)
+        .order_by("created_at", "id")[:MAX_SYNC_MESSAGES + 1]
+    )
+    if len(missing) > MAX_SYNC_MESSAGES:
+        return {"reload": True}
+    return {
+        "messages": serialize_messages(missing),
+        "pinned_ids": list(room.filter(pinned=True, id__gte=oldest_id).values_list("id", flat=True)),
+        "oldest_id": oldest_id,
+    }
+
+
+def sync_rooms(rooms):
+    """{room: delta} for a sync frame's {room: {"last_id", "oldest_id"}}; malformed rooms are skipped."""
+    deltas = {}
+    for room, state in list(rooms.items())[:MAX_SYNC_ROOMS]:
+        room = str(room)
+        if room != "central" and not room.isdigit():
+            continue
+        try:
+            last_id = int(state["last_id"])
+            oldest_id = int(state.get("oldest_id") or last_id)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+        deltas[room] = room_delta(None if room == "central" else int(room), last_id, oldest_id)
+    return deltas
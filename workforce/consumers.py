@@ -1,13 +1,15 @@
-import json, re, urllib.parse, logging, hashlib
-from datetime import timedelta
+import asyncio, json, re, urllib.parse, logging, hashlib, time
 from django.utils.timezone import now
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.db import transaction
 from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.files.storage import default_storage
 from django.utils import timezone
 
+from .flood_control import TYPING_WINDOW, ConnectionLimits, check as check_rate_limits, frame_kind
+
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +48,27 @@ def get_user_color(user_id, variant="class"):
     return color_class  # default (Tabler class)
 
 
+def encoded_event(handler, payload):
+    """
+    Channel-layer event for `handler` carrying `payload` as ready-to-send JSON.
+    A group send is then encoded once by the sender, not once per socket.
+    """
+    return {"type": handler, "text": json.dumps(payload)}
+
+
+def room_group(team_id):
+    """Channel-layer group of a chat room (None is central)."""
+    return f"chat_team_{team_id}" if team_id else "chat_central"
+
+
+def parse_room(value):
+    """A frame's room: None for central, a team id, or False when malformed."""
+    if value in (None, "", "central"):
+        return None
+    value = str(value)
+    return int(value) if value.isdigit() else False
+
+
 
 import hashlib
 
@@ -131,6 +154,18 @@ def handle_file_upload(file_url):
 
 # =================== Chat Consumer ===================
 class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    One socket per page. It is always in chat_central and in the group of
+    every team room the user can open (room_group), joined on connect, so
+    switching rooms does not reconnect and other rooms still update their
+    unread badges. Team-room events go to that room's group only, never
+    through chat_central, so non-members never receive them. Frames about a
+    room carry its team_id.
+
+    Rooms are followed automatically and there is no 'unsubscribe': a
+    'subscribe' frame only tells the server which room is on screen and
+    returns its pinned stack.
+    """
 
     # ---------- WebSocket Lifecycle ----------
     async def connect(self):
@@ -138,6 +173,11 @@ class ChatConsumer(AsyncWebsocketConsumer):
         import urllib.parse
 
         self.user = self.scope["user"]
+        self.rooms = set()        # team ids whose group this socket is in
+        self.followable = None    # team ids the user may follow, loaded on first use
+        self.limits = ConnectionLimits()
+        self.limited_until = {}   # frame kind -> end of the last rate_limited reply's wait
+        self.typing_sent = {}     # room -> last typing broadcast (monotonic)
 
         # Parse team from querystring (no leading '?')
         qs = self.scope.get("query_string", b"").decode()
@@ -147,8 +187,12 @@ class ChatConsumer(AsyncWebsocketConsumer):
         self.team = None
         self.room_group_name = None
 
-        # ALWAYS join central room so broadcasts to chat_central reach everyone
+        # ALWAYS join central room so broadcasts to chat_central reach everyone,
+        # and every room the user can open (messages, typing and pins of a room
+        # go to its group only)
         await self.channel_layer.group_add("chat_central", self.channel_name)
+        for team_id in await self.followable_rooms():
+            await self.subscribe(team_id)
 
         # If team provided, try to find it and join its group too
         team = None
@@ -158,127 +202,225 @@ class ChatConsumer(AsyncWebsocketConsumer):
             if not team:
                 team = await sync_to_async(Team.objects.filter(name__iexact=team_slug).first)()
 
-        if team:
+        # A team in the query string is the default room of frames without team_id
+        if team and await self.subscribe(team.id):
             self.team = team
-            self.room_group_name = f"chat_team_{team.id}"
-            await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-            logger.debug("connect: user=%s joined groups: %s", self.user.id, ["chat_central", getattr(self.team, 'id', None) and f'chat_team_{self.team.id}'])
+            self.room_group_name = room_group(team.id)
+            logger.debug("connect: user=%s joined groups: %s", self.user.id, ["chat_central", self.room_group_name])
         else:
             # for convenience, set active room name to central
             self.room_group_name = "chat_central"
 
         await self.accept()
 
+        self.presence_task = None
         if self.user.is_authenticated:
-            await self.set_user_online(True)
-            await self.broadcast_online_status(True)
+            from .presence import announce, get_presence
+            # A presence store outage must not refuse the socket; the heartbeat re-registers it
+            try:
+                if await get_presence().connect(self.user.id, self.channel_name):
+                    await announce(self.user.id)
+            except Exception:
+                logger.exception("Presence connect failed for user %s", self.user.id)
+            self.presence_task = asyncio.ensure_future(self.presence_heartbeat())
+
+        await self.send_pinned_preview(self.team.id if self.team else None)
 
-        recent = await self.get_recent_pinned(self.team)
+    async def disconnect(self, close_code):
+        if getattr(self, "presence_task", None):
+            from .presence import announce, get_presence
+            self.presence_task.cancel()
+            # Leave the groups below even if the store is down; the connection expires after PRESENCE_TTL
+            try:
+                if await get_presence().disconnect(self.user.id, self.channel_name):
+                    await announce(self.user.id)
+            except Exception:
+                logger.exception("Presence disconnect failed for user %s", self.user.id)
+        await self.channel_layer.group_discard("chat_central", self.channel_name)
+        for team_id in getattr(self, "rooms", ()):
+            await self.channel_layer.group_discard(room_group(team_id), self.channel_name)
+
+    # ---------- Room Subscriptions ----------
+    async def followable_rooms(self):
+        """Team ids the user may follow (chat_data.followable_team_ids), loaded once per connection."""
+        if self.followable is None:
+            from .chat_data import followable_team_ids
+            self.followable = await database_sync_to_async(followable_team_ids)(self.user)
+        return self.followable
+
+    async def can_follow(self, team_id):
+        """Membership check."""
+        return team_id in await self.followable_rooms()
+
+    async def subscribe(self, team_id):
+        """Follow a team room; True when the socket follows it afterwards."""
+        if team_id in self.rooms:
+            return True
+        if not await self.can_follow(team_id):
+            return False
+        await self.channel_layer.group_add(room_group(team_id), self.channel_name)
+        self.rooms.add(team_id)
+        return True
+
+    def frame_room(self, data):
+        """
+        Room a frame is about: None (central) or a followed team id; False
+        when it names a room this socket does not follow. Frames without a
+        team_id use the connect-time team.
+        """
+        if "team_id" not in data:
+            return self.team.id if self.team else None
+        team_id = parse_room(data["team_id"])
+        if team_id is None or team_id in self.rooms:
+            return team_id
+        return False
+
+    async def send_pinned_preview(self, team_id):
+        recent = await self.get_recent_pinned(team_id)
         await self.send(text_data=json.dumps({
             "type": "pinned_preview",
+            "team_id": team_id,
             "messages": recent
         }))
 
-    async def disconnect(self, close_code):
-        if self.user.is_authenticated:
-            await self.set_user_online(False)
-            await self.broadcast_online_status(False)
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
-
-    @database_sync_to_async
-    def set_user_online(self, online: bool):
-        self.user.is_online = online
-        self.user.last_active = timezone.now()
-        self.user.save()
-
-    async def broadcast_online_status(self, online: bool):
-        message = {
-            "type": "user_online_status",
-            "user_id": self.user.id,
-            "is_online": online,
-        }
-
-        # Send to the ROOM this user is currently in
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {"type": "broadcast", "message": message}
-        )
+    async def presence_heartbeat(self):
+        """Keep this connection alive in the presence store while the socket is open."""
+        from .presence import HEARTBEAT_INTERVAL, get_presence
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                await get_presence().heartbeat(self.user.id, self.channel_name)
+            except Exception:
+                logger.exception("Presence heartbeat failed for user %s", self.user.id)
 
     async def broadcast(self, event):
-        await self.send(text_data=json.dumps(event["message"]))
+        await self.send(text_data=event["text"])
 
     async def receive(self, text_data):
         try:
             data = json.loads(text_data)
+        except ValueError:
+            data = None
+        if not await self.within_limits(data) or not isinstance(data, dict):
+            return
+        try:
+            if data.get("type") == "typing":
+                await self.handle_typing(data)
+                return
             if data.get("type") == "mark_read":
-                team_id = data.get("team_id")
-                if team_id:
+                team_id = parse_room(data.get("team_id"))
+                # Same membership check as subscribe: no cursors for other teams' rooms
+                if team_id and await self.can_follow(team_id):
                     await self.mark_team_read(team_id)
                     await self.send_unread_counts()
                 return
+            if data.get("type") == "sync":
+                await self.handle_sync(data.get("rooms") or {})
+                return
+            if data.get("type") == "subscribe":
+                await self.handle_subscription(parse_room(data.get("team_id")))
+                return
             if data.get("type") == "get_unread_counts":
                 await self.send_unread_counts()
+                return
+
+            # Room-scoped frames: only for central and followed rooms
+            team_id = self.frame_room(data)
+            if team_id is False:
+                logger.debug("Frame for unfollowed room %s dropped", data.get("team_id"))
             elif data.get("action"):
-                await self.handle_action(data)
+                await self.handle_action(data, team_id)
             else:
-                # Always attach the current connection’s team
-                team_id = self.team.id if self.team else None
                 await self.handle_new_message({**data, "team_id": team_id})
         except Exception as e:
             logger.error(f"WebSocket receive error: {e}")
 
+    async def within_limits(self, data):
+        """Spend a token for the frame (see flood_control); otherwise reply 'rate_limited' once per wait."""
+        kind = frame_kind(data)
+        reply = await check_rate_limits(self.limits, self.user, kind)
+        if reply is None:
+            return True
+        now = time.monotonic()
+        if now >= self.limited_until.get(kind, 0):
+            self.limited_until[kind] = now + reply["retry_after"]
+            if isinstance(data, dict) and data.get("client_id"):
+                reply["client_id"] = str(data["client_id"])[:64]
+            await self.send(text_data=json.dumps(reply))
+        return False
+
+    async def handle_typing(self, data):
+        """Typing indicators go out at most once per room and TYPING_WINDOW, however often the client sends them."""
+        team_id = self.frame_room(data)
+        if team_id is False or not self.user.is_authenticated:
+            return
+        now = time.monotonic()
+        if now - self.typing_sent.get(team_id, 0) < TYPING_WINDOW:
+            return
+        self.typing_sent[team_id] = now
+        await self.channel_layer.group_send(room_group(team_id), encoded_event("broadcast", {
+            "type": "typing",
+            "team_id": team_id,
+            "user_id": self.user.id,
+        }))
+
     async def send_unread_counts(self):
-        from .models import ChatMessage
         from accounts.models import TeamMembership
+        from .read_cursors import unread_counts
 
         user = self.scope["user"]
         if not user.is_authenticated:
             return
 
-        counts = {}
+        # Unread messages per team the user is a member of (via TeamMembership), excluding their own
+        @sync_to_async
+        def get_counts():
+            team_ids = TeamMembership.objects.filter(user=user).values_list("team_id", flat=True)
+            return unread_counts(user, team_ids)
 
-        # Get all teams the user is a member of via TeamMembership
-        memberships = await sync_to_async(list)(TeamMembership.objects.filter(user=user).select_related('team'))
-        for membership in memberships:
-            team = membership.team
-            # Count unread messages for this team (excluding messages sent by user or already read)
-            unread = await sync_to_async(ChatMessage.objects.filter(
-                team=team
-            ).exclude(sender=user).exclude(read_by=user).count)()
-            counts[str(team.id)] = unread
+        counts = await get_counts()
 
         await self.send(text_data=json.dumps({
             "type": "unread_counts",
-            "counts": counts
+            "counts": {str(team_id): unread for team_id, unread in counts.items()}
         }))
 
-    @database_sync_to_async
-    def mark_team_read(self, team_id):
-        from .models import ChatMessage
-        user = self.scope["user"]
+    async def handle_subscription(self, team_id):
+        """Open a room: its pinned stack comes with the reply (the socket already follows it, see connect)."""
+        if team_id is False:
+            return
+        ok = team_id is None or await self.subscribe(team_id)
+        await self.send(text_data=json.dumps({"type": "subscribed", "team_id": team_id, "ok": ok}))
+        if ok:
+            await self.send_pinned_preview(team_id)
 
-        qs = ChatMessage.objects.filter(
-            team_id=team_id
-        ).exclude(
-            sender=user
-        ).exclude(
-            read_by=user
-        )
+    async def handle_sync(self, rooms):
+        """Answer a reconnecting client with what it missed (see chat_sync), then its unread counts."""
+        from .chat_sync import sync_rooms
+
+        if not isinstance(rooms, dict):
+            return
+        rooms = {room: state for room, state in rooms.items() if parse_room(room) in self.rooms | {None}}
+        deltas = await database_sync_to_async(sync_rooms)(rooms)
+        await self.send(text_data=json.dumps({"type": "sync", "rooms": deltas}))
+        await self.send_unread_counts()
 
-        for msg in qs:
-            msg.read_by.add(user)
+    @database_sync_to_async
+    def mark_team_read(self, team_id):
+        from .read_cursors import mark_read
+        mark_read(self.scope["user"], team_id)
 
     # ---------- Action Handler ----------
-    async def handle_action(self, data):
+    async def handle_action(self, data, team_id):
         action = data.get("action")
         sender_id = data.get("sender_id")
 
         if action == "pin":
             message_ids = data.get("message_ids", [])
-            pinned_map = await self.handle_pin(message_ids, sender_id)
+            pinned_map = await self.handle_pin(message_ids, sender_id, team_id)
 
             # 🔹 Get sender info for pinned_by
-            from .models import CustomUser
+            from accounts.models import CustomUser
             try:
                 pinner = await sync_to_async(CustomUser.objects.get)(id=sender_id)
                 pinned_by_payload = {
@@ -291,24 +433,19 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
             # 🔹 1. Tell all clients to toggle bubble flags
             await self.channel_layer.group_send(
-                self.room_group_name,
-                {
+                room_group(team_id),
+                encoded_event("message_pinned", {
                     "type": "message_pinned",
+                    "team_id": team_id,
                     "message_ids": message_ids,
                     "pinned": pinned_map,
                     "pinned_by": pinned_by_payload,
-                }
+                })
             )
 
-            # 🔹 2. Broadcast updated pinned preview stack
-            recent = await self.get_recent_pinned(self.team)
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "pinned_preview",
-                    "messages": recent
-                }
-            )
+            # 🔹 2. Broadcast updated pinned preview stack (rebuilt once, the save bumped its version)
+            from .pinned import stack_event
+            await self.channel_layer.group_send(room_group(team_id), await database_sync_to_async(stack_event)(team_id))
             return
 
         elif action == "reply":
@@ -342,28 +479,58 @@ class ChatConsumer(AsyncWebsocketConsumer):
             "color": get_user_color(sender_id),
             "team_id": team_id
         }
-        logger.debug("handle_new_message: team_id=%s broadcasting to team=%s and central", team_id, f"chat_team_{team_id}" if team_id else None)
-        # Broadcast to team if assigned
-        if team_id:
-            await self.channel_layer.group_send(f"chat_team_{team_id}", payload)
+        logger.debug("handle_new_message: team_id=%s broadcasting to %s", team_id, room_group(team_id))
+        # Each socket is in the groups of the rooms it can open: one send reaches
+        # each member once, and clients route by team_id (render or unread badge)
+        await self.channel_layer.group_send(room_group(team_id), encoded_event("chat_message", payload))
+
+        # Link preview follows as its own event once fetched
+        if saved_message.get("id") and not saved_message.get("link_preview"):
+            from .link_previews import find_url, schedule
+            url = find_url(message)
+            if url:
+                schedule(self.push_link_preview(saved_message["id"], url, team_id))
+
+    async def push_link_preview(self, message_id, url, team_id):
+        from .link_previews import get_preview
+
+        preview = await get_preview(url)
+        if not preview or not await self.save_link_preview(message_id, preview):
+            return
+        await self.channel_layer.group_send(room_group(team_id), encoded_event("link_preview", {
+            "type": "link_preview",
+            "message_id": message_id,
+            "team_id": team_id,
+            "link_preview": {key: preview.get(key) or "" for key in ("url", "title", "description", "image")},
+        }))
 
-        # Optionally, broadcast to central team
-        await self.channel_layer.group_send("chat_central", payload)
-        #await self.channel_layer.group_send(self.room_group_name, payload)
+    @database_sync_to_async
+    def save_link_preview(self, message_id, preview):
+        from .models import ChatMessage
+        return ChatMessage.objects.filter(id=message_id, link_url__isnull=True).update(
+            link_url=preview["url"],
+            link_title=preview.get("title"),
+            link_description=preview.get("description"),
+            link_image=preview.get("image"),
+        )
 
     # ---------- WebSocket Group Events ----------
+    # Group events come from encoded_event(): forward the JSON untouched
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps(event))
+        await self.send(text_data=event["text"])
 
     async def message_pinned(self, event):
-        await self.send(text_data=json.dumps(event))
+        await self.send(text_data=event["text"])
+
+    async def message_unpinned(self, event):
+        await self.send(text_data=event["text"])
+
+    async def link_preview(self, event):
+        await self.send(text_data=event["text"])
 
     async def pinned_preview(self, event):
         """Broadcast pinned preview list"""
-        await self.send(text_data=json.dumps({
-            "type": "pinned_preview",
-            "messages": event["messages"]
-        }))
+        await self.send(text_data=event["text"])
 
     # =================== Database / Sync Handlers ===================
     @sync_to_async(thread_sensitive=False)
@@ -418,12 +585,12 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     # ---------- Action Handlers ----------
     @sync_to_async
-    def handle_pin(self, message_ids, sender_id):
+    def handle_pin(self, message_ids, sender_id, team_id=None):
         from .models import ChatMessage
         res = {}
         for mid in message_ids:
             try:
-                m = ChatMessage.objects.filter(id=mid).first()
+                m = ChatMessage.objects.filter(id=mid, team_id=team_id).first()
                 if not m:
                     continue
 
@@ -444,39 +611,23 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     # ---------- Helpers ----------
     @sync_to_async
-    def get_recent_pinned(self, team=None):
-        from .models import ChatMessage
-        from .utils import serialize_message, build_mention_helpers
-        cutoff = now() - timedelta(days=14)
-
-        # Auto-unpin expired ones
-        ChatMessage.objects.filter(pinned=True, pinned_at__lt=cutoff).update(
-            pinned=False, pinned_at=None, pinned_by=None
-        )
-
-        qs = ChatMessage.objects.filter(pinned=True, pinned_at__gte=cutoff)
-        if team:
-            qs = qs.filter(team=team)
-        else:
-            qs = qs.filter(team__isnull=True)
-
-        pinned = qs.select_related("pinned_by", "sender", "guest_card").order_by("-pinned_at")[:3]
-        mention_map, mention_regex = build_mention_helpers()
-        return [serialize_message(m, mention_map, mention_regex) for m in pinned]
+    def get_recent_pinned(self, team_id=None):
+        """The room's cached pinned stack; expired pins are unpinned by pinned.sweep_expired_pins."""
+        from .pinned import pinned_stack
+        return pinned_stack(team_id)
 
     # ---------- Build Broadcast Payload ----------
     @sync_to_async
     def get_message_payload(self, message_id):
         from .models import ChatMessage, CustomUser
-        from .utils import serialize_message, build_mention_helpers
+        from .utils import serialize_message, MESSAGE_RELATED
 
         try:
-            msg = ChatMessage.objects.select_related("sender", "guest_card", "parent__sender").get(id=message_id)
+            msg = ChatMessage.objects.select_related(*MESSAGE_RELATED).get(id=message_id)
         except ChatMessage.DoesNotExist:
             return {}
 
-        mention_map, mention_regex = build_mention_helpers()
-        return serialize_message(msg, mention_map, mention_regex)
+        return serialize_message(msg)
 
     # ---------- Create Message (Async DB) ----------
     @sync_to_async
@@ -488,11 +639,11 @@ class ChatConsumer(AsyncWebsocketConsumer):
         from .models import ChatMessage, Team
         from accounts.models import CustomUser
         from guests.models import GuestEntry
-        from .utils import serialize_message, build_mention_helpers, get_link_preview
+        from .utils import serialize_message
+        from .link_previews import find_url, get_cached_preview
         from django.core.files.storage import default_storage
         import os
 
-        url_pattern = re.compile(r'(https?://[^\s]+)')
         mentions_ids = mentions_ids or []
 
         try:
@@ -512,14 +663,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
                         guest_card = None
             parent = ChatMessage.objects.filter(id=parent_id).first() if parent_id else None
 
-            # 🔎 detect link if not provided
+            # 🔎 detect link if not provided: only a cached preview here,
+            # a fresh one is fetched after the broadcast (see push_link_preview)
             if link_preview:
                 link_meta = link_preview
             else:
-                link_meta = {}
-                match = url_pattern.search(message or "")
-                if match:
-                    link_meta = get_link_preview(match.group(0))
+                url = find_url(message)
+                link_meta = (get_cached_preview(url) if url else None) or {}
 
             # ✅ Cloudinary / Local upload
             file_field = None
@@ -535,25 +685,25 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     # Dev → MUST store relative path for FileField
                     file_field = file_data.get("path")
 
-            # ✅ Save message with real FileField
-            saved = ChatMessage.objects.create(
-                sender=sender,
-                team=team,
-                message=message or "",
-                guest_card=guest_card,
-                parent=parent,
-                file=file_field,   # 👈 this is now always a FileField
-                file_type=file_type,
-                file_name = file_name,
-                link_url=link_meta.get("url"),
-                link_title=link_meta.get("title"),
-                link_description=link_meta.get("description"),
-                link_image=link_meta.get("image"),
-            )
+            # ✅ Save message with real FileField (and its room summary, see room_summaries)
+            with transaction.atomic():
+                saved = ChatMessage.objects.create(
+                    sender=sender,
+                    team=team,
+                    message=message or "",
+                    guest_card=guest_card,
+                    parent=parent,
+                    file=file_field,   # 👈 this is now always a FileField
+                    file_type=file_type,
+                    file_name = file_name,
+                    link_url=link_meta.get("url"),
+                    link_title=link_meta.get("title"),
+                    link_description=link_meta.get("description"),
+                    link_image=link_meta.get("image"),
+                )
 
             # ✅ Serialize
-            mention_map, mention_regex = build_mention_helpers()
-            return serialize_message(saved, mention_map, mention_regex)
+            return serialize_message(saved)
 
         except Exception as e:
             import logging
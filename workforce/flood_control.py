@@ -0,0 +1,207 @@
+"""
+Flood control for chat socket frames.
+
+Every inbound frame spends a token from a bucket for its kind (message, pin
+action, typing, sync, ...). Each connection has its own buckets, and the
+expensive kinds also spend from a per-user bucket shared by all of the
+user's tabs and every web node, so reconnecting or opening more tabs does
+not buy more throughput. A frame without a token gets a 'rate_limited' reply
+instead of being processed, and is counted in throttled_counts() (shown by
+manage.py chat_rate_limits).
+
+Per-user buckets are selected with settings.CHAT_RATE_LIMIT_BACKEND:
+
+- workforce.flood_control.RedisRateLimits: shared by every process.
+- workforce.flood_control.InMemoryRateLimits: process-local, for development
+  and tests without Redis.
+
+If the backend fails the frame is allowed: flood control must not take the
+chat down with it.
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'workforce.flood_control.RedisRateLimits'
+
+# kind -> ((rate per second, burst) per connection, (rate, burst) per user or None)
+LIMITS = {
+    'message': ((1.0, 10), (2.0, 20)),
+    'action': ((2.0, 10), (4.0, 20)),
+    'sync': ((0.2, 3), (0.5, 6)),
+    'subscribe': ((2.0, 20), None),
+    'mark_read': ((2.0, 10), None),
+    'get_unread_counts': ((0.5, 5), None),
+    'typing': ((5.0, 20), None),
+    'other': ((1.0, 10), None),
+}
+TYPING_WINDOW = 3.0  # at most one typing broadcast per room and connection in this window
+
+
+def frame_kind(data):
+    """Bucket of a decoded frame; anything that is not a known frame is 'other'."""
+    if not isinstance(data, dict):
+        return 'other'
+    kind = data.get('type')
+    if kind in LIMITS:
+        return kind
+    if data.get('action'):
+        return 'action'
+    return 'message' if kind in (None, 'chat_message') else 'other'
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """0 when a token was taken, otherwise the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class ConnectionLimits:
+    """The buckets of one socket."""
+
+    def __init__(self):
+        self.buckets = {}
+
+    def take(self, kind):
+        if kind not in self.buckets:
+            self.buckets[kind] = TokenBucket(*LIMITS[kind][0])
+        return self.buckets[kind].take()
+
+
+class InMemoryRateLimits:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}  # (user id, kind) -> TokenBucket
+        self.counts = Counter()
+
+    async def take(self, user_id, kind):
+        """0 when the user's bucket for `kind` had a token, otherwise the seconds to wait."""
+        with self.lock:
+            key = (user_id, kind)
+            if key not in self.buckets:
+                self.buckets[key] = TokenBucket(*LIMITS[kind][1])
+            return self.buckets[key].take()
+
+    async def count_throttled(self, kind, scope):
+        with self.lock:
+            self.counts[f'{kind}:{scope}'] += 1
+
+    def throttled_counts(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def reset_counts(self):
+        with self.lock:
+            self.counts.clear()
+
+
+# KEYS: bucket hash; ARGV: rate, burst, now. Returns {taken (1/0), seconds to wait}
+TAKE_SCRIPT = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+if wait > 0 then
+    return {0, tostring(wait)}
+end
+return {1, '0'}
+"""
+
+
+class RedisRateLimits:
+    """
+    gforceapp:ratelimit:<user id>:<kind>  hash  tokens, last refill (expires once full)
+    gforceapp:ratelimit:throttled         hash  <kind>:<scope> -> throttled frames
+    """
+    prefix = 'gforceapp:ratelimit'
+
+    def __init__(self, url=None):
+        import redis
+        self.url = url or settings.REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+        self.counts_key = f'{self.prefix}:throttled'
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> client
+
+    def _aclient(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            import redis.asyncio
+            client = self._async_clients[loop] = redis.asyncio.Redis.from_url(self.url)
+        return client
+
+    async def take(self, user_id, kind):
+        """0 when the user's bucket for `kind` had a token, otherwise the seconds to wait."""
+        rate, burst = LIMITS[kind][1]
+        taken, wait = await self._aclient().eval(
+            TAKE_SCRIPT, 1, f'{self.prefix}:{user_id}:{kind}', rate, burst, time.time(),
+        )
+        return 0 if taken else float(wait)
+
+    async def count_throttled(self, kind, scope):
+        await self._aclient().hincrby(self.counts_key, f'{kind}:{scope}', 1)
+
+    def throttled_counts(self):
+        return {field.decode(): int(count) for field, count in self.client.hgetall(self.counts_key).items()}
+
+    def reset_counts(self):
+        self.client.delete(self.counts_key)
+
+
+@lru_cache(maxsize=None)
+def get_rate_limits():
+    return import_string(getattr(settings, 'CHAT_RATE_LIMIT_BACKEND', DEFAULT_BACKEND))()
+
+
+async def check(connection_limits, user, kind):
+    """
+    None when a frame of `kind` may be processed, otherwise the
+    'rate_limited' reply (scope: which bucket ran out, retry_after: seconds).
+    """
+    scope = 'connection'
+    wait = connection_limits.take(kind)
+    if not wait and LIMITS[kind][1] and user.is_authenticated:
+        scope = 'user'
+        try:
+            wait = await get_rate_limits().take(user.id, kind)
+        except Exception:
+            logger.exception("Rate limit backend failed; allowing %s frame", kind)
+            return None
+    if not wait:
+        return None
+    try:
+        await get_rate_limits().count_throttled(kind, scope)
+    except Exception:
+        logger.exception("Could not count a throttled %s frame", kind)
+    return {"type": "rate_limited", "frame": kind, "scope": scope, "retry_after": round(wait, 2)}
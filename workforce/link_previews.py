@@ -0,0 +1,302 @@
+"""
+Link previews for chat messages.
+
+Previews are fetched off the send path: a message is broadcast straight away
+and its preview follows as a 'link_preview' event once it is ready. Results
+live in the shared cache under the normalized URL (a YouTube link is keyed by
+its video id), failures included for a shorter time, so a link pasted into
+several rooms is fetched once. Concurrent requests for the same URL share one
+fetch: in-process through a shared task, across processes through a cache
+lock that the other workers poll.
+
+Fetches use aiohttp with a time limit and a cap on the HTML read, follow a
+few redirects by hand and refuse private or loopback addresses.
+"""
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import re
+import weakref
+from urllib.parse import parse_qs, parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import aiohttp
+from bs4 import BeautifulSoup
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+URL_PATTERN = re.compile(r'(https?://[^\s]+)')
+
+FETCH_TIMEOUT = 5            # seconds for a whole page fetch
+PROBE_TIMEOUT = 3            # seconds per thumbnail probe
+MAX_HTML_BYTES = 512 * 1024  # enough for <head>; the rest of the page is never read
+MAX_REDIRECTS = 3
+CHUNK_SIZE = 64 * 1024
+
+PREVIEW_TTL = 24 * 60 * 60
+FAILURE_TTL = 10 * 60
+LOCK_TTL = FETCH_TIMEOUT + PROBE_TIMEOUT + 2
+POLL_INTERVAL = 0.25
+
+USER_AGENT = "Mozilla/5.0 (compatible; GForceLinkPreview/1.0)"
+TRACKING_PARAMS = ("fbclid", "gclid", "igshid", "mc_cid", "mc_eid")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+YOUTUBE_OEMBED = "https://www.youtube.com/oembed"
+YOUTUBE_THUMBS = "https://i.ytimg.com/vi"
+YOUTUBE_THUMB_FILES = ("maxresdefault.jpg", "sddefault.jpg", "hqdefault.jpg", "mqdefault.jpg", "default.jpg")
+
+_FAILED = {}  # cached marker for a URL without a preview
+
+
+# ---------------------- URLs ----------------------
+def find_url(text):
+    """First http(s) URL in a message, or None."""
+    match = URL_PATTERN.search(text or "")
+    return match.group(0) if match else None
+
+
+def is_youtube(url):
+    host = (urlsplit(url).hostname or "").lower()
+    return host == "youtu.be" or host == "youtube.com" or host.endswith(".youtube.com")
+
+
+def extract_youtube_id(url):
+    try:
+        u = urlsplit(url)
+    except ValueError:
+        return None
+    path = u.path
+
+    # youtu.be/<id>
+    if (u.hostname or "").lower() == "youtu.be":
+        return path.strip("/").split("/")[0] or None
+
+    # /watch?v=<id>
+    video_id = parse_qs(u.query).get("v", [None])[0]
+    if video_id:
+        return video_id
+
+    # /shorts/<id>, /embed/<id>, /live/<id>
+    parts = path.split("/")
+    if len(parts) > 2 and parts[1] in ("shorts", "embed", "live"):
+        return parts[2] or None
+    return None
+
+
+def normalize_url(url):
+    """
+    Cache identity of a URL: lowercased scheme and host, no default port,
+    fragment or tracking parameters. YouTube links become 'youtube:<id>'.
+    None for anything that is not an http(s) URL.
+    """
+    try:
+        u = urlsplit((url or "").strip())
+        port = u.port
+    except ValueError:
+        return None
+    scheme = u.scheme.lower()
+    host = (u.hostname or "").lower()
+    if scheme not in DEFAULT_PORTS or not host:
+        return None
+
+    if is_youtube(url):
+        video_id = extract_youtube_id(url)
+        if video_id:
+            return f"youtube:{video_id}"
+
+    netloc = host if port in (None, DEFAULT_PORTS[scheme]) else f"{host}:{port}"
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(u.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ))
+    return urlunsplit((scheme, netloc, u.path or "/", query, ""))
+
+
+def _cache_key(normalized):
+    return "link_preview:" + hashlib.sha1(normalized.encode()).hexdigest()
+
+
+# ---------------------- Fetching ----------------------
+async def _is_public(url):
+    """True when every address the host resolves to is publicly routable."""
+    if getattr(settings, "LINK_PREVIEW_ALLOW_PRIVATE_HOSTS", False):
+        return True
+    u = urlsplit(url)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(u.hostname, u.port or DEFAULT_PORTS.get(u.scheme, 80))
+    except OSError:
+        return False
+    addresses = {ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos}
+    return bool(addresses) and all(address.is_global for address in addresses)
+
+
+async def _read_html(session, url):
+    """Page text (at most MAX_HTML_BYTES of it) and its final URL, or (None, url)."""
+    for _ in range(MAX_REDIRECTS + 1):
+        if urlsplit(url).scheme not in DEFAULT_PORTS or not await _is_public(url):
+            return None, url
+        async with session.get(url, allow_redirects=False) as resp:
+            if resp.status in (301, 302, 303, 307, 308) and "Location" in resp.headers:
+                url = urljoin(url, resp.headers["Location"])
+                continue
+            if resp.status != 200 or "html" not in resp.headers.get("Content-Type", "text/html"):
+                return None, url
+            body = bytearray()
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                body += chunk
+                if len(body) >= MAX_HTML_BYTES:
+                    break
+            return bytes(body[:MAX_HTML_BYTES]).decode(resp.charset or "utf-8", errors="replace"), url
+    return None, url
+
+
+def _meta(soup, *selectors):
+    for attrs in selectors:
+        tag = soup.find("meta", attrs=attrs)
+        if tag and tag.get("content"):
+            return tag["content"].strip()
+    return ""
+
+
+def parse_html(html, url, page_url=None):
+    """OG/Twitter/HTML metadata of a page, or None when it has neither a title nor an image."""
+    soup = BeautifulSoup(html, "html.parser")
+    title = _meta(soup, {"property": "og:title"}, {"name": "twitter:title"})
+    if not title and soup.title and soup.title.string:
+        title = soup.title.string.strip()
+    image = _meta(soup, {"property": "og:image"}, {"name": "twitter:image"})
+    if not title and not image:
+        return None
+    return {
+        "url": url,
+        "title": title,
+        "description": _meta(
+            soup, {"property": "og:description"}, {"name": "description"}, {"name": "twitter:description"}
+        ),
+        "image": urljoin(page_url or url, image) if image else "",
+    }
+
+
+async def _youtube_title(session, video_id):
+    params = {"format": "json", "url": f"https://www.youtube.com/watch?v={video_id}"}
+    try:
+        async with session.get(YOUTUBE_OEMBED, params=params) as resp:
+            if resp.status == 200:
+                return (await resp.json(content_type=None)).get("title", "")
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        pass
+    return ""
+
+
+async def _thumb_exists(session, url):
+    try:
+        async with session.head(url, timeout=aiohttp.ClientTimeout(total=PROBE_TIMEOUT)) as resp:
+            return resp.status == 200
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return False
+
+
+async def _youtube_thumb(session, video_id):
+    """Largest available thumbnail; all sizes are probed at once."""
+    candidates = [f"{YOUTUBE_THUMBS}/{video_id}/{name}" for name in YOUTUBE_THUMB_FILES]
+    found = await asyncio.gather(*(_thumb_exists(session, url) for url in candidates))
+    return next((url for url, ok in zip(candidates, found) if ok), candidates[-1])
+
+
+async def fetch_preview(url):
+    """Fetch a preview without the cache. None when the URL has nothing to show."""
+    timeout = aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
+    async with aiohttp.ClientSession(timeout=timeout, headers={"User-Agent": USER_AGENT}) as session:
+        video_id = extract_youtube_id(url) if is_youtube(url) else None
+        if video_id:
+            title, image = await asyncio.gather(_youtube_title(session, video_id), _youtube_thumb(session, video_id))
+            return {"url": url, "title": title or "YouTube Video", "description": "", "image": image}
+
+        try:
+            html, page_url = await _read_html(session, url)
+        except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeError, LookupError) as e:
+            logger.info("Link preview fetch failed for %s: %s", url, e)
+            return None
+        if not html:
+            return None
+        return await asyncio.to_thread(parse_html, html, url, page_url)
+
+
+# ---------------------- Cache + de-duplication ----------------------
+_inflight = weakref.WeakKeyDictionary()  # event loop -> {normalized url: task}
+
+
+async def _fetch_and_store(url, normalized):
+    key = _cache_key(normalized)
+    lock = key + ":lock"
+    if not await cache.aadd(lock, 1, LOCK_TTL):
+        # Another worker is fetching this URL: wait for its result
+        for _ in range(int(LOCK_TTL / POLL_INTERVAL)):
+            await asyncio.sleep(POLL_INTERVAL)
+            cached = await cache.aget(key)
+            if cached is not None:
+                return cached or None
+        return None
+
+    try:
+        try:
+            preview = await fetch_preview(url)
+        except Exception:
+            logger.exception("Link preview failed for %s", url)
+            preview = None
+        if preview:
+            await cache.aset(key, preview, PREVIEW_TTL)
+        else:
+            await cache.aset(key, _FAILED, FAILURE_TTL)
+        return preview
+    finally:
+        await cache.adelete(lock)
+
+
+async def get_preview(url):
+    """Cached preview for a URL, fetched (once) on a miss. None when there is none."""
+    normalized = normalize_url(url)
+    if normalized is None:
+        return None
+    cached = await cache.aget(_cache_key(normalized))
+    if cached is not None:
+        return {**cached, "url": url} if cached else None
+
+    tasks = _inflight.setdefault(asyncio.get_running_loop(), {})
+    task = tasks.get(normalized)
+    if task is None:
+        task = tasks[normalized] = asyncio.ensure_future(_fetch_and_store(url, normalized))
+        task.add_done_callback(lambda _: tasks.pop(normalized, None))
+    # shield: a cancelled caller must not cancel the fetch others are waiting on
+    preview = await asyncio.shield(task)
+    return {**preview, "url": url} if preview else None
+
+
+def get_cached_preview(url):
+    """Preview from the cache only (sync); None on a miss or a cached failure."""
+    normalized = normalize_url(url)
+    if normalized is None:
+        return None
+    cached = cache.get(_cache_key(normalized))
+    return {**cached, "url": url} if cached else None
+
+
+# ---------------------- Background tasks ----------------------
+_background = set()
+
+
+def schedule(coro):
+    """Run a coroutine after the current handler returns, keeping a reference until it ends."""
+    task = asyncio.ensure_future(coro)
+    _background.add(task)
+
+    def done(t):
+        _background.discard(t)
+        if not t.cancelled() and t.exception():
+            logger.error("Link preview task failed", exc_info=t.exception())
+
+    task.add_done_callback(done)
+    return task
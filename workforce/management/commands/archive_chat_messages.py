@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from workforce import chat_archive
+
+
+class Command(BaseCommand):
+    help = "Move chat messages older than CHAT_ARCHIVE_AFTER_DAYS to the archive table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Archive messages older than this many days (default: the setting)")
+        parser.add_argument("--batch-size", type=int, default=chat_archive.ARCHIVE_BATCH)
+        parser.add_argument("--max-batches", type=int, help="Stop after this many batches")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Archiving chat messages...")
+        result = chat_archive.archive_old_messages(
+            days=options["days"], batch_size=options["batch_size"], max_batches=options["max_batches"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {result['archived']} messages older than {result['cutoff']:%Y-%m-%d} "
+            f"in {result['batches']} batches."
+        ))
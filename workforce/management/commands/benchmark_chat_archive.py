@@ -0,0 +1,105 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from gforceapp.versioning import bump_version
+from workforce import chat_archive, chat_history, chat_sync, pinned
+from workforce.models import ChatMessage, Team
+from workforce.read_cursors import unread_counts
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time the chat hot-path queries for growing histories, before and after archiving (all rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help="Messages in the room")
+        parser.add_argument('--hot', type=int, default=2000, help="Messages newer than the archive horizon")
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def seed(self, size, hot):
+        """A room with `size` messages, one every 10 minutes, the last `hot` of them inside the horizon."""
+        sender, reader = CustomUser.objects.order_by('id')[:2]
+        team = Team.objects.create(name="Benchmark Archive Room")
+        now, horizon = timezone.now(), chat_archive.horizon()
+        hot_step = min(timedelta(minutes=10), (now - horizon) / (hot + 1))
+        created = [now - hot_step * (i + 1) for i in range(hot)]
+        created += [horizon - timedelta(minutes=10) * (i + 1) for i in range(size - hot)]
+        # created_at is auto_now_add; the benchmark needs it in the past
+        field = ChatMessage._meta.get_field('created_at')
+        field.auto_now_add = False
+        try:
+            ChatMessage.objects.bulk_create([
+                ChatMessage(sender=sender, team=team, message=f"Benchmark message {i}", created_at=at)
+                for i, at in enumerate(reversed(created))
+            ], batch_size=2000)
+        finally:
+            field.auto_now_add = True
+        latest = ChatMessage.objects.filter(team=team).order_by('-created_at', '-id').first()
+        ChatMessage.objects.filter(id=latest.id).update(pinned=True, pinned_at=now, pinned_by=sender)
+        return team, reader, latest
+
+    def timed(self, fn, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings) * 1000
+
+    def measure(self, team, reader, latest, repeat):
+        def pins():
+            pinned.invalidate(team.id)
+            pinned.pinned_stack(team.id)
+
+        return {
+            "latest page": self.timed(lambda: chat_history.history_page(team.id, None, chat_history.DEFAULT_PAGE), repeat),
+            "unread count": self.timed(lambda: unread_counts(reader, [team.id]), repeat),
+            "pinned stack": self.timed(pins, repeat),
+            "sync": self.timed(lambda: chat_sync.room_delta(team.id, latest.id - 5, latest.id - 50), repeat),
+        }
+
+    def run(self, size, options):
+        team, reader, latest = self.seed(size, options['hot'])
+        before = self.measure(team, reader, latest, options['repeat'])
+        result = chat_archive.archive_old_messages()
+        after = self.measure(team, reader, latest, options['repeat'])
+
+        # Deep history now spans both tables
+        oldest_hot = ChatMessage.objects.filter(team=team).order_by('created_at', 'id').first()
+        cursor = (oldest_hot.created_at, oldest_hot.id)
+        after["page into archive"] = self.timed(
+            lambda: chat_history.history_page(team.id, cursor, chat_history.DEFAULT_PAGE), options['repeat'],
+        )
+
+        self.stdout.write(
+            f"{size} messages, {ChatMessage.objects.filter(team=team).count()} hot "
+            f"after archiving {result['archived']} (median of {options['repeat']}):"
+        )
+        for name, ms in after.items():
+            was = f"{before[name]:8.2f} ms" if name in before else " " * 11
+            self.stdout.write(f"  {name:<18} before {was}  after {ms:8.2f} ms")
+
+    def handle(self, *args, **options):
+        if CustomUser.objects.count() < 2:
+            raise CommandError("Needs at least two users")
+        for size in options['sizes']:
+            if size <= options['hot']:
+                raise CommandError("--sizes must be larger than --hot")
+            try:
+                with transaction.atomic():
+                    self.run(size, options)
+                    raise Rollback
+            except Rollback:
+                pass
+            # Drop cached archive bounds of the rolled-back room
+            bump_version(chat_archive.NAMESPACE)
+        self.stdout.write(self.style.SUCCESS("Benchmark finished (seeded messages rolled back)."))
@@ -0,0 +1,125 @@
+import random
+import re
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import CustomUser, TeamMembership
+from workforce.mentions import build_mention_index
+from workforce.models import Team
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_mention_helpers():
+    """The previous build_mention_helpers(): every user, one alternation regex (rebuilt per request)."""
+    mention_map = {}
+    for u in CustomUser.objects.all():
+        display = f"@{ (u.title + ' ') if getattr(u, 'title', None) else '' }{ (u.full_name or u.username) }".strip()
+        mention_map[display] = u
+    regex = re.compile(r"(" + "|".join(map(re.escape, mention_map.keys())) + r")") if mention_map else None
+    return mention_map, regex
+
+
+def legacy_detect(text, sender):
+    """The previous detect_mentions_from_text(): one regex per team user, per message."""
+    sender_team_ids = TeamMembership.objects.filter(user=sender).values_list("team_id", flat=True)
+    allowed_users = CustomUser.objects.filter(team_memberships__team_id__in=sender_team_ids).distinct()
+    mentioned = []
+    for u in allowed_users:
+        full_name = re.escape(u.full_name or u.username)
+        pattern = rf"@(?:{re.escape(u.title)}\s+)?{full_name}" if u.title else rf"@{full_name}"
+        if re.search(pattern, text, re.IGNORECASE):
+            mentioned.append(u.id)
+    return mentioned
+
+
+class Command(BaseCommand):
+    help = "Compare the mention index against the old per-request regex and per-user notification scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, nargs='+', default=[500, 5000])
+        parser.add_argument('--messages', type=int, default=200, help="Messages matched per run")
+        parser.add_argument('--page', type=int, default=50, help="Messages per chat page (one legacy regex build each)")
+
+    def seed(self, count):
+        titles = ["Bro.", "Sis.", "Pastor", "Dcn.", None]
+        teams = [Team.objects.create(name=f"Benchmark Team {i}") for i in range(5)]
+        users = CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f"bench_mention_{i}", full_name=f"Bench{i} Person{i % 97}",
+                title=titles[i % len(titles)],
+            )
+            for i in range(count)
+        ], batch_size=1000)
+        TeamMembership.objects.bulk_create(
+            [TeamMembership(user=u, team=teams[i % len(teams)]) for i, u in enumerate(users)],
+            batch_size=1000,
+        )
+        return users
+
+    def messages(self, users, count):
+        rng = random.Random(count)
+        texts = []
+        for i in range(count):
+            if i % 4 == 0:
+                texts.append("Thanks everyone, see you on Sunday!")
+                continue
+            picked = rng.sample(users, 2)
+            names = [
+                f"@{u.title} {u.full_name}" if u.title and i % 2 else f"@{u.full_name}"
+                for u in picked
+            ]
+            texts.append(f"Hi {names[0]}, please follow up with {names[1]}'s guest today.")
+        return texts
+
+    def timed(self, fn):
+        started = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - started
+
+    def run(self, count, options):
+        users = self.seed(count)
+        texts = self.messages(users, options['messages'])
+        sender = users[0]
+        pages = max(1, len(texts) // options['page'])
+
+        # Message serialization: legacy rebuilt the regex for every page of messages
+        def legacy_serialize():
+            for p in range(pages):
+                mention_map, regex = legacy_mention_helpers()
+                for text in texts[p * options['page']:(p + 1) * options['page']]:
+                    [mention_map[token].id for token in set(regex.findall(text))]
+        _, legacy_ser = self.timed(legacy_serialize)
+
+        # Timed build first, then a tracemalloc build for the heap peak (tracing skews timings)
+        index, build = self.timed(build_mention_index)
+        tracemalloc.start()
+        build_mention_index()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        _, index_ser = self.timed(lambda: [index.find(text) for text in texts])
+
+        # Notification detection
+        _, legacy_det = self.timed(lambda: [legacy_detect(text, sender) for text in texts if "@" in text])
+        _, index_det = self.timed(lambda: [index.mentioned_in_teams(text, sender) for text in texts])
+
+        per = lambda seconds: seconds / len(texts) * 1000
+        self.stdout.write(f"{count} users, {len(texts)} messages:")
+        self.stdout.write(f"  index build      {build * 1000:9.1f} ms  (once per process/version, peak heap {peak / 1024 / 1024:.1f} MB)")
+        self.stdout.write(f"  serialize legacy {per(legacy_ser):9.3f} ms/msg  index {per(index_ser):9.4f} ms/msg")
+        self.stdout.write(f"  notify    legacy {per(legacy_det):9.3f} ms/msg  index {per(index_det):9.4f} ms/msg")
+
+    def handle(self, *args, **options):
+        for count in options['users']:
+            try:
+                with transaction.atomic():
+                    self.run(count, options)
+                    raise Rollback
+            except Rollback:
+                pass
+        self.stdout.write(self.style.SUCCESS("Benchmark finished (seeded users rolled back)."))
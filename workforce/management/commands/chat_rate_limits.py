@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from workforce.flood_control import LIMITS, get_rate_limits
+
+
+class Command(BaseCommand):
+    help = "Show the chat socket rate limits and how many frames each one has throttled"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset the throttled-frame counters")
+
+    def handle(self, *args, **options):
+        backend = get_rate_limits()
+        counts = backend.throttled_counts()
+        self.stdout.write(f"Backend: {type(backend).__name__}")
+        self.stdout.write(f"{'frame':<18} {'connection':>16} {'user':>16} {'throttled (conn/user)':>24}")
+        for kind, (per_connection, per_user) in LIMITS.items():
+            limits = [f"{limit[0]:g}/s burst {limit[1]}" if limit else "-" for limit in (per_connection, per_user)]
+            throttled = f"{counts.get(f'{kind}:connection', 0)}/{counts.get(f'{kind}:user', 0)}"
+            self.stdout.write(f"{kind:<18} {limits[0]:>16} {limits[1]:>16} {throttled:>24}")
+        if options["reset"]:
+            backend.reset_counts()
+            self.stdout.write(self.style.SUCCESS("Throttled-frame counters reset."))
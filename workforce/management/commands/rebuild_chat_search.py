@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from workforce import chat_search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the chat full-text search index (search_vector, or the FTS5 table on SQLite)"
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding chat search index...")
+        indexed = chat_search.reindex()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} chat messages."))
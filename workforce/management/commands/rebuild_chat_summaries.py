@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from workforce import room_summaries
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-room chat summaries from ChatMessage and ArchivedChatMessage"
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding chat room summaries...")
+        rooms = room_summaries.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rooms} chat room summaries."))
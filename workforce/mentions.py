@@ -0,0 +1,159 @@
+"""
+Process-wide @mention index.
+
+Every user is reachable by '@Title Full Name' and '@Full Name' (case-insensitive).
+The variants are stored in a trie keyed by lowercased words, and a message is
+scanned once: the trie is walked from each '@', taking the longest name that
+ends on a word boundary. Because every pattern starts with '@', this is the
+Aho–Corasick scan without failure links. A word trie stays small: 5,000 users
+are about 30k nodes, where a character trie would need ~150k.
+
+The index also keeps each user's teams, so notification scoping needs no
+queries. It is built once per process and rebuilt when the 'people' version
+(gforceapp.versioning) moves. workforce.chat_data bumps that version when names,
+titles, groups or team memberships change.
+"""
+import threading
+from collections import namedtuple
+
+from accounts.models import CustomUser, TeamMembership
+from gforceapp.versioning import PEOPLE, get_version
+from .consumers import get_user_color
+
+
+MentionUser = namedtuple('MentionUser', 'id username title name teams')
+
+
+class _Node:
+    __slots__ = ('children', 'user_ids')
+
+    def __init__(self):
+        self.children = {}
+        self.user_ids = ()
+
+
+def _cut_candidates(word):
+    """`word` cut before each trailing non-alphanumeric character: "smith's," -> "smith's", "smith"."""
+    for k in range(len(word) - 1, 0, -1):
+        if not word[k].isalnum():
+            yield word[:k]
+
+
+class MentionIndex:
+    def __init__(self, users, memberships=()):
+        teams = {}
+        for user_id, team_id in memberships:
+            teams.setdefault(user_id, set()).add(team_id)
+
+        self.root = _Node()
+        self.users = {}
+        for u in users:
+            name = u.full_name or u.username
+            self.users[u.id] = MentionUser(u.id, u.username, u.title, name, frozenset(teams.get(u.id, ())))
+            words = name.lower().split()
+            if not words:
+                continue
+            self._add(words, u.id)
+            if u.title:
+                self._add(u.title.lower().split() + words, u.id)
+
+    def _add(self, words, user_id):
+        node = self.root
+        for word in words:
+            child = node.children.get(word)
+            if child is None:
+                child = node.children[word] = _Node()
+            node = child
+        if user_id not in node.user_ids:
+            node.user_ids += (user_id,)
+
+    def _match_at(self, text, pos):
+        """User ids of the longest mention starting at text[pos] (just after '@'), or ()."""
+        node, found, length, first = self.root, (), len(text), True
+        while pos < length:
+            if not first:
+                # Words of a name are separated by whitespace
+                start = pos
+                while pos < length and text[pos].isspace():
+                    pos += 1
+                if pos == start or pos == length:
+                    break
+            end = pos
+            while end < length and not text[end].isspace():
+                end += 1
+            word = text[pos:end].lower()
+
+            child = node.children.get(word)
+            if child is None:
+                # Trailing punctuation ends the mention: "@John Smith," / "@John Smith's"
+                for cut in _cut_candidates(word):
+                    child = node.children.get(cut)
+                    if child is not None and child.user_ids:
+                        found = child.user_ids
+                        break
+                break
+            node, pos, first = child, end, False
+            if node.user_ids:
+                found = node.user_ids
+        return found
+
+    def find(self, text):
+        """Ids of users mentioned in `text`, in order of first appearance."""
+        if not text or '@' not in text:
+            return []
+        ids = []
+        at = text.find('@')
+        while at != -1:
+            for user_id in self._match_at(text, at + 1):
+                if user_id not in ids:
+                    ids.append(user_id)
+            at = text.find('@', at + 1)
+        return ids
+
+    def payload(self, text):
+        """Mention list for serialize_message."""
+        payload = []
+        for user_id in self.find(text):
+            u = self.users[user_id]
+            payload.append({
+                "id": u.id,
+                "username": u.username,
+                "title": u.title or "",
+                "name": u.name,
+                "color": get_user_color(u.id),
+            })
+        return payload
+
+    def mentioned_in_teams(self, text, sender=None):
+        """
+        Ids mentioned in `text`, limited to users sharing a team with `sender`
+        (no team -> nobody). Without a sender every mention counts.
+        """
+        ids = self.find(text)
+        if sender is None:
+            return ids
+        sender_teams = self.users[sender.id].teams if sender.id in self.users else frozenset()
+        return [user_id for user_id in ids if self.users[user_id].teams & sender_teams]
+
+
+def build_mention_index():
+    users = CustomUser.objects.only("id", "username", "full_name", "title")
+    memberships = TeamMembership.objects.values_list("user_id", "team_id")
+    return MentionIndex(users, memberships)
+
+
+_index = None
+_index_version = None
+_lock = threading.Lock()
+
+
+def get_mention_index():
+    """The process-wide index, rebuilt once after a 'people' version bump."""
+    global _index, _index_version
+    version = get_version(PEOPLE)
+    if _index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                _index = build_mention_index()
+                _index_version = version
+    return _index
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+BATCH_SIZE = 1000
+
+
+def _relation(ChatMessage, name):
+    """(through model, message field, user field) of a ChatMessage many-to-many."""
+    field = ChatMessage._meta.get_field(name)
+    return field.remote_field.through, field.m2m_field_name(), field.m2m_reverse_field_name()
+
+
+def convert_read_state(apps, schema_editor):
+    """One cursor per (user, room) at the newest message the user had read or seen."""
+    ChatMessage = apps.get_model('workforce', 'ChatMessage')
+    ChatReadCursor = apps.get_model('workforce', 'ChatReadCursor')
+
+    latest = {}
+    for name in ('read_by', 'seen_by'):
+        through, message, user = _relation(ChatMessage, name)
+        rows = (
+            through.objects.values_list(user, f'{message}__team')
+            .annotate(last_at=Max(f'{message}__created_at'), last_id=Max(message))
+            .order_by()
+        )
+        for user_id, team_id, last_at, last_id in rows.iterator():
+            current = latest.get((user_id, team_id))
+            if current is None or current < (last_at, last_id):
+                latest[(user_id, team_id)] = (last_at, last_id)
+
+    ChatReadCursor.objects.bulk_create(
+        [
+            ChatReadCursor(user_id=user_id, team_id=team_id, last_read_at=last_at, last_read_message_id=last_id)
+            for (user_id, team_id), (last_at, last_id) in latest.items()
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def restore_read_by(apps, schema_editor):
+    """Mark every message up to each cursor as read_by its user (seen_by is left empty)."""
+    ChatMessage = apps.get_model('workforce', 'ChatMessage')
+    ChatReadCursor = apps.get_model('workforce', 'ChatReadCursor')
+    through, message, user = _relation(ChatMessage, 'read_by')
+
+    for cursor in ChatReadCursor.objects.iterator():
+        message_ids = (
+            ChatMessage.objects.filter(team_id=cursor.team_id, created_at__lte=cursor.last_read_at)
+            .exclude(sender_id=cursor.user_id)
+            .values_list('id', flat=True)
+        )
+        through.objects.bulk_create(
+            [through(**{f'{message}_id': message_id, f'{user}_id': cursor.user_id}) for message_id in message_ids.iterator()],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workforce', '0018_chatmessage_read_by'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.BigIntegerField(blank=True, null=True)),
+                ('last_read_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('team', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='workforce.team')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_read_cursors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'team'), name='unique_chat_read_cursor'), models.UniqueConstraint(condition=models.Q(('team__isnull', True)), fields=('user',), name='unique_central_chat_read_cursor')],
+            },
+        ),
+        migrations.RunPython(convert_read_state, restore_read_by),
+        migrations.RemoveField(
+            model_name='chatmessage',
+            name='read_by',
+        ),
+        migrations.RemoveField(
+            model_name='chatmessage',
+            name='seen_by',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guests', '0019_customidcounter'),
+        ('workforce', '0019_chat_read_cursors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='chatmessage',
+            name='workforce_c_team_id_f40c00_idx',
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['team', 'created_at', 'id'], name='chatmsg_team_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(condition=models.Q(('team__isnull', True)), fields=['created_at', 'id'], name='chatmsg_central_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:36
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def build_summaries(apps, schema_editor):
+    """One summary per room that has messages (see workforce.room_summaries.rebuild)."""
+    from workforce.room_summaries import message_preview
+
+    ChatMessage = apps.get_model('workforce', 'ChatMessage')
+    ChatRoomSummary = apps.get_model('workforce', 'ChatRoomSummary')
+
+    summaries = []
+    for team_id, count in ChatMessage.objects.order_by().values_list('team_id').annotate(n=Count('id')):
+        last = ChatMessage.objects.filter(team_id=team_id).order_by('-created_at', '-id').first()
+        summaries.append(ChatRoomSummary(
+            team_id=team_id,
+            message_count=count,
+            last_message_id=last.id,
+            last_sender_id=last.sender_id,
+            last_preview=message_preview(last),
+            last_at=last.created_at,
+        ))
+    ChatRoomSummary.objects.bulk_create(summaries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workforce', '0020_chatmessage_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatRoomSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_id', models.BigIntegerField(blank=True, null=True)),
+                ('last_preview', models.CharField(blank=True, default='', max_length=200)),
+                ('last_at', models.DateTimeField(blank=True, null=True)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('last_sender', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('team', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chat_summary', to='workforce.team')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-last_at'], name='chat_summary_last_at_idx')],
+                'constraints': [models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('team', models.Value(0)), condition=models.Q(('team__isnull', True)), name='unique_central_chat_summary')],
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
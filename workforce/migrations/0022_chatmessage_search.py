@@ -0,0 +1,70 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:42
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Frozen copies of workforce.chat_search as of this migration, so later
+# changes to that module do not change what this migration creates
+FTS_TABLE = "workforce_chatmessage_fts"
+FTS_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"message, file_name, content='workforce_chatmessage', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON workforce_chatmessage BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, message, file_name) VALUES (new.id, new.message, new.file_name); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON workforce_chatmessage BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message, file_name) "
+    f"VALUES ('delete', old.id, old.message, old.file_name); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF message, file_name ON workforce_chatmessage BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message, file_name) "
+    f"VALUES ('delete', old.id, old.message, old.file_name); "
+    f"INSERT INTO {FTS_TABLE}(rowid, message, file_name) VALUES (new.id, new.message, new.file_name); END",
+]
+DROP_FTS_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def create_search_index(apps, schema_editor):
+    """Postgres: fill search_vector and index it. SQLite: an FTS5 table kept current by triggers."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        ChatMessage = apps.get_model('workforce', 'ChatMessage')
+        ChatMessage.objects.update(
+            search_vector=django.contrib.postgres.search.SearchVector('message', 'file_name', config='simple')
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS chatmsg_search_vector_gin ON workforce_chatmessage USING gin (search_vector)"
+        )
+    elif vendor == 'sqlite':
+        for sql in FTS_SQL:
+            schema_editor.execute(sql)
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS chatmsg_search_vector_gin")
+    elif vendor == 'sqlite':
+        for sql in DROP_FTS_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workforce', '0021_chat_room_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guests', '0019_customidcounter'),
+        ('workforce', '0022_chatmessage_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedChatMessage',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('parent_id', models.BigIntegerField(blank=True, null=True)),
+                ('message', models.TextField(blank=True, null=True)),
+                ('voice_note', models.FileField(blank=True, null=True, upload_to='chat_voice/')),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('file', models.CharField(blank=True, max_length=5000, null=True)),
+                ('file_type', models.CharField(blank=True, max_length=5000, null=True)),
+                ('file_name', models.CharField(blank=True, max_length=5000, null=True)),
+                ('link_url', models.CharField(blank=True, max_length=5000, null=True)),
+                ('link_title', models.CharField(blank=True, max_length=5000, null=True)),
+                ('link_description', models.CharField(blank=True, max_length=5000, null=True)),
+                ('link_image', models.TextField(blank=True, null=True)),
+                ('guest_card', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='guests.guestentry')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('team', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='workforce.team')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['team', 'created_at', 'id'], name='chatarch_team_created_idx'), models.Index(condition=models.Q(('team__isnull', True)), fields=['created_at', 'id'], name='chatarch_central_created_idx')],
+            },
+        ),
+    ]
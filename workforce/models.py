@@ -7,6 +7,8 @@ from django.db.models.signals import post_save
 from cloudinary.models import CloudinaryField
 from guests.models import GuestEntry
 from django.utils.functional import cached_property
+from django.db.models.functions import Coalesce
+from django.contrib.postgres.search import SearchVectorField
 
 
 CHURCH_COORDS = (6.641732871081892, 3.3706539797031843)  # (latitude, longitude)
@@ -121,16 +123,7 @@ class ChatMessage(models.Model):
   #edited = models.BooleanField(default=False)
   #edited_at = models.DateTimeField(null=True, blank=True)
   #deleted = models.BooleanField(default=False)
-  seen_by = models.ManyToManyField(
-      settings.AUTH_USER_MODEL,
-      related_name="seen_messages",
-      blank=True
-  )
-  read_by = models.ManyToManyField(
-      settings.AUTH_USER_MODEL,
-      related_name="read_messages",
-      blank=True
-  )
+  # Read state lives in ChatReadCursor (one row per user and room)
 
   # Attachments
   file = models.CharField(max_length=5000, blank=True, null=True)
@@ -154,13 +147,22 @@ class ChatMessage(models.Model):
       related_name="pinned_messages"
   )
 
+  # Full-text search, maintained by workforce.chat_search (GIN index is Postgres-only, see migration 0022)
+  search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
   class Meta:
       ordering = ["-created_at"]
       indexes = [
           models.Index(fields=["created_at"]),
           models.Index(fields=["sender", "created_at"]),
           models.Index(fields=["guest_card", "created_at"]),
-          models.Index(fields=["team", "created_at"]),
+          # Keyset pagination of a room's history (chat_history): team rooms,
+          # and central, whose NULL team the composite index serves poorly
+          models.Index(fields=["team", "created_at", "id"], name="chatmsg_team_created_id_idx"),
+          models.Index(
+              fields=["created_at", "id"], condition=models.Q(team__isnull=True),
+              name="chatmsg_central_created_id_idx",
+          ),
       ]
 
   def __str__(self):
@@ -175,7 +177,148 @@ class ChatMessage(models.Model):
   def is_seen_by_all(self):
       from accounts.models import CustomUser
       total_users = CustomUser.objects.count()
-      return self.seen_by.count() >= (total_users - 1)
+      seen = (
+          ChatReadCursor.objects.filter(team_id=self.team_id, last_read_at__gte=self.created_at)
+          .exclude(user_id=self.sender_id)
+          .count()
+      )
+      return seen >= (total_users - 1)
+
+
+class ChatReadCursor(models.Model):
+  """
+  How far a user has read in one room (team=None is the central chat).
+  Marking a room read moves the watermark; unread counts are range counts
+  on ChatMessage(team, created_at).
+  """
+
+  user = models.ForeignKey(
+      settings.AUTH_USER_MODEL,
+      on_delete=models.CASCADE,
+      related_name="chat_read_cursors"
+  )
+  team = models.ForeignKey(
+      "workforce.Team",
+      on_delete=models.CASCADE,
+      related_name="read_cursors",
+      null=True,
+      blank=True
+  )
+  last_read_message_id = models.BigIntegerField(null=True, blank=True)
+  last_read_at = models.DateTimeField()
+  updated_at = models.DateTimeField(auto_now=True)
+
+  class Meta:
+      constraints = [
+          models.UniqueConstraint(fields=["user", "team"], name="unique_chat_read_cursor"),
+          models.UniqueConstraint(
+              fields=["user"], condition=models.Q(team__isnull=True), name="unique_central_chat_read_cursor"
+          ),
+      ]
+
+  def __str__(self):
+      return f"{self.user} read {self.team or 'Central'} to {self.last_read_at}"
+
+
+class ChatRoomSummary(models.Model):
+  """
+  Latest activity of one room (team=None is the central chat), kept current
+  by workforce.room_summaries in the transaction that writes the message, so
+  room lists read one row per room instead of scanning ChatMessage.
+  """
+
+  team = models.OneToOneField(
+      "workforce.Team",
+      on_delete=models.CASCADE,
+      related_name="chat_summary",
+      null=True,
+      blank=True
+  )
+  last_message_id = models.BigIntegerField(null=True, blank=True)
+  last_sender = models.ForeignKey(
+      settings.AUTH_USER_MODEL,
+      on_delete=models.SET_NULL,
+      related_name="+",
+      null=True,
+      blank=True
+  )
+  last_preview = models.CharField(max_length=200, blank=True, default="")
+  last_at = models.DateTimeField(null=True, blank=True)
+  message_count = models.PositiveIntegerField(default=0)
+
+  class Meta:
+      constraints = [
+          # team is unique already; NULLs are not, so central gets its own index
+          models.UniqueConstraint(
+              Coalesce("team", models.Value(0)), condition=models.Q(team__isnull=True),
+              name="unique_central_chat_summary",
+          ),
+      ]
+      indexes = [
+          models.Index(fields=["-last_at"], name="chat_summary_last_at_idx"),
+      ]
+
+  def __str__(self):
+      return f"{self.team or 'Central'}: {self.message_count} messages, last {self.last_at}"
+
+
+class ArchivedChatMessage(models.Model):
+  """
+  A chat message past settings.CHAT_ARCHIVE_AFTER_DAYS, moved out of
+  ChatMessage by workforce.chat_archive with its id kept. Same columns minus
+  pin state and the search vector; reads go through chat_history, which
+  merges both tables, so older history pages look the same.
+  """
+
+  id = models.BigIntegerField(primary_key=True)
+  sender = models.ForeignKey(
+      settings.AUTH_USER_MODEL,
+      on_delete=models.CASCADE,
+      related_name="+"
+  )
+  team = models.ForeignKey(
+      "workforce.Team",
+      on_delete=models.CASCADE,
+      related_name="+",
+      null=True,
+      blank=True
+  )
+  # ChatMessage or ArchivedChatMessage id; chat_archive.attach_parents() sets .parent
+  parent_id = models.BigIntegerField(null=True, blank=True)
+  parent = None
+
+  message = models.TextField(blank=True, null=True)
+  voice_note = models.FileField(upload_to="chat_voice/", blank=True, null=True)
+  guest_card = models.ForeignKey(
+      GuestEntry,
+      null=True,
+      blank=True,
+      on_delete=models.SET_NULL,
+      related_name="+"
+  )
+  created_at = models.DateTimeField()
+  archived_at = models.DateTimeField(auto_now_add=True)
+
+  file = models.CharField(max_length=5000, blank=True, null=True)
+  file_type = models.CharField(max_length=5000, blank=True, null=True)
+  file_name = models.CharField(max_length=5000, blank=True, null=True)
+
+  link_url = models.CharField(max_length=5000, blank=True, null=True)
+  link_title = models.CharField(max_length=5000, blank=True, null=True)
+  link_description = models.CharField(max_length=5000, blank=True, null=True)
+  link_image = models.TextField(blank=True, null=True)
+
+  class Meta:
+      indexes = [
+          models.Index(fields=["team", "created_at", "id"], name="chatarch_team_created_idx"),
+          models.Index(
+              fields=["created_at", "id"], condition=models.Q(team__isnull=True),
+              name="chatarch_central_created_idx",
+          ),
+      ]
+
+  def __str__(self):
+      return f"{self.sender} → {self.team or 'Central'} (archived): {(self.message or '')[:30]}"
 
 
 
@@ -0,0 +1,111 @@
+"""
+The pinned stack of each chat room: its newest STACK_SIZE live pins.
+
+The serialized stack is cached per room under a version counter
+(gforceapp.versioning) that pins, unpins and expiries bump, so a socket
+connecting or subscribing to a room reads it from the cache and writes
+nothing. Pins expire PIN_TTL after pinned_at: sweep_expired_pins() (a
+scheduler job) unpins them in bulk and sends each room a
+'message_unpinned' event followed by its new stack.
+"""
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from gforceapp.versioning import bump_version, get_version
+from .consumers import encoded_event, room_group
+from .models import ChatMessage
+from .utils import MESSAGE_RELATED, serialize_messages
+
+
+PIN_TTL = timedelta(days=14)
+STACK_SIZE = 3
+STACK_TIMEOUT = 60 * 60
+SWEEP_INTERVAL = 60  # seconds between expiry sweeps (scheduler job)
+SWEEP_BATCH = 500
+
+
+def _namespace(team_id):
+    return f"pinned:{team_id or 'central'}"
+
+
+def invalidate(team_id):
+    bump_version(_namespace(team_id))
+
+
+def pinned_stack(team_id):
+    """Serialized live pins of a room (team_id None = central), newest first."""
+    namespace = _namespace(team_id)
+    key = f"{namespace}:stack:v{get_version(namespace)}"
+    stack = cache.get(key)
+    if stack is None:
+        now = timezone.now()
+        messages = list(
+            ChatMessage.objects.filter(team_id=team_id, pinned=True, pinned_at__gte=now - PIN_TTL)
+            .select_related(*MESSAGE_RELATED).order_by("-pinned_at")[:STACK_SIZE]
+        )
+        stack = serialize_messages(messages)
+        # Never outlive the oldest pin shown, even if a sweep is late
+        timeout = STACK_TIMEOUT
+        if messages:
+            expires_in = (messages[-1].pinned_at + PIN_TTL - now).total_seconds()
+            timeout = max(1, min(timeout, int(expires_in) + 1))
+        cache.set(key, stack, timeout)
+    return stack
+
+
+def stack_event(team_id):
+    return encoded_event("pinned_preview", {
+        "type": "pinned_preview",
+        "team_id": team_id,
+        "messages": pinned_stack(team_id),
+    })
+
+
+def unpinned_event(team_id, message_ids):
+    return encoded_event("message_unpinned", {
+        "type": "message_unpinned",
+        "team_id": team_id,
+        "message_ids": message_ids,
+    })
+
+
+# ---------------------- Expiry ----------------------
+def sweep_expired_pins():
+    """Unpin every pin older than PIN_TTL and tell the rooms concerned."""
+    cutoff = timezone.now() - PIN_TTL
+    expired = list(ChatMessage.objects.filter(pinned=True, pinned_at__lt=cutoff).values_list("id", "team_id"))
+    for start in range(0, len(expired), SWEEP_BATCH):
+        ids = [message_id for message_id, _ in expired[start:start + SWEEP_BATCH]]
+        ChatMessage.objects.filter(id__in=ids, pinned=True, pinned_at__lt=cutoff).update(
+            pinned=False, pinned_at=None, pinned_by=None
+        )
+
+    rooms = {}
+    for message_id, team_id in expired:
+        rooms.setdefault(team_id, []).append(message_id)
+    send = async_to_sync(get_channel_layer().group_send)
+    for team_id, message_ids in rooms.items():
+        invalidate(team_id)
+        send(room_group(team_id), unpinned_event(team_id, message_ids))
+        send(room_group(team_id), stack_event(team_id))
+    return {"unpinned": len(expired), "rooms": len(rooms)}
+
+
+# ---------------------- Invalidation ----------------------
+@receiver(post_save, sender=ChatMessage)
+def message_saved(sender, instance, created, update_fields=None, **kwargs):
+    # New messages are never pinned; other saves may pin, unpin or edit a pin
+    if instance.pinned or (not created and (update_fields is None or "pinned" in update_fields)):
+        invalidate(instance.team_id)
+
+
+@receiver(post_delete, sender=ChatMessage)
+def message_deleted(sender, instance, **kwargs):
+    if instance.pinned:
+        invalidate(instance.team_id)
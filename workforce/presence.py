@@ -0,0 +1,259 @@
+"""
+Chat presence, kept out of the database.
+
+Each open chat socket is a connection id with an expiry, refreshed by a
+heartbeat from its consumer. A user is online while any of their
+connections (any tab, any web node) has not expired, so closing one tab
+no longer marks them offline, and a node that dies takes its connections
+with it after PRESENCE_TTL.
+
+Only the first connection and the last disconnection change presence.
+Changes are announced to the chat in one 'presence' event per
+BROADCAST_WINDOW, with the state at send time, so a quick reconnect is
+not announced at all. flush_presence() (a scheduler job) writes
+last_active and is_online to CustomUser with bulk update()s, and
+announces users whose connections expired without a disconnect.
+
+The store is selected with settings.CHAT_PRESENCE_BACKEND:
+
+- workforce.presence.RedisPresence: sorted sets shared by every process.
+- workforce.presence.InMemoryPresence: process-local, for development and
+  tests without Redis.
+"""
+import asyncio
+import threading
+import time
+import weakref
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils.module_loading import import_string
+
+from accounts.models import CustomUser
+from .consumers import encoded_event
+
+
+DEFAULT_BACKEND = 'workforce.presence.RedisPresence'
+
+HEARTBEAT_INTERVAL = 30  # seconds between a connection's refreshes
+PRESENCE_TTL = 90        # a connection without a heartbeat for this long is gone
+BROADCAST_WINDOW = 1.0   # presence changes within this window share one event
+FLUSH_INTERVAL = 60      # seconds between database flushes (scheduler job)
+FLUSH_BATCH = 500
+
+
+class InMemoryPresence:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = {}  # user id -> {connection id: expiry}
+        self.seen = {}         # user id -> last heartbeat, since the last drain
+
+    def _live(self, user_id, now):
+        conns = self.connections.get(user_id, {})
+        for conn_id, expires in list(conns.items()):
+            if expires <= now:
+                del conns[conn_id]
+        return conns
+
+    def _touch(self, user_id, conn_id):
+        now = time.time()
+        with self.lock:
+            conns = self._live(user_id, now)
+            conns[conn_id] = now + PRESENCE_TTL
+            self.connections[user_id] = conns
+            self.seen[user_id] = now
+            return len(conns)
+
+    async def connect(self, user_id, conn_id):
+        """Register a connection; True when it is the user's first."""
+        return self._touch(user_id, conn_id) == 1
+
+    async def heartbeat(self, user_id, conn_id):
+        self._touch(user_id, conn_id)
+
+    async def disconnect(self, user_id, conn_id):
+        """Drop a connection; True when it was the user's last."""
+        now = time.time()
+        with self.lock:
+            conns = self._live(user_id, now)
+            conns.pop(conn_id, None)
+            self.seen[user_id] = now
+            return not conns
+
+    async def online_among(self, user_ids):
+        return set(user_ids) & self.online_user_ids()
+
+    def online_user_ids(self):
+        now = time.time()
+        with self.lock:
+            return {user_id for user_id in list(self.connections) if self._live(user_id, now)}
+
+    def drain(self):
+        """({user id: last seen timestamp} since the last drain, ids whose connections all expired)."""
+        now = time.time()
+        with self.lock:
+            seen, self.seen = self.seen, {}
+            expired = set()
+            for user_id in list(self.connections):
+                had = bool(self.connections[user_id])
+                if not self._live(user_id, now):
+                    del self.connections[user_id]
+                    if had:
+                        expired.add(user_id)
+            return seen, expired
+
+
+# KEYS: connections zset, users zset, seen hash; ARGV: connection id, now, user id, expiry
+CONNECT_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+redis.call('ZADD', KEYS[1], ARGV[4], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('ZADD', KEYS[2], 'GT', ARGV[4], ARGV[3])
+redis.call('HSET', KEYS[3], ARGV[3], ARGV[2])
+return redis.call('ZCARD', KEYS[1])
+"""
+
+DISCONNECT_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+redis.call('HSET', KEYS[3], ARGV[3], ARGV[2])
+local left = redis.call('ZCARD', KEYS[1])
+if left == 0 then
+    redis.call('ZREM', KEYS[2], ARGV[3])
+end
+return left
+"""
+
+
+class RedisPresence:
+    """
+    gforceapp:presence:conns:<user id>  zset  connection id -> expiry
+    gforceapp:presence:users            zset  user id -> latest connection expiry
+    gforceapp:presence:seen             hash  user id -> last heartbeat (drained by the flush)
+    """
+    prefix = 'gforceapp:presence'
+
+    def __init__(self, url=None):
+        import redis
+        self.url = url or settings.REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+        self.users_key = f'{self.prefix}:users'
+        self.seen_key = f'{self.prefix}:seen'
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> client
+
+    def _aclient(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            import redis.asyncio
+            client = self._async_clients[loop] = redis.asyncio.Redis.from_url(self.url)
+        return client
+
+    def _keys(self, user_id):
+        return [f'{self.prefix}:conns:{user_id}', self.users_key, self.seen_key]
+
+    async def _run(self, script, user_id, conn_id):
+        now = time.time()
+        return await self._aclient().eval(
+            script, 3, *self._keys(user_id), conn_id, now, user_id, now + PRESENCE_TTL, PRESENCE_TTL,
+        )
+
+    async def connect(self, user_id, conn_id):
+        """Register a connection; True when it is the user's first."""
+        return await self._run(CONNECT_SCRIPT, user_id, conn_id) == 1
+
+    async def heartbeat(self, user_id, conn_id):
+        await self._run(CONNECT_SCRIPT, user_id, conn_id)
+
+    async def disconnect(self, user_id, conn_id):
+        """Drop a connection; True when it was the user's last."""
+        return await self._run(DISCONNECT_SCRIPT, user_id, conn_id) == 0
+
+    async def online_among(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+        now = time.time()
+        scores = await self._aclient().zmscore(self.users_key, user_ids)
+        return {user_id for user_id, score in zip(user_ids, scores) if score and score > now}
+
+    def online_user_ids(self):
+        return {int(user_id) for user_id in self.client.zrangebyscore(self.users_key, time.time(), '+inf')}
+
+    def drain(self):
+        """({user id: last seen timestamp} since the last drain, ids whose connections all expired)."""
+        now = time.time()
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.hgetall(self.seen_key)
+            pipe.delete(self.seen_key)
+            pipe.zrangebyscore(self.users_key, '-inf', now)
+            pipe.zremrangebyscore(self.users_key, '-inf', now)
+            seen, _, expired, _ = pipe.execute()
+        return (
+            {int(user_id): float(ts) for user_id, ts in seen.items()},
+            {int(user_id) for user_id in expired},
+        )
+
+
+@lru_cache(maxsize=None)
+def get_presence():
+    return import_string(getattr(settings, 'CHAT_PRESENCE_BACKEND', DEFAULT_BACKEND))()
+
+
+def presence_event(online, offline):
+    return encoded_event("broadcast", {
+        "type": "presence",
+        "online": sorted(online),
+        "offline": sorted(offline),
+    })
+
+
+# ---------------------- Coalesced announcements ----------------------
+_pending = weakref.WeakKeyDictionary()  # event loop -> (user ids, sender task)
+
+
+async def announce(user_id):
+    """Queue a presence change; all changes within BROADCAST_WINDOW go out as one event."""
+    loop = asyncio.get_running_loop()
+    if loop not in _pending:
+        _pending[loop] = (set(), loop.create_task(_send_pending(loop)))
+    _pending[loop][0].add(user_id)
+
+
+async def _send_pending(loop):
+    await asyncio.sleep(BROADCAST_WINDOW)
+    user_ids, _ = _pending.pop(loop)
+    # Current state, not the queued transition: a reconnect within the window is a no-op
+    online = await get_presence().online_among(user_ids)
+    await get_channel_layer().group_send("chat_central", presence_event(online, user_ids - online))
+
+
+# ---------------------- Database flush ----------------------
+def flush_presence():
+    """
+    Write presence to CustomUser in bulk: last_active for everyone seen since
+    the previous flush and is_online for whoever changed. Users whose
+    connections expired without a disconnect (a dead node) are announced.
+    """
+    backend = get_presence()
+    seen, expired = backend.drain()
+    online = backend.online_user_ids()
+
+    seen = list(seen.items())
+    for start in range(0, len(seen), FLUSH_BATCH):
+        batch = seen[start:start + FLUSH_BATCH]
+        CustomUser.objects.filter(id__in=[user_id for user_id, _ in batch]).update(last_active=Case(
+            *[When(id=user_id, then=Value(datetime.fromtimestamp(ts, dt_timezone.utc))) for user_id, ts in batch],
+            output_field=DateTimeField(),
+        ))
+    went_offline = CustomUser.objects.filter(is_online=True).exclude(id__in=online).update(is_online=False)
+    came_online = CustomUser.objects.filter(id__in=online, is_online=False).update(is_online=True)
+
+    expired -= online
+    if expired:
+        async_to_sync(get_channel_layer().group_send)("chat_central", presence_event((), expired))
+    return {"seen": len(seen), "online": came_online, "offline": went_offline, "expired": len(expired)}
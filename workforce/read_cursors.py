@@ -0,0 +1,48 @@
+"""
+Chat read state as per-room watermarks (ChatReadCursor).
+
+mark_read() moves one row whatever the backlog; unread counts are range
+counts on the ChatMessage(team, created_at) index, all rooms in one query.
+"""
+from django.db.models import Count, Q
+
+from .models import ChatMessage, ChatReadCursor
+
+
+def mark_read(user, team_id):
+    """Move the user's cursor for a room (None = central) to its newest message."""
+    latest = (
+        ChatMessage.objects.filter(team_id=team_id)
+        .order_by("-created_at", "-id")
+        .values_list("id", "created_at")
+        .first()
+    )
+    if latest is None:
+        return None
+    message_id, created_at = latest
+    cursor, _ = ChatReadCursor.objects.update_or_create(
+        user=user, team_id=team_id,
+        defaults={"last_read_message_id": message_id, "last_read_at": created_at},
+    )
+    return cursor
+
+
+def unread_counts(user, team_ids):
+    """{team_id: messages from others newer than the user's cursor} for the given rooms."""
+    team_ids = list(team_ids)
+    if not team_ids:
+        return {}
+    cursors = dict(
+        ChatReadCursor.objects.filter(user=user, team_id__in=team_ids).values_list("team_id", "last_read_at")
+    )
+    unread = Q()
+    for team_id in team_ids:
+        if team_id in cursors:
+            unread |= Q(team_id=team_id, created_at__gt=cursors[team_id])
+        else:
+            unread |= Q(team_id=team_id)
+    counts = dict(
+        ChatMessage.objects.filter(unread).exclude(sender=user)
+        .order_by().values("team_id").annotate(unread=Count("id")).values_list("team_id", "unread")
+    )
+    return {team_id: counts.get(team_id, 0) for team_id in team_ids}
@@ -0,0 +1,137 @@
+"""
+Per-room chat summaries (ChatRoomSummary): last message, sender, preview,
+time and message count.
+
+The receivers below keep each room's row current as messages are created,
+edited and deleted. They run inside the transaction that writes the message,
+so a room list never disagrees with the history. recent_rooms() is then a
+single indexed read however long the histories are, and rebuild()
+(manage.py rebuild_chat_summaries) recomputes every row from ChatMessage
+and ArchivedChatMessage. Pins do not change a summary: pin toggles save
+only the pin fields, and archiving (chat_archive) moves messages without
+deleting them.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ArchivedChatMessage, ChatMessage, ChatRoomSummary
+
+
+PREVIEW_LENGTH = 120
+PREVIEW_FIELDS = {"message", "file", "file_name", "guest_card", "link_url"}
+
+
+def message_preview(message):
+    text = " ".join((message.message or "").split())
+    if text:
+        return text[:PREVIEW_LENGTH]
+    if message.file:
+        return f"Attachment: {message.file_name or 'file'}"[:PREVIEW_LENGTH]
+    if message.guest_card_id:
+        return "Guest card"
+    return (message.link_url or "")[:PREVIEW_LENGTH]
+
+
+def _last_fields(message):
+    if message is None:
+        return {"last_message_id": None, "last_sender_id": None, "last_preview": "", "last_at": None}
+    return {
+        "last_message_id": message.id,
+        "last_sender_id": message.sender_id,
+        "last_preview": message_preview(message),
+        "last_at": message.created_at,
+    }
+
+
+def _latest(team_id):
+    latest = ChatMessage.objects.filter(team_id=team_id).order_by("-created_at", "-id").first()
+    if latest is None:
+        latest = ArchivedChatMessage.objects.filter(team_id=team_id).order_by("-created_at", "-id").first()
+    return latest
+
+
+# ---------------------- Updates ----------------------
+def record_message(message):
+    rows = ChatRoomSummary.objects.filter(team_id=message.team_id)
+    if not rows.update(message_count=F("message_count") + 1):
+        ChatRoomSummary.objects.get_or_create(team_id=message.team_id)
+        rows.update(message_count=F("message_count") + 1)
+    # Only moves forward, so concurrent sends settle on the newest message
+    rows.filter(
+        Q(last_at__isnull=True) | Q(last_at__lt=message.created_at)
+        | Q(last_at=message.created_at, last_message_id__lt=message.id)
+    ).update(**_last_fields(message))
+
+
+def record_edit(message):
+    ChatRoomSummary.objects.filter(team_id=message.team_id, last_message_id=message.id).update(
+        last_preview=message_preview(message)
+    )
+
+
+def record_delete(message):
+    rows = ChatRoomSummary.objects.filter(team_id=message.team_id)
+    rows.filter(message_count__gt=0).update(message_count=F("message_count") - 1)
+    if rows.filter(last_message_id=message.id).exists():
+        rows.update(**_last_fields(_latest(message.team_id)))
+
+
+def rebuild():
+    """Recompute every room's summary from both message tables; returns the number of rooms."""
+    counts = Counter()
+    for model in (ChatMessage, ArchivedChatMessage):
+        counts.update(dict(model.objects.order_by().values_list("team_id").annotate(n=Count("id"))))
+    summaries = [
+        ChatRoomSummary(team_id=team_id, message_count=count, **_last_fields(_latest(team_id)))
+        for team_id, count in counts.items()
+    ]
+    with transaction.atomic():
+        ChatRoomSummary.objects.all().delete()
+        ChatRoomSummary.objects.bulk_create(summaries)
+    return len(summaries)
+
+
+# ---------------------- Reads ----------------------
+def recent_rooms(team_ids):
+    """Central and the given team rooms, latest activity first."""
+    rows = (
+        ChatRoomSummary.objects.filter(Q(team__isnull=True) | Q(team_id__in=team_ids))
+        .select_related("team", "last_sender")
+        .order_by(F("last_at").desc(nulls_last=True))
+    )
+    return [
+        {
+            "room": str(row.team_id) if row.team_id else "central",
+            "team_name": row.team.name if row.team else "Central",
+            "last_message_id": row.last_message_id,
+            "last_sender": {
+                "id": row.last_sender.id,
+                "name": row.last_sender.full_name or row.last_sender.username,
+                "title": row.last_sender.title,
+            } if row.last_sender else None,
+            "last_preview": row.last_preview,
+            "last_at": row.last_at.isoformat() if row.last_at else None,
+            "message_count": row.message_count,
+        }
+        for row in rows
+    ]
+
+
+# ---------------------- Receivers ----------------------
+@receiver(post_save, sender=ChatMessage)
+def message_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        record_message(instance)
+    elif update_fields is None or PREVIEW_FIELDS & set(update_fields):
+        record_edit(instance)
+
+
+@receiver(post_delete, sender=ChatMessage)
+def message_deleted(sender, instance, **kwargs):
+    record_delete(instance)
@@ -7,6 +7,9 @@ from django.utils.timezone import make_aware
 
 from .models import Event
 from .broadcast import broadcast_event
+from .presence import FLUSH_INTERVAL, flush_presence
+from .pinned import SWEEP_INTERVAL, sweep_expired_pins
+from .chat_archive import archive_old_messages
 
 
 # --------------------------------------------------------------------
@@ -207,6 +210,43 @@ def start():
             )
             print("🔁 [Scheduler] Push notifications auto-reschedule set for 00:15 daily")
 
+            # Chat presence: bulk-write last_active / is_online, announce dead connections
+            scheduler.add_job(
+                flush_presence,
+                trigger="interval",
+                seconds=FLUSH_INTERVAL,
+                id="presence_flush",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+            )
+            print(f"🔁 [Scheduler] Presence flush every {FLUSH_INTERVAL}s")
+
+            # Chat pins: unpin expired ones and update the rooms' pinned stacks
+            scheduler.add_job(
+                sweep_expired_pins,
+                trigger="interval",
+                seconds=SWEEP_INTERVAL,
+                id="pin_expiry_sweep",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+            )
+            print(f"🔁 [Scheduler] Pin expiry sweep every {SWEEP_INTERVAL}s")
+
+            # Chat archival: move old messages out of ChatMessage (off-peak)
+            scheduler.add_job(
+                archive_old_messages,
+                trigger="cron",
+                hour=3,
+                minute=30,
+                id="chat_archive",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+            )
+            print("🔁 [Scheduler] Chat archival set for 03:30 daily")
+
         except Exception as e:
             print(f"❌ [Scheduler] Failed to start: {e}")
 
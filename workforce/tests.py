@@ -1,3 +1,389 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import CustomUser, TeamMembership
+from guests.models import GuestEntry
+
+from . import link_previews, presence
+from .consumers import ChatConsumer, encoded_event, room_group
+from .flood_control import get_rate_limits
+from .mentions import get_mention_index
+from .models import ChatMessage, Team
+from .utils import serialize_message, serialize_messages
+
+
+class SerializeMessagesQueryTests(TestCase):
+    """serialize_messages() runs one query per page of chat history, whatever the page size."""
+
+    MESSAGES = 50
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.team = Team.objects.create(name="Query Check Team")
+        users = [
+            CustomUser.objects.create(username=f"query_check_{i}", full_name=f"Query Check {i}", title="Bro.")
+            for i in range(5)
+        ]
+        guests = [
+            GuestEntry.objects.create(full_name=f"Query Guest {i}", assigned_to=users[i], date_of_visit=timezone.localdate())
+            for i in range(5)
+        ]
+        previous = None
+        for i in range(cls.MESSAGES):
+            previous = ChatMessage.objects.create(
+                team=cls.team,
+                sender=users[i % 5],
+                message=f"Message {i} for @Bro. Query Check {(i + 1) % 5}",
+                guest_card=guests[i % 5] if i % 3 == 0 else None,
+                parent=previous if i % 2 else None,
+                file=f"chat_uploads/file_{i % 7}.pdf" if i % 4 == 0 else None,
+                pinned=i % 5 == 0,
+                pinned_by=users[0] if i % 5 == 0 else None,
+                pinned_at=timezone.now() if i % 5 == 0 else None,
+                link_url="https://example.com" if i % 6 == 0 else None,
+            )
+
+    def setUp(self):
+        get_mention_index()  # built once per process, not per page
+        self.history = ChatMessage.objects.filter(team=self.team).order_by('-created_at')
+
+    def test_one_query_per_page(self):
+        for size in (10, self.MESSAGES):
+            with self.subTest(size=size), self.assertNumQueries(1):
+                serialize_messages(self.history[:size])
+
+    def test_payloads_match_serialize_message(self):
+        legacy = [
+            serialize_message(m)
+            for m in self.history.select_related("sender", "guest_card", "parent__sender")
+        ]
+        self.assertEqual(serialize_messages(self.history), legacy)
+
+
+# ---------------------- Link previews ----------------------
+PAGE = b"""<html><head>
+<title>Fallback title</title>
+<meta property="og:title" content="Sunday Service">
+<meta property="og:description" content="Join us at 9am">
+<meta property="og:image" content="/static/cover.jpg">
+</head><body>Hello</body></html>"""
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Pages for the link preview tests; `hits` counts requests per path."""
+
+    hits = Counter()
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, body, content_type="text/html; charset=utf-8", status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        self.hits[path] += 1
+        if path == "/page":
+            time.sleep(0.2)  # long enough for concurrent requests to overlap
+            self.send_body(PAGE)
+        elif path == "/plain":
+            self.send_body(b"<html><body>No metadata here</body></html>")
+        elif path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/page")
+            self.end_headers()
+        elif path == "/slow":
+            time.sleep(2)
+            self.send_body(PAGE)
+        elif path == "/big":
+            self.send_body(PAGE.replace(b"Hello", b"x" * (20 * 1024 * 1024)))
+        elif path == "/late":
+            self.send_body(b"<html><body>" + b"x" * (1024 * 1024) + b"<title>Too late</title></body></html>")
+        elif path == "/pdf":
+            self.send_body(b"%PDF-1.4", content_type="application/pdf")
+        elif path == "/oembed":
+            self.send_body(json.dumps({"title": "Choir rehearsal"}).encode(), content_type="application/json")
+        elif path.startswith("/vi/"):
+            time.sleep(0.3)
+            self.send_body(b"jpg", content_type="image/jpeg", status=404 if "maxres" in path else 200)
+        else:
+            self.send_body(b"", status=404)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "link-preview-tests"}},
+    LINK_PREVIEW_ALLOW_PRIVATE_HOSTS=True,
+)
+class LinkPreviewTests(SimpleTestCase):
+    """The preview service (cache, de-duplication, limits) against a local stub HTTP server."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(server.server_close)
+        cls.addClassCleanup(server.shutdown)
+        cls.base = base = f"http://127.0.0.1:{server.server_port}"
+
+        patcher = mock.patch.multiple(
+            link_previews, FETCH_TIMEOUT=1, YOUTUBE_OEMBED=f"{base}/oembed", YOUTUBE_THUMBS=f"{base}/vi",
+        )
+        patcher.start()
+        cls.addClassCleanup(patcher.stop)
+
+    def setUp(self):
+        cache.clear()
+        StubHandler.hits.clear()
+
+    async def test_private_hosts_refused_by_default(self):
+        with self.settings(LINK_PREVIEW_ALLOW_PRIVATE_HOSTS=False):
+            self.assertIsNone(await link_previews.fetch_preview(f"{self.base}/page"))
+        self.assertEqual(StubHandler.hits["/page"], 0)
+
+    async def test_concurrent_requests_share_one_fetch(self):
+        results = await asyncio.gather(*(
+            link_previews.get_preview(f"{self.base}/page?utm_source=test") for _ in range(10)
+        ))
+        self.assertEqual(StubHandler.hits["/page"], 1)
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertEqual(results[0]["title"], "Sunday Service")
+        self.assertEqual(results[0]["description"], "Join us at 9am")
+        self.assertEqual(results[0]["image"], f"{self.base}/static/cover.jpg")
+
+        # Tracking parameters and fragments are not part of the cache key
+        variant = f"{self.base}/page?utm_medium=chat#top"
+        cached = await link_previews.get_preview(variant)
+        self.assertEqual(StubHandler.hits["/page"], 1)
+        self.assertEqual(cached["title"], "Sunday Service")
+        self.assertEqual(cached["url"], variant)
+
+    async def test_failures_are_cached(self):
+        self.assertIsNone(await link_previews.get_preview(f"{self.base}/plain"))
+        self.assertIsNone(await link_previews.get_preview(f"{self.base}/plain"))
+        self.assertEqual(StubHandler.hits["/plain"], 1)
+
+    async def test_non_html_ignored(self):
+        self.assertIsNone(await link_previews.get_preview(f"{self.base}/pdf"))
+
+    async def test_redirect_followed(self):
+        preview = await link_previews.get_preview(f"{self.base}/redirect")
+        self.assertEqual(preview["title"], "Sunday Service")
+
+    async def test_slow_host_abandoned(self):
+        started = time.perf_counter()
+        self.assertIsNone(await link_previews.get_preview(f"{self.base}/slow"))
+        self.assertLess(time.perf_counter() - started, 1.9)
+
+    async def test_read_is_capped(self):
+        big = await link_previews.get_preview(f"{self.base}/big")
+        self.assertEqual(big["title"], "Sunday Service")
+        self.assertIsNone(await link_previews.get_preview(f"{self.base}/late"))
+
+    async def test_waits_for_another_process_holding_the_lock(self):
+        url = f"{self.base}/page?other=worker"
+        key = link_previews._cache_key(link_previews.normalize_url(url))
+        await cache.aadd(key + ":lock", 1, 10)
+
+        async def other_worker():
+            await asyncio.sleep(0.5)
+            await cache.aset(key, {"url": url, "title": "From another worker", "description": "", "image": ""})
+
+        result, _ = await asyncio.gather(link_previews.get_preview(url), other_worker())
+        self.assertEqual(result["title"], "From another worker")
+        self.assertEqual(StubHandler.hits["/page"], 0)
+
+    async def test_youtube(self):
+        youtube = "https://youtu.be/abc123?si=share"
+        self.assertEqual(
+            link_previews.normalize_url(youtube),
+            link_previews.normalize_url("https://www.youtube.com/watch?v=abc123&t=10"),
+        )
+        started = time.perf_counter()
+        preview = await link_previews.get_preview(youtube)
+        elapsed = time.perf_counter() - started
+        self.assertEqual(preview["title"], "Choir rehearsal")
+        self.assertTrue(preview["image"].endswith("/abc123/sddefault.jpg"))
+        self.assertLess(elapsed, 1.0)  # the 0.3s thumbnail probes run in parallel
+
+
+# ---------------------- Chat sockets ----------------------
+chat_socket_settings = override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    CHAT_PRESENCE_BACKEND="workforce.presence.InMemoryPresence",
+    CHAT_RATE_LIMIT_BACKEND="workforce.flood_control.InMemoryRateLimits",
+)
+
+
+class ChatSocketTestCase(TransactionTestCase):
+    """Chat sockets on the in-memory channel layer, with fresh presence and rate limit stores per test."""
+
+    def setUp(self):
+        for backend in (presence.get_presence, get_rate_limits):
+            backend.cache_clear()
+            self.addCleanup(backend.cache_clear)
+
+    async def open_socket(self, user, path="/ws/chat/"):
+        comm = WebsocketCommunicator(ChatConsumer.as_asgi(), path)
+        comm.scope["user"] = user
+        connected, _ = await comm.connect()
+        self.assertTrue(connected)
+        return comm
+
+    async def frames(self, comm, kind, timeout=0.2):
+        """Frames of type `kind` the socket received, once nothing more arrives for `timeout`."""
+        frames = []
+        while not await comm.receive_nothing(timeout=timeout):
+            frame = json.loads((await comm.receive_output())["text"])
+            if frame.get("type") == kind:
+                frames.append(frame)
+        return frames
+
+
+@chat_socket_settings
+class ChatFanoutTests(ChatSocketTestCase):
+    """A team message is encoded once and reaches that team's sockets only, once each."""
+
+    def setUp(self):
+        super().setUp()
+        self.team, other_team = Team.objects.create(name="Choir"), Team.objects.create(name="Ushers")
+        self.sender, self.member, self.outsider = [
+            CustomUser.objects.create(username=name, full_name=name.title()) for name in ("sender", "member", "outsider")
+        ]
+        for user, team in ((self.sender, self.team), (self.member, self.team), (self.outsider, other_team)):
+            TeamMembership.objects.create(user=user, team=team)
+
+    async def test_team_message(self):
+        sender = await self.open_socket(self.sender, f"/ws/chat/?team={self.team.id}")
+        # In central view, still in the team room's group for its unread badge
+        member = await self.open_socket(self.member)
+        outsider = await self.open_socket(self.outsider)
+        anonymous = await self.open_socket(AnonymousUser())
+        for comm in (sender, member, outsider, anonymous):
+            await self.frames(comm, "pinned_preview")
+
+        with mock.patch("json.dumps", wraps=json.dumps) as dumps:
+            await sender.send_json_to({"message": "Rehearsal at 6", "sender_id": self.sender.id})
+            received = {
+                name: await self.frames(comm, "chat_message")
+                for name, comm in (("sender", sender), ("member", member), ("outsider", outsider), ("anonymous", anonymous))
+            }
+        encodes = [
+            call for call in dumps.call_args_list
+            if isinstance(call.args[0], dict) and call.args[0].get("type") == "chat_message"
+        ]
+        self.assertEqual(len(encodes), 1)
+
+        self.assertEqual({name: len(frames) for name, frames in received.items()},
+                         {"sender": 1, "member": 1, "outsider": 0, "anonymous": 0})
+        self.assertEqual(received["member"][0]["team_id"], self.team.id)
+        self.assertEqual(received["member"][0]["message"], "Rehearsal at 6")
+        for comm in (sender, member, outsider, anonymous):
+            await comm.disconnect()
+
+    async def test_subscribe_opens_followed_rooms_only(self):
+        outsider = await self.open_socket(self.outsider)
+        await self.frames(outsider, "pinned_preview")
+        await outsider.send_json_to({"type": "subscribe", "team_id": self.team.id})
+        self.assertEqual(
+            await self.frames(outsider, "subscribed"),
+            [{"type": "subscribed", "team_id": self.team.id, "ok": False}],
+        )
+        await outsider.disconnect()
+
+    async def test_group_send_is_not_reencoded(self):
+        member = await self.open_socket(self.member)
+        await self.frames(member, "pinned_preview")
+        event = encoded_event("chat_message", {"type": "chat_message", "id": 1, "team_id": self.team.id})
+        with mock.patch("json.dumps", wraps=json.dumps) as dumps:
+            await get_channel_layer().group_send(room_group(self.team.id), event)
+            frames = await self.frames(member, "chat_message")
+        dumps.assert_not_called()
+        self.assertEqual(len(frames), 1)
+        await member.disconnect()
+
+
+@chat_socket_settings
+@mock.patch.object(presence, "BROADCAST_WINDOW", 0.2)
+class ChatPresenceTests(ChatSocketTestCase):
+    """Tabs are reference-counted, presence changes are coalesced and the flush is batched."""
+
+    async def presence_events(self, observer):
+        await asyncio.sleep(presence.BROADCAST_WINDOW + 0.1)
+        return await self.frames(observer, "presence", timeout=0.05)
+
+    async def test_tabs(self):
+        user = await CustomUser.objects.acreate(username="tabs", full_name="Tabs")
+        backend = presence.get_presence()
+        observer = await self.open_socket(AnonymousUser())
+
+        tabs = [await self.open_socket(user) for _ in range(3)]
+        events = await self.presence_events(observer)
+        self.assertEqual([event["online"] for event in events], [[user.id]])
+
+        for tab in tabs[:2]:
+            await tab.disconnect()
+        self.assertEqual(await self.presence_events(observer), [])
+        self.assertIn(user.id, backend.online_user_ids())
+
+        for _ in range(5):
+            await tabs[2].disconnect()
+            tabs[2] = await self.open_socket(user)
+        events = await self.presence_events(observer)
+        self.assertLessEqual(len(events), 1)
+        self.assertTrue(all(event["online"] == [user.id] for event in events))
+
+        await tabs[2].disconnect()
+        events = await self.presence_events(observer)
+        self.assertEqual([event["offline"] for event in events], [[user.id]])
+        self.assertNotIn(user.id, backend.online_user_ids())
+        await observer.disconnect()
+
+    async def test_store_outage_does_not_refuse_the_socket(self):
+        user = await CustomUser.objects.acreate(username="outage", full_name="Outage")
+        backend = presence.get_presence()
+        with mock.patch.object(backend, "connect", side_effect=ConnectionError), \
+                mock.patch.object(backend, "disconnect", side_effect=ConnectionError), \
+                self.assertLogs("workforce.consumers", "ERROR") as logs:
+            comm = await self.open_socket(user)
+            self.assertEqual(len(await self.frames(comm, "pinned_preview")), 1)
+            await comm.disconnect()
+        self.assertEqual(len(logs.records), 2)
+
+    def test_flush(self):
+        users = [CustomUser.objects.create(username=f"flush_{i}", full_name=f"Flush {i}") for i in range(20)]
+        backend = presence.get_presence()
+        for user in users:
+            async_to_sync(backend.connect)(user.id, f"test-{user.id}")
+
+        # One UPDATE for last_active, one each for going offline and coming online
+        with self.assertNumQueries(3):
+            result = presence.flush_presence()
+        self.assertEqual(result["seen"], len(users))
+        self.assertEqual(CustomUser.objects.filter(is_online=True).count(), len(users))
+        self.assertFalse(CustomUser.objects.filter(last_active__isnull=True).exists())
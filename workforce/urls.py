@@ -6,6 +6,12 @@ app_name = 'workforce'
 urlpatterns = [
     path("", views.chat_room, name="chat_room"),
     path("chat/load/", views.load_more_messages, name="load_more_messages"),
+    path("chat/bootstrap/roster/", views.chat_roster, name="chat_roster"),
+    path("chat/bootstrap/users/", views.chat_users, name="chat_users"),
+    path("chat/bootstrap/guests/", views.chat_guests, name="chat_guests"),
+    path("chat/bootstrap/presence/", views.chat_presence, name="chat_presence"),
+    path("chat/rooms/", views.chat_rooms, name="chat_rooms"),
+    path("chat/search/", views.chat_search_messages, name="chat_search"),
     path("fetch_link_preview/", views.fetch_link_preview, name="fetch_link_preview"),
     path("upload_file/", views.upload_file, name="upload_file"),
     path("attendance/", views.mark_attendance, name="mark_attendance"),
@@ -1,14 +1,16 @@
+from functools import lru_cache
 from django.contrib.auth.models import Group
 import requests, mimetypes, os, re, urllib.parse, urllib
 from bs4 import BeautifulSoup
 from accounts.models import CustomUser
 from guests.models import GuestEntry
 from .consumers import get_user_color, handle_file_upload
+from .mentions import get_mention_index
 from django.db.models.fields.files import FieldFile
 from django.core.files.storage import default_storage
 from django.utils import timezone
 from .models import Event, AttendanceRecord, PersonalReminder, UserActivity, CHURCH_COORDS, ChatMessage
-from django.db.models import Q
+from django.db.models import Q, QuerySet
 from django.conf import settings
 from geopy.distance import distance
 from django.core.exceptions import ValidationError
@@ -16,236 +18,116 @@ from cloudinary.utils import cloudinary_url
 
 
 
-import requests
-from urllib.parse import urlparse
-from bs4 import BeautifulSoup
-
-YOUTUBE_OEMBED = "https://www.youtube.com/oembed?format=json&url="
-
-def is_youtube(url):
-    host = urlparse(url).netloc.lower()
-    return "youtube.com" in host or "youtu.be" in host
-
-def extract_youtube_id(url):
-    try:
-        u = urlparse(url)
-        path = u.path
+def cloudinary_url(public_id, resource_type):
+    cloud = settings.CLOUDINARY_STORAGE["CLOUD_NAME"]
+    rtype = "video" if resource_type.startswith("video") else "image"
 
-        # youtu.be/<id>
-        if "youtu.be" in u.netloc:
-            return path.lstrip("/")
+    return f"https://res.cloudinary.com/{cloud}/{rtype}/upload/{public_id}"
 
-        # /watch?v=<id>
-        qs = urllib.parse.parse_qs(u.query)
-        if "v" in qs:
-            return qs.get("v", [None])[0]
 
-        # /shorts/<id>
-        if path.startswith("/shorts/"):
-            return path.split("/")[2]
 
-        # /embed/<id>
-        if path.startswith("/embed/"):
-            return path.split("/")[2]
+# Every relation serialize_message reads, fetched in the message query itself
+MESSAGE_RELATED = ("sender", "guest_card__assigned_to", "parent__sender", "parent__guest_card", "pinned_by")
 
-        # /live/<id>
-        if path.startswith("/live/"):
-            return path.split("/")[2]
 
-        return None
-    except:
-        return None
+@lru_cache(maxsize=2048)
+def _resolve_file(file_path, stored_name, stored_type):
+    """(url, name, mime) for a stored chat file; cached because the same files are serialized over and over."""
+    file_path = file_path.lstrip("/")
 
-def get_best_youtube_thumb(video_id):
-    base = f"https://i.ytimg.com/vi/{video_id}"
-    candidates = [
-        "maxresdefault.jpg",
-        "sddefault.jpg",
-        "hqdefault.jpg",
-        "mqdefault.jpg",
-        "default.jpg",
-    ]
+    # File name stored in DB (fallback = last part of the path)
+    file_name = stored_name or urllib.parse.unquote(os.path.basename(file_path))
 
-    headers = {"User-Agent": "Mozilla/5.0"}
+    # Determine MIME from stored name
+    guessed_mime, _ = mimetypes.guess_type(file_name)
+    mime = guessed_mime or stored_type or "application/octet-stream"
 
-    for file in candidates:
-        url = f"{base}/{file}"
+    # Determine URL
+    if file_path.startswith("http"):
+        file_url = file_path
 
-        try:
-            r = requests.head(url, timeout=3, headers=headers)
-            if r.status_code == 200:
-                return url
-        except:
-            pass
-
-    # Absolute fallback
-    return f"{base}/default.jpg"
-
-def get_link_preview(url):
-    """Unified YouTube + OG preview for WebSockets."""
-    headers = {"User-Agent": "Mozilla/5.0"}
-
-    # ---------- YOUTUBE SPECIAL HANDLING ----------
-    if is_youtube(url):
-        vid = extract_youtube_id(url)
-        if vid:
-            meta_title = ""
-            try:
-                r = requests.get(
-                    f"https://www.youtube.com/oembed?format=json&url=https://www.youtube.com/watch?v={vid}",
-                    headers=headers,
-                    timeout=5,
-                )
-                if r.status_code == 200:
-                    meta_title = r.json().get("title", "")
-            except:
-                pass
-
-            return {
-                "url": url,
-                "title": meta_title or "YouTube Video",
-                "description": "",
-                "image": get_best_youtube_thumb(vid),
-                "provider": "youtube",
-            }
-
-    # ---------- NORMAL OG WEBSITE PREVIEW ----------
-    try:
-        resp = requests.get(url, headers=headers, timeout=5)
-        resp.raise_for_status()
+    elif settings.DEBUG:
+        # Local media
+        if not file_path.startswith("media/"):
+            file_url = f"/media/{file_path}"
+        else:
+            file_url = f"/{file_path}"
 
-        soup = BeautifulSoup(resp.text, "html.parser")
+    else:
+        # Cloudinary
+        resource_type = "video" if mime.startswith("video") else "image"
+        cloud = settings.CLOUDINARY_STORAGE["CLOUD_NAME"]
+        file_url = f"https://res.cloudinary.com/{cloud}/{resource_type}/upload/{file_path}"
 
-        title_tag = soup.find("meta", property="og:title") or soup.find("title")
-        desc_tag = soup.find("meta", property="og:description") or soup.find("meta", attrs={"name": "description"})
-        image_tag = soup.find("meta", property="og:image")
+    return file_url, file_name, mime
 
-        title = (
-            title_tag["content"]
-            if title_tag and title_tag.has_attr("content")
-            else (title_tag.string if title_tag else "")
-        )
 
-        return {
-            "url": url,
-            "title": title,
-            "description": desc_tag["content"] if desc_tag and desc_tag.has_attr("content") else "",
-            "image": image_tag["content"] if image_tag and image_tag.has_attr("content") else "",
-        }
+def build_file_payload(file_obj, message):
+    """Return a safe, correct, fully self-contained file payload."""
+    if not file_obj:
+        return None
 
-    except:
+    try:
+        file_url, file_name, mime = _resolve_file(str(file_obj), message.file_name, message.file_type)
         return {
-            "url": url,
-            "title": url,
-            "description": "",
-            "image": "",
+            "id": message.id,
+            "url": file_url,
+            "name": file_name,
+            "size": None,
+            "type": mime,
         }
 
+    except Exception as e:
+        import logging
+        logging.warning("build_file_payload error: %s", e)
+        return None
 
 
-def build_mention_helpers():
-    """Precompute mention_map + regex for mentions."""
-    users = list(CustomUser.objects.all())
-    mention_map = {}
-    for u in users:
-        display = f"@{ (u.title + ' ') if getattr(u, 'title', None) else '' }{ (u.full_name or u.username) }".strip()
-        mention_map[display] = u
-    regex = re.compile(r"(" + "|".join(map(re.escape, mention_map.keys())) + r")") if mention_map else None
-    return mention_map, regex
+def _image_url(owner, field, urls):
+    """Picture URL of a user/guest, built once per object per batch."""
+    key = (type(owner).__name__, owner.pk)
+    if key not in urls:
+        image = getattr(owner, field)
+        urls[key] = image.url if image else None
+    return urls[key]
 
-def cloudinary_url(public_id, resource_type):
-    cloud = settings.CLOUDINARY_STORAGE["CLOUD_NAME"]
-    rtype = "video" if resource_type.startswith("video") else "image"
-
-    return f"https://res.cloudinary.com/{cloud}/{rtype}/upload/{public_id}"
 
+def _link_payload(m):
+    if not m.link_url:
+        return None
+    return {
+        "url": m.link_url,
+        "title": m.link_title,
+        "description": m.link_description,
+        "image": m.link_image,
+    }
 
 
-def serialize_message(m, mention_map=None, mention_regex=None):
-    """Unified serializer for both WebSocket + Views."""
+def _serialize(m, mentions, urls):
     # Mentions
     mentions_payload = []
-    if mention_regex and m.message:
-        found = set(mention_regex.findall(m.message))
-        for token in found:
-            u = mention_map.get(token)
-            if u:
-                mentions_payload.append({
-                    "id": u.id,
-                    "username": u.username,
-                    "title": getattr(u, "title", ""),
-                    "name": u.full_name or u.username,
-                    "color": get_user_color(u.id),
-                })
+    if m.message and "@" in m.message:
+        mentions_payload = mentions.payload(m.message)
 
     # --- Guest
     guest_payload = None
-    if m.guest_card:
-        g = GuestEntry.objects.select_related("assigned_to").get(id=m.guest_card.id)
+    g = m.guest_card
+    if g:
         guest_payload = {
             "id": g.id,
             "name": g.full_name,
             "custom_id": g.custom_id,
-            "image": g.picture.url if g.picture else None,
+            "image": _image_url(g, "picture", urls),
             "title": g.title,
             "date_of_visit": g.date_of_visit.strftime("%Y-%m-%d") if g.date_of_visit else "",
             "assigned_user": {
                 "id": g.assigned_to.id,
                 "title": g.assigned_to.title,
                 "full_name": g.assigned_to.full_name,
-                "image": g.assigned_to.image.url if g.assigned_to.image else None,
+                "image": _image_url(g.assigned_to, "image", urls),
             } if g.assigned_to else None
         }
 
-    # --- Helper to resolve file URLs
-    def build_file_payload(file_obj, message):
-        """Return a safe, correct, fully self-contained file payload."""
-        if not file_obj:
-            return None
-
-        try:
-            file_path = str(file_obj).lstrip("/")
-
-            # File name stored in DB (fallback = last part of the path)
-            file_name = (
-                message.file_name or 
-                urllib.parse.unquote(os.path.basename(file_path))
-            )
-
-            # Determine MIME from stored name
-            guessed_mime, _ = mimetypes.guess_type(file_name)
-            mime = guessed_mime or message.file_type or "application/octet-stream"
-
-            # Determine URL
-            if file_path.startswith("http"):
-                file_url = file_path
-
-            elif settings.DEBUG:
-                # Local media
-                if not file_path.startswith("media/"):
-                    file_url = f"/media/{file_path}"
-                else:
-                    file_url = f"/{file_path}"
-
-            else:
-                # Cloudinary
-                resource_type = "video" if mime.startswith("video") else "image"
-                cloud = settings.CLOUDINARY_STORAGE["CLOUD_NAME"]
-                file_url = f"https://res.cloudinary.com/{cloud}/{resource_type}/upload/{file_path}"
-
-            return {
-                "id": message.id,
-                "url": file_url,
-                "name": file_name,
-                "size": None,
-                "type": mime,
-            }
-
-        except Exception as e:
-            import logging
-            logging.warning("build_file_payload error: %s", e)
-            return None
-
     # --- Parent (reply-to)
     parent_payload = None
     if m.parent:
@@ -261,29 +143,11 @@ def serialize_message(m, mention_map=None, mention_regex=None):
                 "id": parent.guest_card.id,
                 "name": parent.guest_card.full_name,
                 "title": parent.guest_card.title,
-                "image": parent.guest_card.picture.url if parent.guest_card.picture else None,
+                "image": _image_url(parent.guest_card, "picture", urls),
                 "date_of_visit": parent.guest_card.date_of_visit.strftime("%Y-%m-%d") if parent.guest_card.date_of_visit else "",
             } if parent.guest_card else None,
             "file": build_file_payload(parent.file, parent),
-            "link_preview": {
-                "url": parent.link_url,
-                "title": parent.link_title,
-                "description": parent.link_description,
-                "image": parent.link_image,
-            } if parent.link_url else None,
-        }
-
-    # --- File payload (main message)
-    file_payload = build_file_payload(m.file, m)
-
-    # --- Link preview
-    link_payload = None
-    if m.link_url:
-        link_payload = {
-            "url": m.link_url,
-            "title": m.link_title,
-            "description": m.link_description,
-            "image": m.link_image,
+            "link_preview": _link_payload(parent),
         }
 
     # --- Pinned info
@@ -302,14 +166,14 @@ def serialize_message(m, mention_map=None, mention_regex=None):
         "sender_id": m.sender.id,
         "sender_title": getattr(m.sender, "title", ""),
         "sender_name": m.sender.full_name or m.sender.username,
-        "sender_image": m.sender.image.url if m.sender.image else None,
+        "sender_image": _image_url(m.sender, "image", urls),
         "color": get_user_color(m.sender.id),
         "created_at": m.created_at.isoformat(),
         "guest": guest_payload,
-        "reply_to_id": m.parent.id if m.parent else None,
+        "reply_to_id": m.parent_id,
         "parent": parent_payload,
-        "file": file_payload,
-        "link_preview": link_payload,
+        "file": build_file_payload(m.file, m),
+        "link_preview": _link_payload(m),
         "mentions": mentions_payload,
         "pinned": getattr(m, "pinned", False),
         "pinned_at": m.pinned_at.isoformat() if getattr(m, "pinned_at", None) else None,
@@ -317,6 +181,24 @@ def serialize_message(m, mention_map=None, mention_regex=None):
     }
 
 
+def serialize_messages(messages, mentions=None):
+    """
+    Serialize a page of messages with a fixed number of queries: a queryset
+    is fetched with MESSAGE_RELATED joined in, and picture URLs are built
+    once per user/guest. Payloads match serialize_message().
+    """
+    if isinstance(messages, QuerySet):
+        messages = messages.select_related(*MESSAGE_RELATED)
+    mentions = mentions or get_mention_index()
+    urls = {}
+    return [_serialize(m, mentions, urls) for m in messages]
+
+
+def serialize_message(m, mentions=None):
+    """Unified serializer for both WebSocket + Views. `mentions`: a MentionIndex (default: the process-wide one)."""
+    return _serialize(m, mentions or get_mention_index(), {})
+
+
 
 
 def generate_daily_attendance():
@@ -48,11 +48,13 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse
-from .utils import serialize_message, build_mention_helpers, expand_team_events, get_available_events_for_user, get_visible_attendance_records, get_visible_clock_records
+from .utils import expand_team_events, get_available_events_for_user, get_visible_attendance_records, get_visible_clock_records
 from django.core.files.storage import default_storage
 import urllib.parse
 from django.conf import settings
 from django.db.models import Prefetch
+from . import chat_data, chat_history, chat_search, link_previews, room_summaries
+from .chat_data import visible_teams
 
 
 @login_required
@@ -60,217 +62,51 @@ def chat_room(request):
     """
     Central chatroom page. Query param `team_id` selects a room.
     If no team_id -> central room (everyone). Magnet remains special for guest actions.
+
+    Renders the shell only: the roster, user directory, guest assignments and
+    presence are fetched in parallel by the page (see chat_data), and the
+    first page of messages comes from load_more_messages.
     """
     user = request.user
-    # Query all active teams with enriched members
-    teams = list(
-        Team.objects.filter(is_active=True)
-        .prefetch_related(
-            Prefetch("members", queryset=CustomUser.objects.prefetch_related("sent_chats"))
-        )
-        .order_by("name")
-    )
-
-    # ✅ Superuser: see all teams, no auto-membership creation
-    if user.is_superuser:
-        pass
-
-    # ✅ Pastors/Admins: see all teams but don’t persist "Pastor,Admin" roles
-    elif is_project_admin(user) and not user.is_superuser:
-        pass  # they see all, but no membership auto-creation
-
-    # ✅ Regular users: show only their assigned teams
-    else:
-        teams = [team for team in teams if user_in_team(user, team.name)]
-
+    # Superusers and Pastors/Admins see all teams, regular users only their own
+    teams = visible_teams(user)
 
     # selected team (team_id in GET), default = None meaning central
     team_id = request.GET.get("team_id")
     guest_id = request.GET.get("guest_id")
 
-    # Always get magnet team (used below)
-    magnet_team = Team.objects.filter(name__iexact="magnet").first()
+    teams_by_id = {team.id: team for team in teams}
+    magnet_team = next((team for team in teams if team.name.lower() == "magnet"), None)
+    if magnet_team is None:
+        magnet_team = Team.objects.filter(name__iexact="magnet").first()
 
     # If guest_id exists but no team_id, force Magnet chat
     if guest_id and not team_id and magnet_team:
         team_id = magnet_team.id
 
-    selected_team = Team.objects.filter(id=team_id, is_active=True).first() if team_id else None
-
-    # Assign team color + enriched users
-    for team in teams:
-        team.enriched_users = []
-
-        for user in team.users.all().exclude(is_superuser=True):
-            initials = "".join([p[0].upper() for p in (user.full_name or user.username).split()[:2]])
-            image_url = user.image.url if getattr(user, "image", None) else None
-            last_msg_obj = (
-                user.sent_chats.filter(team=team).order_by("-created_at").first()
-            )
-            last_msg = last_msg_obj.message if last_msg_obj else "No messages yet"
-
-            team.enriched_users.append({
-                "id": user.id,
-                "full_name": user.full_name,
-                "username": user.username,
-                "title": user.title,
-                "phone_number": user.phone_number,
-                "color": get_user_color(user.id),
-                "initials": initials,
-                "image": image_url,
-                "last_message": last_msg,
-            })
-
-        # Sort team users: Project-level Pastor/Admin first, then alphabetically
-        team.enriched_users.sort(
-            key=lambda u: (
-                not is_project_level_role(CustomUser.objects.get(id=u["id"])),
-                u["full_name"].lower()
-            )
-        )
-
-    # Prebuild mention helpers (map + regex)
-    mention_map, mention_regex = build_mention_helpers()
-
-    # choose messages:
-    if selected_team:
-        last_messages_qs = ChatMessage.objects.filter(team=selected_team)
-    else:
-        last_messages_qs = ChatMessage.objects.filter(team__isnull=True) | ChatMessage.objects.filter(team=selected_team)
-
-    last_messages = last_messages_qs.select_related("sender", "guest_card", "parent__sender").order_by("-created_at")[:50]
-    last_messages_payload = [serialize_message(m, mention_map, mention_regex) for m in reversed(last_messages)]
+    selected_team = None
+    if team_id and str(team_id).isdigit():
+        selected_team = teams_by_id.get(int(team_id)) or Team.objects.filter(id=team_id, is_active=True).first()
 
-    # guests: only useful if Magnet is selected OR user is on Magnet team
     attached_guest = None
     if guest_id:
         attached_guest = GuestEntry.objects.filter(id=guest_id).first()
 
-    # Get all non-superusers
-    users = CustomUser.objects.filter(is_superuser=False).prefetch_related('assigned_guests')
-
-    # Sort users globally with same Pastor/Admin priority
-    users = sorted(
-        users,
-        key=lambda u: (
-            not is_project_level_role(u),
-            (u.full_name or u.username).lower()
-        )
-    )
-
-    # Fetch guests the user is allowed to see
-    guest_queryset = get_guest_queryset(request.user, selected_team)
-
-    user_guests = [
-        {
-            "id": u.id,
-            "name": u.full_name or u.username,
-            "role": get_combined_role(u, selected_team),
-            "team_name": selected_team.name if selected_team else "",
-            "guests": [
-                {
-                    "id": g.id,
-                    "name": g.full_name,
-                    "custom_id": g.custom_id,
-                    "image": g.picture.url if g.picture else None,
-                    "title": g.title,
-                    "date_of_visit": g.date_of_visit.strftime("%Y-%m-%d") if g.date_of_visit else "",
-                    "assigned": True
-                } for g in u.assigned_guests.all()
-            ]
-        } for u in users
-    ]
-
-    # Unassigned guests: visible to project-level privileged users OR Magnet team admins (MIC/Team Admin)
-    unassigned_guests = []
-    # Project-level privileged?
-    if is_magnet_admin(request.user):
-        unassigned_qs = GuestEntry.objects.filter(assigned_to__isnull=True)
-        unassigned_guests = [
-            {
-                "id": g.id,
-                "name": g.full_name,
-                "custom_id": g.custom_id,
-                "image": g.picture.url if g.picture else None,
-                "title": g.title,
-                "date_of_visit": g.date_of_visit.strftime("%Y-%m-%d") if g.date_of_visit else "",
-                "assigned": False
-            } for g in unassigned_qs
-        ]
-
+    team_param = f"team_id={selected_team.id}&" if selected_team else ""
+    data_versions = chat_data.versions()
     context = {
         "teams": teams,
-        "team.enriched_users": team.enriched_users,
         "selected_team": selected_team,
         "selected_team_id": selected_team.id if selected_team else None,
         "magnet_team": magnet_team,
         "magnet_team_id": magnet_team.id if magnet_team else None,
-        "users": [
-            {
-                "id": u.id,
-                "full_name": u.full_name,
-                "username": u.username,
-                "title": u.title,
-                "initials": u.initials,
-                "phone_number": u.phone_number,
-                "image": u.image.url if u.image else None,
-                "last_message": u.sent_chats.first().message if u.sent_chats.exists() else "No messages yet",
-                "role": get_combined_role(u, selected_team),
-                "color": get_user_color(u.id),
-                "team_name": selected_team.name if selected_team else "",
-                "guests": [
-                    {
-                        "id": g.id,
-                        "name": g.full_name,
-                        "custom_id": g.custom_id,
-                        "image": g.picture.url if g.picture else None,
-                        "title": g.title,
-                        "date_of_visit": g.date_of_visit.strftime("%Y-%m-%d") if g.date_of_visit else "",
-                        "assigned_user": {
-                            "id": g.assigned_to.id,
-                            "title": g.assigned_to.title,
-                            "full_name": g.assigned_to.full_name,
-                            "image": g.assigned_to.image.url if g.assigned_to.image else None,
-                        } if g.assigned_to else None
-                    } for g in u.assigned_guests.all()
-                ]
-            } for u in users
-        ],
-        "users_json": json.dumps([  # keep JSON version of users
-            {
-                "id": u.id,
-                "full_name": u.full_name,
-                "username": u.username,
-                "title": u.title,
-                "initials": u.initials,
-                "phone_number": u.phone_number,
-                "image": u.image.url if u.image else None,
-                "last_message": u.sent_chats.first().message if u.sent_chats.exists() else "No messages yet",
-                "role": get_combined_role(u, selected_team),
-                "color": get_user_color(u.id),
-                "team_name": selected_team.name if selected_team else "",
-                "is_online": u.is_online,
-                "guests": [
-                    {
-                        "id": g.id,
-                        "name": g.full_name,
-                        "custom_id": g.custom_id,
-                        "image": g.picture.url if g.picture else None,
-                        "title": g.title,
-                        "date_of_visit": g.date_of_visit.strftime("%Y-%m-%d") if g.date_of_visit else "",
-                        "assigned_user": {
-                            "id": g.assigned_to.id,
-                            "title": g.assigned_to.title,
-                            "full_name": g.assigned_to.full_name,
-                            "image": g.assigned_to.image.url if g.assigned_to.image else None,
-                        } if g.assigned_to else None
-                    } for g in u.assigned_guests.all()
-                ]
-            } for u in users
-        ], cls=DjangoJSONEncoder),
-        "user_guests_json": json.dumps(user_guests, cls=DjangoJSONEncoder),
-        "unassigned_guests_json": json.dumps(unassigned_guests, cls=DjangoJSONEncoder),
-        "last_messages_json": json.dumps(last_messages_payload, cls=DjangoJSONEncoder),
+        "bootstrap_urls": {
+            "roster": f"{reverse('workforce:chat_roster')}?v={data_versions['people']}",
+            "users": f"{reverse('workforce:chat_users')}?{team_param}v={data_versions['people']}",
+            "guests": f"{reverse('workforce:chat_guests')}?{team_param}v={data_versions['guests']}.{data_versions['people']}",
+            "presence": reverse('workforce:chat_presence'),
+            "rooms": reverse('workforce:chat_rooms'),
+        },
         "current_user_id": request.user.id,
         "current_user_role": get_combined_role(request.user, selected_team),
         "attached_guest": {
@@ -297,40 +133,142 @@ def chat_room(request):
     return render(request, "workforce/chat_room.html", context)
 
 
-@login_required
-def load_more_messages(request):
-    """AJAX endpoint to fetch older messages before a given timestamp, scoped by team."""
-    before = request.GET.get("before")  # ISO timestamp string
-    limit = int(request.GET.get("limit", 50))
+# ---------------------- Chat bootstrap data ----------------------
+BOOTSTRAP_MAX_AGE = 60 * 60
+
+
+def _requested_team(request):
     team_id = request.GET.get("team_id")
+    if not team_id or not team_id.isdigit():
+        return None
+    return Team.objects.filter(id=team_id, is_active=True).first()
 
-    qs = ChatMessage.objects.select_related("sender", "guest_card", "parent__sender")
 
-    # 🔹 Filter by team (central or specific)
-    if team_id:
-        # fetch specific team
-        qs = qs.filter(team_id=team_id)
+def _bootstrap_response(request, payload, current_version):
+    """JSON response the browser may cache when the URL carries the current data version."""
+    response = JsonResponse(payload)
+    if request.GET.get("v") == str(current_version):
+        response["Cache-Control"] = f"private, max-age={BOOTSTRAP_MAX_AGE}"
     else:
-        # central chat has team = NULL
-        qs = qs.filter(team__isnull=True)
+        response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@login_required
+def chat_roster(request):
+    """Members of each team visible to the user, for the sidebar."""
+    roster = chat_data.roster()
+    teams = {str(team.id): roster.get(team.id, []) for team in chat_data.visible_teams(request.user)}
+    return _bootstrap_response(request, {"teams": teams}, chat_data.versions()["people"])
+
+
+@login_required
+def chat_users(request):
+    """User directory (mentions, DMs, profiles) with roles for the selected team."""
+    users = chat_data.people(_requested_team(request))
+    return _bootstrap_response(request, {"users": users}, chat_data.versions()["people"])
+
+
+@login_required
+def chat_presence(request):
+    """Ids of online users; changes constantly, so it is kept out of the cached payloads."""
+    response = JsonResponse({"online": sorted(chat_data.online_user_ids())})
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@login_required
+def chat_rooms(request):
+    """Recent conversations: central and the user's team rooms, latest activity first."""
+    team_ids = [team.id for team in chat_data.visible_teams(request.user)]
+    response = JsonResponse({"rooms": room_summaries.recent_rooms(team_ids)})
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@login_required
+def chat_guests(request):
+    """Guests by assignee, plus unassigned guests for Magnet admins."""
+    data_versions = chat_data.versions()
+    return _bootstrap_response(
+        request,
+        chat_data.guest_payload(request.user, _requested_team(request)),
+        f"{data_versions['guests']}.{data_versions['people']}",
+    )
 
-    # 🔹 Only older messages than `before`
-    if before:
-        before_dt = parse_datetime(before)
+
+@login_required
+def load_more_messages(request):
+    """
+    AJAX endpoint for a page of a room's history, oldest first (see chat_history).
+    `cursor` is the previous page's next_cursor; next_cursor is null at the start of the room.
+    With `direction=newer` the page follows `cursor` instead (newer_cursor is null
+    at the latest message), and `around=<message id>` opens the room at that message.
+    Team rooms are limited to the ones the user can open, as in chat_search_messages.
+    """
+    team_id = request.GET.get("team_id")
+    if team_id and not team_id.isdigit():
+        return JsonResponse({"error": "Invalid team_id"}, status=400)
+    team_id = int(team_id) if team_id else None
+    if team_id and team_id not in chat_data.followable_team_ids(request.user):
+        return JsonResponse({"error": "Room not found"}, status=404)
+    limit = chat_history.page_size(request.GET.get("limit", chat_history.DEFAULT_PAGE))
+
+    around = request.GET.get("around")
+    if around:
+        page = chat_history.history_around(team_id, int(around), max(1, limit // 2)) if around.isdigit() else None
+        if page is None:
+            return JsonResponse({"error": "Message not found"}, status=404)
+        return JsonResponse(page)
+
+    cursor = None
+    if request.GET.get("cursor"):
+        cursor = chat_history.decode_cursor(request.GET["cursor"])
+        if cursor is None:
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
+    elif request.GET.get("before"):
+        # Older clients send the oldest timestamp they have
+        before_dt = parse_datetime(request.GET["before"])
         if before_dt:
-            qs = qs.filter(created_at__lt=before_dt)
+            cursor = (before_dt, 0)
 
-    # 🔹 Prebuild mention helpers
-    mention_map, mention_regex = build_mention_helpers()
+    if request.GET.get("direction") == "newer":
+        if cursor is None:
+            return JsonResponse({"error": "direction=newer needs a cursor"}, status=400)
+        return JsonResponse(chat_history.newer_page(team_id, cursor, limit))
+    return JsonResponse(chat_history.history_page(team_id, cursor, limit))
 
-    # 🔹 Fetch newest first, then reverse to chronological order
-    messages = list(qs.order_by("-created_at")[:limit])
-    messages.reverse()
 
-    payload = [serialize_message(m, mention_map, mention_regex) for m in messages]
+@login_required
+def chat_search_messages(request):
+    """
+    Full-text search of the rooms the user can open (see chat_search), or of
+    one of them with `team_id` ("central" for the central room). Newest hits
+    first; `cursor` is the previous page's next_cursor.
+    """
+    allowed = chat_data.followable_team_ids(request.user)
+    team_id = request.GET.get("team_id")
+    if team_id == "central":
+        team_ids, include_central = [], True
+    elif team_id:
+        if not team_id.isdigit() or int(team_id) not in allowed:
+            return JsonResponse({"error": "Room not found"}, status=404)
+        team_ids, include_central = [int(team_id)], False
+    else:
+        team_ids, include_central = sorted(allowed), True
 
-    return JsonResponse({"messages": payload})
+    cursor = None
+    if request.GET.get("cursor"):
+        cursor = chat_history.decode_cursor(request.GET["cursor"])
+        if cursor is None:
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
 
+    response = JsonResponse(chat_search.search_messages(
+        request.GET.get("q", ""), team_ids, include_central, cursor,
+        chat_history.page_size(request.GET.get("limit"), chat_search.DEFAULT_PAGE, chat_search.MAX_PAGE),
+    ))
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
 
 @csrf_exempt
@@ -389,139 +327,23 @@ def upload_file(request):
 
 
 
-import requests
-from urllib.parse import urlparse
-
-YOUTUBE_OEMBED = "https://www.youtube.com/oembed?format=json&url="
-
-def is_youtube(url):
-    host = urlparse(url).netloc.lower()
-    return "youtube.com" in host or "youtu.be" in host
-
-def extract_youtube_id(url):
-    try:
-        u = urlparse(url)
-        path = u.path
-
-        # youtu.be/<id>
-        if "youtu.be" in u.netloc:
-            return path.lstrip("/")
-
-        # /watch?v=<id>
-        qs = urllib.parse.parse_qs(u.query)
-        if "v" in qs:
-            return qs.get("v", [None])[0]
-
-        # /shorts/<id>
-        if path.startswith("/shorts/"):
-            return path.split("/")[2]
-
-        # /embed/<id>
-        if path.startswith("/embed/"):
-            return path.split("/")[2]
-
-        # /live/<id>
-        if path.startswith("/live/"):
-            return path.split("/")[2]
-
-        return None
-    except:
-        return None
-
-def get_best_youtube_thumb(video_id):
-    base = f"https://i.ytimg.com/vi/{video_id}"
-    candidates = [
-        "maxresdefault.jpg",
-        "sddefault.jpg",
-        "hqdefault.jpg",
-        "mqdefault.jpg",
-        "default.jpg",
-    ]
-
-    headers = {"User-Agent": "Mozilla/5.0"}
-
-    for file in candidates:
-        url = f"{base}/{file}"
-
-        try:
-            r = requests.head(url, timeout=3, headers=headers)
-            if r.status_code == 200:
-                return url
-        except:
-            pass
-
-    # Absolute fallback
-    return f"{base}/default.jpg"
-
 @csrf_exempt
-def fetch_link_preview(request):
+@login_required
+async def fetch_link_preview(request):
     url = request.GET.get("url")
     if not url:
         return JsonResponse({"error": "Missing URL"}, status=400)
 
-    # --- YOUTUBE SPECIAL HANDLER FIRST ---
-    if is_youtube(url):
-        vid = extract_youtube_id(url)
-        if vid:
-            # Try oEmbed only for the title
-            meta_title = ""
-            try:
-                r = requests.get(
-                    f"https://www.youtube.com/oembed?format=json&url=https://www.youtube.com/watch?v={vid}",
-                    headers={"User-Agent": "Mozilla/5.0"},
-                    timeout=5
-                )
-                if r.status_code == 200:
-                    meta_title = r.json().get("title", "")
-            except:
-                pass
-
-            return JsonResponse({
-                "url": url,
-                "title": meta_title or "YouTube Video",
-                "description": "",
-                "image": get_best_youtube_thumb(vid),  # 👈 upgraded thumbnail
-                "provider": "youtube"
-            })
-
-    # --- NORMAL OG SCRAPER FALLBACK ---
-    try:
-        r = requests.get(url, timeout=5, headers={"User-Agent": "Mozilla/5.0"})
-        r.raise_for_status()
-
-        soup = BeautifulSoup(r.text, "html.parser")
-
-        title_tag = soup.find("meta", property="og:title") or soup.find("title")
-        desc_tag = soup.find("meta", property="og:description") or soup.find("meta", attrs={"name": "description"})
-        image_tag = soup.find("meta", property="og:image")
-
-        return JsonResponse({
-            "url": url,
-            "title": (
-                title_tag["content"]
-                if title_tag and title_tag.has_attr("content")
-                else (title_tag.string if title_tag else "")
-            ),
-            "description": (
-                desc_tag["content"]
-                if desc_tag and desc_tag.has_attr("content")
-                else ""
-            ),
-            "image": (
-                image_tag["content"]
-                if image_tag and image_tag.has_attr("content")
-                else ""
-            ),
-        })
-
-    except Exception as e:
+    preview = await link_previews.get_preview(url)
+    if not preview:
         return JsonResponse({
             "url": url,
             "title": url,
             "description": "",
             "image": "",
-            "error": str(e)
-        }, status=200)
+            "error": "No preview available",
+        })
+    return JsonResponse(preview)
 
 
 